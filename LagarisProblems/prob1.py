@@ -2,10 +2,15 @@
 
 import torch
 import torch.utils.data
-import numpy as np
 import matplotlib.pyplot as plt
 import time
-from torch.autograd import grad
+import sys
+sys.path.append('..') # repository root, so that diffEqTools can be imported
+from diffEqTools.loaders import TensorLoader
+from diffEqTools.derivatives import tanhNetworkJet
+from diffEqTools.profiling import PhaseTimer, NO_TIMER
+from diffEqTools.checkpoints import loadState
+from diffEqTools.lagaris import trial1, residual1, solution1
 
 class DataSet(torch.utils.data.Dataset):
     """
@@ -82,27 +87,39 @@ class Fitter(torch.nn.Module):
         y = self.fc2(h)
         return y
 
+    def forwardDerivatives(self, x, orders):
+        """
+        Output of the neural network together with its derivatives w.r.t. the input, pushed forward
+        through the hidden layer alongside the activations (tanh' = 1 - tanh^2, and so on) in a single pass,
+        without an autograd graph for the derivatives w.r.t. the input.
+
+        Arguments:
+        x (PyTorch tensor shape (batchSize,1)) -- input of neural network
+        orders (list of tuples of length 1) -- number of derivatives w.r.t. x, e.g. (0,) for the output,
+            (2,) for d^2/dx^2
+
+        Returns:
+        derivatives (list of PyTorch tensors shape (batchSize,1)) -- output or derivative for every entry of orders
+        """
+        return tanhNetworkJet(self, x, orders)
+
 
 def plotNetwork(network, descentType, epoch):
     '''
     Plots the output of the neural network and the analytic solution
     '''
-    x    = torch.linspace(xRange[0], xRange[1], 50, requires_grad=True).view(-1,1)
-    N    = network.forward(x)
-    f_trial = trialFunc(x, N)
-    dndx = grad(N, x, torch.ones_like(N), retain_graph=True, create_graph=True)[0]
-    df_trial = dTrialFunc(x, N, dndx)
-    diff_eq = diffEq(x, f_trial, df_trial)
+    x    = torch.linspace(xRange[0], xRange[1], 50).view(-1,1)
+    diff_eq = residual(network, x)
     cost = lossFn(diff_eq, torch.zeros_like(diff_eq))
     print("test cost = ", cost.item())
     
+    f_trial = trial(network, x)
     exact = solution(x)
     MSECost = lossFn(f_trial, exact)
     print("MSE between trial and exact solution = ", MSECost.item())
     exact = exact.detach().numpy()
     x = x.detach().numpy()
-    N = N.detach().numpy()
-    plt.plot(x, trialFunc(x,N), 'r-', label = "Neural Network Output")
+    plt.plot(x, f_trial.detach().numpy(), 'r-', label = "Neural Network Output")
     plt.plot(x, exact, 'b.', label = "True Solution")
     
     plt.xlabel("x", fontsize = 16)
@@ -111,112 +128,20 @@ def plotNetwork(network, descentType, epoch):
     plt.title(descentType + " " + str(epoch) + " Epochs", fontsize = 16)
     plt.show()
 
-def trialFunc1(x, n_out):
-    """
-    Trial solution to Lagaris problem 1: f(x) = 1 + xN(x)
-    Arguments:
-        x (tensor of shape (batchSize,1)) -- input of neural network
-        n_out (tensor of shape (batchSize,1)) -- output of neural network
-    Returns:
-        1 + x * n_out (tensor of shape (batchSize,1)) -- trial solution to differential equation
-    """ 
-    return 1 + x * n_out
-
-def dTrialFunc1(x, n_out, dndx):
-    """
-    Derivative of trial solution to Lagaris problem 1: f'(x) = N(x) + xN'(x)
-    Arguments:
-        x (tensor of shape (batchSize,1)) -- input of neural network
-        n_out (tensor of shape (batchSize,1)) -- output of neural network
-        dndx (tensor of shape (batchSize,1)) -- derivative of n_out w.r.t. x
-    Returns:
-        n_out + x * dndx (tensor of shape (batchSize,1)) -- derivative of trial function w.r.t. x
-    """ 
-    return n_out + x * dndx
-
-def diffEq1(x, f_trial, df_trial):
-    """
-    Returns D(x) of differential equation D(x) = 0 from Lagaris problem 1
-    Arguments:
-        x (tensor of shape (batchSize,1)) -- input of neural network
-        f_trial (tensor of shape (batchSize,1)) -- trial solution at x
-        df_trial (tensor of shape (batchSize,1)) -- derivative of trial solution at x
-    Returns:
-        LHS - RHS (tensor of shape (batchSize,1)) -- differential equation evaluated at x"""
-    RHS = x**3 + 2*x + (x**2 * ((1+3*x**2) / (1 + x + x**3)))
-    LHS = df_trial + ((x + (1+3*(x**2)) / (1 + x + x**3) ) * f_trial)
-    return LHS - RHS
-
-def solution1(x):
-    """
-    Analytic solution to Lagaris problem 1
-    Arguments:
-        x (tensor of shape (batchSize,1)) -- input of neural network
-    Returns:
-        y (tensor of shape (batchSize,1)) -- analytic solution of differential equation at x"""
-    y =  (torch.exp(-(x**2)/2) / (1 + x + x**3)) + x**2 
-    return y 
-
-def trialFunc2(x, n_out):
-    """
-    Trial solution to Lagaris problem 2: f(x) = x * N(x)
-    Arguments:
-        x (tensor of shape (batchSize,1)) -- input of neural network
-        n_out (tensor of shape (batchSize,1)) -- output of neural network
-    Returns:
-        x * n_out (tensor of shape (batchSize,1)) -- trial solution to differential equation
-    """ 
-    return x * n_out
-
-def dTrialFunc2(x, n_out, dndx):
-    """
-    Derivative of trial solution to Lagaris problem 2: f'(x) = N(x) + x * N'(x)
-    Arguments:
-        x (tensor of shape (batchSize,1)) -- input of neural network
-        n_out (tensor of shape (batchSize,1)) -- output of neural network
-        dndx (tensor of shape (batchSize,1)) -- derivative of n_out w.r.t. x
-    Returns:
-        n_out + x * dndx (tensor of shape (batchSize,1)) -- derivative of trial function w.r.t. x
-    """ 
-    return n_out + x * dndx
-
-def diffEq2(x, f_trial, df_trial):
-    """
-    Returns D(x) of differential equation D(x) = 0 from Lagaris problem 2
-    Arguments:
-        x (tensor of shape (batchSize,1)) -- input of neural network
-        f_trial (tensor of shape (batchSize,1)) -- trial solution at x
-        df_trial (tensor of shape (batchSize,1)) -- derivative of trial solution at x
-    Returns:
-        LHS - RHS (tensor of shape (batchSize,1)) -- differential equation evaluated at x"""
-    RHS = df_trial + (1/5)*f_trial
-    LHS = torch.exp(-x/5) * torch.cos(x)
-    return LHS - RHS
-
-def solution2(x):
-    """
-    Analytic solution to Lagaris problem 1
-    Arguments:
-        x (tensor of shape (batchSize,1)) -- input of neural network
-    Returns:
-        y (tensor of shape (batchSize,1)) -- analytic solution of differential equation at x"""
-    y = torch.exp(-x/5) * torch.sin(x)
-    return y
-
-
 descentType = "Mini-Batch Gradient Descent:"
 
-def train(network, loader, lossFn, optimiser, numEpochs):
+def train(network, loader, lossFn, optimiser, numEpochs, timer = NO_TIMER):
     """
     A function to train a neural network to solve a 
     first-order ODE with Dirichlet boundary conditions.
 
     Arguments:
     network (Module) -- the neural network
-    loader (DataLoader) -- generates batches from the training dataset
+    loader (TensorLoader) -- generates batches from the training dataset
     lossFn (Loss Function) -- network's loss function
     optimiser (Optimiser) -- carries out parameter optimisation
     numEpochs (int) -- number of training epochs
+    timer (PhaseTimer) -- if enabled, records the time spent in every phase of training
 
     Returns:
     costList (list of length 'numEpochs') -- cost values of all epochs
@@ -224,74 +149,72 @@ def train(network, loader, lossFn, optimiser, numEpochs):
     cost_list=[]
     network.train(True) # set module in training mode
     for epoch in range(numEpochs):
+        timer.restart() # storing the costs is not attributed to the next phase
         for batch in loader:
-            n_out = network.forward(batch) # network output
-
-            # Get derivative of the network output w.r.t. the input values:
-            dndx = grad(n_out, batch, torch.ones_like(n_out), retain_graph=True)[0]
-            # torch.ones_like(x) creates a tensor the same shape as x, filled with 1's
-            
-            # Get value of trial solution f(x)
-            f_trial = trialFunc(batch, n_out)
-            # Get df / dx
-            df_trial = dTrialFunc(batch, n_out, dndx)
-            # Get LHS of differential equation D(x) = 0
-            diff_eq = diffEq(batch, f_trial, df_trial)
+            timer.lap('sampling')
+            # Get LHS of differential equation D(x) = 0 for the trial solution, from the network output
+            # and its derivative w.r.t. the input values
+            diff_eq = residual(network, batch)
             
             cost = lossFn(diff_eq, torch.zeros_like(diff_eq)) # calculate cost
+            timer.lap('residual')
             # torch.zeros_like(x) creates a tensor the same shape as x, filled with 0's
             cost.backward() # perform backpropagation
+            timer.lap('backward')
             optimiser.step() # perform parameter optimisation
             optimiser.zero_grad() # reset gradients to zero
+            timer.lap('optimiser')
+            timer.step()
 
         cost_list.append(cost.detach().numpy())# store cost of each epoch
     network.train(False) # set module out of training mode
     return cost_list
 
+network = Fitter(numHiddenNodes=10)
 try: # load saved network if possible
-    checkpoint = torch.load('problem1.pth')
-    # checkpoint = torch.load('problem2.pth')
-    network    = checkpoint['network']
-except: # create new network
-    network    = Fitter(numHiddenNodes=10)
-    checkpoint = {'network': network}
-    torch.save(checkpoint, 'problem1.pth')
-    # torch.save(checkpoint, 'problem2.pth')
+    network.load_state_dict(loadState('problem1.pth')['network'])
+    # network.load_state_dict(loadState('problem2.pth')['network'])
+except FileNotFoundError: # save initial state of the new network
+    torch.save({'network': network.state_dict()}, 'problem1.pth')
+    # torch.save({'network': network.state_dict()}, 'problem2.pth')
 xRange       = [0, 2]
 numSamples   = 20
 batchSize    = 1
 paramUpdates = 20000
 train_set    = DataSet(numSamples, xRange)
-train_loader = torch.utils.data.DataLoader(dataset=train_set, batch_size=batchSize, shuffle=True)
+train_loader = TensorLoader(train_set.dataIn, batchSize = batchSize, shuffle = True)
 lossFn       = torch.nn.MSELoss()
 optimiser    = torch.optim.SGD(network.parameters(), lr=1e-3)
 
+# trial solution, residual and analytic solution of Lagaris problem 1, shared with diffEqTools.lagaris
 solution = solution1
-trialFunc = trialFunc1
-dTrialFunc = dTrialFunc1
-diffEq = diffEq1
-
-# solution = solution2
-# trialFunc = trialFunc2
-# dTrialFunc = dTrialFunc2
-# diffEq = diffEq2
+trial = trial1
+residual = residual1
 
 costList = []
 epoch = 0
 numEpochs = 50
+# enabled = True for a breakdown of the time spent in every phase of training,
+# profileSteps = (first, last) for a torch.profiler trace of those steps
+timer = PhaseTimer(enabled = False, profileSteps = None, tracePath = 'problem1Trace.json')
 # totalEpochs = int((batchSize/numSamples) * paramUpdates)
 totalEpochs = 100
 start = time.time()
-while epoch < totalEpochs:
-    costList.extend(train(network, train_loader, lossFn, optimiser, numEpochs))
-    epoch += numEpochs
-    print(epoch)
+try:
+    while epoch < totalEpochs:
+        costList.extend(train(network, train_loader, lossFn, optimiser, numEpochs, timer))
+        epoch += numEpochs
+        print(epoch)
+finally:
+    timer.close() # stops a profiler window that training ended inside
 end = time.time()
 
 
 plotNetwork(network, descentType, epoch)
 print(epoch, "epochs total, final cost = ", costList[-1])
 print("total time elapsed = ", end - start, " seconds")
+if timer.enabled:
+    print(timer.report())
 
 plt.semilogy(costList)
 plt.xlabel("Epochs",fontsize = 16)
@@ -1,10 +1,16 @@
 #%%
 import torch
 import torch.utils.data
-import numpy as np
 import matplotlib.pyplot as plt
-from torch.autograd import grad
 import time
+import sys
+sys.path.append('..') # repository root, so that diffEqTools can be imported
+from diffEqTools.loaders import TensorLoader
+from diffEqTools.derivatives import tanhNetworkJet
+from diffEqTools.profiling import PhaseTimer, NO_TIMER
+from diffEqTools.checkpoints import loadState
+# trial solution, residual and analytic solution of Lagaris problem 3, shared with diffEqTools.lagaris
+from diffEqTools.lagaris import trial3 as trial, residual3 as residual, solution3 as solution
 
 class DataSet(torch.utils.data.Dataset):
     """
@@ -81,17 +87,34 @@ class Fitter(torch.nn.Module):
         y = self.fc2(h)
         return y
 
-def train(network, loader, lossFn, optimiser, numEpochs):
+    def forwardDerivatives(self, x, orders):
+        """
+        Output of the neural network together with its derivatives w.r.t. the input, pushed forward
+        through the hidden layer alongside the activations (tanh' = 1 - tanh^2, and so on) in a single pass,
+        without an autograd graph for the derivatives w.r.t. the input.
+
+        Arguments:
+        x (PyTorch tensor shape (batchSize,1)) -- input of neural network
+        orders (list of tuples of length 1) -- number of derivatives w.r.t. x, e.g. (0,) for the output,
+            (2,) for d^2/dx^2
+
+        Returns:
+        derivatives (list of PyTorch tensors shape (batchSize,1)) -- output or derivative for every entry of orders
+        """
+        return tanhNetworkJet(self, x, orders)
+
+def train(network, loader, lossFn, optimiser, numEpochs, timer = NO_TIMER):
     """
     A function to train a neural network to solve a 
     second-order ODE with Cauchy boundary conditions.
 
     Arguments:
     network (Module) -- the neural network
-    loader (DataLoader) -- generates batches from the training dataset
+    loader (TensorLoader) -- generates batches from the training dataset
     lossFn (Loss Function) -- network's loss function
     optimiser (Optimiser) -- carries out parameter optimisation
     numEpochs (int) -- number of training epochs
+    timer (PhaseTimer) -- if enabled, records the time spent in every phase of training
 
     Returns:
     cost_list (list of length 'numEpochs') -- cost values of all epochs
@@ -99,28 +122,22 @@ def train(network, loader, lossFn, optimiser, numEpochs):
     cost_list=[]
     network.train(True)
     for epoch in range(numEpochs):
+        timer.restart() # storing the costs is not attributed to the next phase
         for batch in loader:
-            n_out = network(batch)
-
-            # Get first derivative of the network output with respect to the input values: 
-            dndx = grad(n_out, batch, torch.ones_like(n_out), retain_graph=True, create_graph=True)[0]
-            # Get second derivative of the network output with respect to the input values: 
-            d2ndx2 =grad(dndx, batch, torch.ones_like(dndx), retain_graph=True)[0]
-            
-            # Get value of trial solution f(x)
-            f_trial = trialFunc(batch, n_out)
-            # Get f'(x)
-            df_trial = dTrialFunc(batch, n_out, dndx)
-            # Get f''(x)
-            d2f_trial = d2TrialFunc(batch,n_out,dndx,d2ndx2)
-            # Get LHS of differential equation D(x) = 0
-            diff_eq = diffEq(batch, f_trial, df_trial, d2f_trial)
+            timer.lap('sampling')
+            # Get LHS of differential equation D(x) = 0 for the trial solution, from the network output
+            # and its first and second derivatives with respect to the input values
+            diff_eq = residual(network, batch)
             
             cost = lossFn(diff_eq, torch.zeros_like(diff_eq)) # calculate cost
+            timer.lap('residual')
             # torch.zeros_like(x) creates a tensor the same shape as x, filled with 0's
             cost.backward() # perform backpropagation
+            timer.lap('backward')
             optimiser.step() # perform parameter optimisation
             optimiser.zero_grad() # reset gradients to zero
+            timer.lap('optimiser')
+            timer.step()
 
         cost_list.append(cost.detach().numpy())# store cost of each epoch
     network.train(False)
@@ -128,14 +145,8 @@ def train(network, loader, lossFn, optimiser, numEpochs):
 
 
 def plotNetwork(network, epoch):
-    x    = torch.linspace(-5, 15, 120, requires_grad=True).view(-1,1)
-    N    = network.forward(x)
-    f_trial = trialFunc(x, N)
-    dndx = grad(N, x, torch.ones_like(N), retain_graph=True, create_graph=True)[0]  
-    d2ndx2 =grad(dndx, x, torch.ones_like(dndx), retain_graph=True)[0]
-    df_trial = dTrialFunc(x, N, dndx)
-    d2f_trial = d2TrialFunc(x,N,dndx,d2ndx2)
-    diff_eq = diffEq(x, f_trial, df_trial, d2f_trial)
+    x    = torch.linspace(-5, 15, 120).view(-1,1)
+    diff_eq = residual(network, x)
     cost = lossFn(diff_eq, torch.zeros_like(diff_eq))
     print("test cost = ", cost.item())
 
@@ -161,13 +172,13 @@ def plotNetwork(network, epoch):
     # cost = lossFn(diff_eq, torch.zeros_like(diff_eq))
     # print("test cost = ", cost.item())
 
+    f_trial = trial(network, x)
     exact = solution(x)
     MSECost = lossFn(f_trial, exact)
     print("MSE between trial and exact solution = ", MSECost.item())
     exact = exact.detach().numpy()
     x = x.detach().numpy()
-    N = N.detach().numpy()
-    plt.plot(x, trialFunc(x,N), 'r-', label = "Neural Network Output")
+    plt.plot(x, f_trial.detach().numpy(), 'r-', label = "Neural Network Output")
     plt.plot(x, exact, 'b.', label = "True Solution")
     # plt.plot(x, exact, 'b.', label = "True Solution, Training Range")
 
@@ -202,73 +213,14 @@ def plotNetwork(network, epoch):
     return
     
 
-def trialFunc(x, n_out):
-    """
-    Trial solution to Lagaris problem 3: f(x) = x + x^2 * N(x)
-    Arguments:
-        x (tensor of shape (batchSize,1)) -- input of neural network
-        n_out (tensor of shape (batchSize,1)) -- output of neural network
-    Returns:
-        x + (x**2 * n_out) (tensor of shape (batchSize,1)) -- trial solution to differential equation""" 
-    return x + (x**2 * n_out)
-
-def dTrialFunc(x, n_out, dndx):
-    """
-    First derivative of trial solution to Lagaris problem 3: f'(x) = 1 + 2xN(x) + x^2 * N'(x)
-    Arguments:
-        x (tensor of shape (batchSize,1)) -- input of neural network
-        n_out (tensor of shape (batchSize,1)) -- output of neural network
-        dndx (tensor of shape (batchSize,1)) -- derivative of n_out w.r.t. x
-    Returns:
-        1 + (2*x*n_out) + (x**2 * dndx) (tensor of shape (batchSize,1)) -- 1st derivative of trial function w.r.t. x)""" 
-    return 1 + (2*x*n_out) + (x**2 * dndx)
-
-def d2TrialFunc(x,n_out,dndx,d2ndx2):
-    """
-    Second derivative of trial solution to Lagaris problem 3: f''(x) = 2N(x) + (4x * N'(x)) + x^2 N''(x)
-    Arguments:
-        x (tensor of shape (batchSize,1)) -- input of neural network
-        n_out (tensor of shape (batchSize,1)) -- output of neural network
-        dndx (tensor of shape (batchSize,1)) -- 1st derivative of n_out w.r.t. x
-        d2ndx2 (tensor of shape (batchSize,1)) -- 2nd derivative of n_out w.r.t. x
-    Returns:
-        2*n_out + (4*x*dndx) + (x**2 * d2ndx2) (tensor of shape (batchSize,1)) -- 2nd derivative of trial function w.r.t. x)""" 
-    return 2*n_out + (4*x*dndx) + (x**2 * d2ndx2)
-
-def diffEq(x, f_trial, df_trial, d2f_trial):
-    """
-    Returns D(x) of differential equation D(x) = 0 from Lagaris problem 3
-    Arguments:
-        x (tensor of shape (batchSize,1)) -- input of neural network
-        f_trial (tensor of shape (batchSize,1)) -- trial solution at x
-        df_trial (tensor of shape (batchSize,1)) -- 1st derivative of trial solution at x
-        d2f_trial (tensor of shape (batchSize,1)) -- 2nd derivative of trial solution at x
-    Returns:
-        LHS - RHS (tensor of shape (batchSize,1)) -- differential equation evaluated at x"""
-    LHS = d2f_trial + (1/5)*df_trial + f_trial
-    RHS = -(1/5) * torch.exp(-x/5) * torch.cos(x)
-    return LHS - RHS
-
-def solution(x):
-    """
-    Analytic solution to Lagaris problem 3
-    Arguments:
-        x (tensor of shape (batchSize,1)) -- input of neural network
-    Returns:
-        torch.exp(-x/5) * torch.sin(x) (tensor of shape (batchSize,1)) -- analytic solution of differential equation at x"""
-    return torch.exp(-x/5) * torch.sin(x)
-    
-
+network = Fitter(numHiddenNodes=10)
 try: # load saved network and cost list, if possible
-    checkpoint = torch.load('problem3InitialNetwork.pth')
-    network    = checkpoint['network']
+    checkpoint = loadState('problem3InitialNetwork.pth')
+    network.load_state_dict(checkpoint['network'])
     costList   = checkpoint['costList']
-except: # create new network and cost list
-    network     = Fitter(numHiddenNodes=10)
+except FileNotFoundError: # save initial state of the new network, with an empty cost list
     costList    = []
-    checkpoint  = {'network': network,
-                  'costList': costList}
-    torch.save(checkpoint, 'problem3InitialNetwork.pth')
+    torch.save({'network': network.state_dict(), 'costList': costList}, 'problem3InitialNetwork.pth')
 
 # networkName  = 'Network1'
 networkName  = 'Network2'
@@ -277,31 +229,39 @@ xRange       = [0, 10]
 numSamples   = 50
 batchSize    = 50
 trainData    = DataSet(numSamples, xRange)
-trainLoader  = torch.utils.data.DataLoader(dataset=trainData, batch_size=batchSize, shuffle=True)
+trainLoader  = TensorLoader(trainData.dataIn, batchSize = batchSize, shuffle = True)
 
 xRangeWide       = [-5, 15]
 numSamplesWide   = 100
 batchSizeWide    = 100
 trainDataWide    = DataSet(numSamplesWide, xRangeWide)
-trainLoaderWide  = torch.utils.data.DataLoader(dataset=trainDataWide, batch_size=batchSizeWide, shuffle=True)
+trainLoaderWide  = TensorLoader(trainDataWide.dataIn, batchSize = batchSizeWide, shuffle = True)
 
 lossFn      = torch.nn.MSELoss()
 optimiser   = torch.optim.Adam(network.parameters(), lr=1e-3)
 epoch       = 0 
 numEpochs   = 1000
 totalEpochs = 40000
+# enabled = True for a breakdown of the time spent in every phase of training,
+# profileSteps = (first, last) for a torch.profiler trace of those steps
+timer = PhaseTimer(enabled = False, profileSteps = None, tracePath = 'problem3Trace.json')
 
 start = time.time()
-while epoch < totalEpochs:
-    if networkName == 'Network1' and epoch < 20000:
-        costList.extend(train(network, trainLoader, lossFn, optimiser, numEpochs))
-    else:
-        costList.extend(train(network, trainLoaderWide, lossFn, optimiser, numEpochs))
-    epoch += numEpochs
+try:
+    while epoch < totalEpochs:
+        if networkName == 'Network1' and epoch < 20000:
+            costList.extend(train(network, trainLoader, lossFn, optimiser, numEpochs, timer))
+        else:
+            costList.extend(train(network, trainLoaderWide, lossFn, optimiser, numEpochs, timer))
+        epoch += numEpochs
+finally:
+    timer.close() # stops a profiler window that training ended inside
 end = time.time()
+if timer.enabled:
+    print(timer.report())
 
-checkpoint  = {'network': network,
-                'costList': costList,}
+checkpoint  = {'network': network.state_dict(),
+                'costList': [float(cost) for cost in costList]}
 torch.save(checkpoint, 'problem3' + networkName + '.pth')
 
 print("total time elapsed = ", end-start, " seconds")
@@ -1,9 +1,14 @@
 #%%
 import torch
 import torch.utils.data
-import numpy as np
 import matplotlib.pyplot as plt
-from torch.autograd import grad
+import sys
+sys.path.append('..') # repository root, so that diffEqTools can be imported
+from diffEqTools.loaders import TensorLoader
+from diffEqTools.derivatives import tanhNetworkJet
+from diffEqTools.profiling import PhaseTimer, NO_TIMER
+# trial solutions, residuals and analytic solutions of Lagaris problem 4, shared with diffEqTools.lagaris
+from diffEqTools.lagaris import trial4 as trial, residual4 as residual, solution4 as solution
 
 class DataSet(torch.utils.data.Dataset):
     """
@@ -79,55 +84,36 @@ class DESolver(torch.nn.Module):
         # Linear activation function used on outer layer
         y = self.fc2(h)
         return y
+
+    def forwardDerivatives(self, x, orders):
+        """
+        Output of the neural network together with its derivatives w.r.t. the input, pushed forward
+        through the hidden layer alongside the activations (tanh' = 1 - tanh^2, and so on) in a single pass,
+        without an autograd graph for the derivatives w.r.t. the input.
+
+        Arguments:
+        x (PyTorch tensor shape (batchSize,1)) -- input of neural network
+        orders (list of tuples of length 1) -- number of derivatives w.r.t. x, e.g. (0,) for the output,
+            (2,) for d^2/dx^2
+
+        Returns:
+        derivatives (list of PyTorch tensors shape (batchSize,2)) -- output or derivative for every entry of orders
+        """
+        return tanhNetworkJet(self, x, orders)
     
-def f1Trial(x, n1_out):
-    """Trial solution f1(x) to first DE"""
-    return x * n1_out
-
-def df1Trial( x, n1_out, dn1dx):
-    """Derivative of trial solution f1'(x) to first DE"""
-    return n1_out + (x * dn1dx)
-
-def f2Trial(x, n2_out):
-    """Trial solution f2(x) to second DE"""
-    return 1 + (x * n2_out)
-
-def df2Trial(x, n2_out, dn2dx):
-    """Derivative of trial solution f2'(x) to second DE"""
-    return n2_out + (x * dn2dx)
-
-def diffEq1(x, f1_trial, f2_trial, df1_trial):
-    """Returns D1(x) where first DE is D1(x) = 0"""
-    LHS = df1_trial
-    RHS = torch.cos(x) + (f1_trial**2 + f2_trial) - (1 + x**2 + torch.sin(x)**2)
-    return LHS - RHS
-# - + , + - always works
-# original is + -, - +
-def diffEq2(x, f1_trial, f2_trial, df2_trial):
-    """Returns D2(x) where second DE is D2(x) = 0"""
-    LHS = df2_trial
-    RHS = 2*x - ((1 + x**2)*torch.sin(x)) + (f1_trial*f2_trial)
-    return LHS - RHS
-
-def solution1(x):
-    """Analytic solution to first DE"""
-    return torch.sin(x)
-
-def solution2(x):
-    """Analytic solution to second DE"""
-    return 1 + x**2
-
-def train(network, loader, lossFn, optimiser, numEpochs):
+
+def train(network, loader, lossFn, optimiser, numEpochs, timer = NO_TIMER):
     """
     A function to train a neural network to solve a pair of coupled 
     first-order ODEs with Dirichlet boundary conditions.
 
     Arguments:
     network (Module) -- the neural network
-    loader (DataLoader) -- generates batches from the training dataset
+    loader (TensorLoader) -- generates batches from the training dataset
     lossFn (Loss Function) -- network's loss function
     optimiser (Optimiser) -- carries out parameter optimisation
     numEpochs (int) -- number of training epochs
+    timer (PhaseTimer) -- if enabled, records the time spent in every phase of training
 
     Returns:
     cost_list (list of length 'numEpochs') -- cost values of all epochs
@@ -135,35 +121,26 @@ def train(network, loader, lossFn, optimiser, numEpochs):
     cost_list=[]
     network.train(True) # set module in training mode
     for epoch in range(numEpochs):
+        timer.restart() # storing the costs is not attributed to the next phase
         for batch in loader:
-            n_out = network.forward(batch)
-
-            # Separate two columns of output (one for f1, one for f2)
+            timer.lap('sampling')
+            # Get LHS of differential equations D1(x) = 0, D2(x) = 0 for the trial solutions f1(x), f2(x),
+            # from the output and its derivative with respect to the input values
             # Using torch.split retains tensor history for autograd
-            n1_out, n2_out = torch.split(n_out, split_size_or_sections = 1, dim = 1)
-
-            # Get the derivative of both networks' outputs with respect to the input values. 
-            dn1dx = grad(n1_out, batch, torch.ones_like(n1_out), retain_graph=True, create_graph=True)[0]
-            dn2dx = grad(n2_out, batch, torch.ones_like(n2_out), retain_graph=True, create_graph=True)[0]
-
-            # Get value of trial solutions f1(x), f2(x)
-            f1_trial = f1Trial(batch, n1_out)
-            f2_trial = f2Trial(batch, n2_out)
-            # Get f1'(x) and f2'(x)
-            df1_trial = df1Trial(batch, n1_out, dn1dx)
-            df2_trial = df2Trial(batch, n2_out, dn2dx)
-            # Get LHS of differential equations D1(x) = 0, D2(x) = 0
-            D1 = diffEq1(batch, f1_trial, f2_trial, df1_trial)
-            D2 = diffEq2(batch, f1_trial, f2_trial, df2_trial)
+            D1, D2 = torch.split(residual(network, batch), split_size_or_sections = 1, dim = 1)
 
             # Calculate and store cost
             cost1 = lossFn(D1, torch.zeros_like(D1))
             cost2 = lossFn(D2, torch.zeros_like(D2))
             cost = cost1 + cost2
+            timer.lap('residual')
             
             cost.backward() # perform backpropagation
+            timer.lap('backward')
             optimiser.step() # perform parameter optimisation
             optimiser.zero_grad() # reset gradients to zero
+            timer.lap('optimiser')
+            timer.step()
 
         cost_list.append(cost.detach().numpy()) # store cost of each epoch
         
@@ -176,23 +153,11 @@ def plotNetwork(network, epoch):
     Plots the outputs of both neural networks, along with the
     analytic solution in the same range
     """
-    x    = torch.linspace(totalXRange[0], totalXRange[1], 36, requires_grad=True).view(-1,1)
-    n_out    = network.forward(x)
-    n1_out, n2_out = torch.split(n_out, split_size_or_sections=1, dim=1)
-
-    # Get the derivative of both networks' outputs with respect to the input values. 
-    dn1dx = grad(n1_out, x, torch.ones_like(n1_out), retain_graph=True, create_graph=True)[0]
-    dn2dx = grad(n2_out, x, torch.ones_like(n2_out), retain_graph=True, create_graph=True)[0]
-
+    x    = torch.linspace(totalXRange[0], totalXRange[1], 36).view(-1,1)
     # Get value of trial solutions f1(x), f2(x)
-    f1_trial = f1Trial(x, n1_out)
-    f2_trial = f2Trial(x, n2_out)
-    # Get f1'(x) and f2'(x)
-    df1_trial = df1Trial(x, n1_out, dn1dx)
-    df2_trial = df2Trial(x, n2_out, dn2dx)
+    f1_trial, f2_trial = torch.split(trial(network, x), split_size_or_sections=1, dim=1)
     # Get LHS of differential equations D1(x) = 0, D2(x) = 0
-    D1 = diffEq1(x, f1_trial, f2_trial, df1_trial)
-    D2 = diffEq2(x, f1_trial, f2_trial, df2_trial)
+    D1, D2 = torch.split(residual(network, x), split_size_or_sections=1, dim=1)
 
     # Calculate and store cost
     cost1 = lossFn(D1, torch.zeros_like(D1))
@@ -200,8 +165,7 @@ def plotNetwork(network, epoch):
     cost = cost1 + cost2
     print("test cost = ", cost.item())
 
-    exact1 = solution1(x)
-    exact2 = solution2(x)
+    exact1, exact2 = torch.split(solution(x), split_size_or_sections=1, dim=1)
     MSE1 = lossFn(f1_trial, exact1)
     MSE2 = lossFn(f2_trial, exact2)
     print("MSE between trial and exact solutions = ", ((MSE1 + MSE2)/2).item())
@@ -242,14 +206,11 @@ def plotNetwork(network, epoch):
     plt.show()
 
 
-# try: # load saved network if possible
-#     checkpoint = torch.load('problem4InitialNetwork.pth')
-#     network    = checkpoint['network']
-# except: # create new network
-#     network    = DESolver(numHiddenNodes=16)
-#     checkpoint = {'network': network}
-#     torch.save(checkpoint, 'problem4InitialNetwork.pth')
 network     = DESolver(numHiddenNodes=16)
+# try: # load saved network if possible
+#     network.load_state_dict(loadState('problem4InitialNetwork.pth')['network'])
+# except FileNotFoundError: # save initial state of the new network
+#     torch.save({'network': network.state_dict()}, 'problem4InitialNetwork.pth')
 lossFn      = torch.nn.MSELoss()
 optimiser   = torch.optim.Adam(network.parameters(), lr = 1e-3)
 totalXRange      = [0,3]
@@ -285,29 +246,37 @@ costList = []
 epoch = 0
 numEpochs = 1000
 totalEpochs = 36000
+# enabled = True for a breakdown of the time spent in every phase of training,
+# profileSteps = (first, last) for a torch.profiler trace of those steps
+timer = PhaseTimer(enabled = False, profileSteps = None, tracePath = 'problem4Trace.json')
 epochsPerSubRange = int(totalEpochs / len(ranges))
-for subRange in ranges:
-    epochCounter = 0
-    numSamples = int(10 * (subRange[1] - subRange[0]))
-    trainData    = DataSet(numSamples, subRange)
-    trainLoader = torch.utils.data.DataLoader(dataset=trainData, batch_size=int(numSamples), shuffle=True)
-
-    while epochCounter < epochsPerSubRange:
-        costList.extend(train(network, trainLoader, lossFn, optimiser, numEpochs))
-        epoch += numEpochs
-        epochCounter += numEpochs
-        # if epochCounter % 10000 == 0:
-        #     plotNetwork(network,epoch)
+try:
+    for subRange in ranges:
+        epochCounter = 0
+        numSamples = int(10 * (subRange[1] - subRange[0]))
+        trainData    = DataSet(numSamples, subRange)
+        trainLoader = TensorLoader(trainData.dataIn, batchSize = int(numSamples), shuffle = True)
+
+        while epochCounter < epochsPerSubRange:
+            costList.extend(train(network, trainLoader, lossFn, optimiser, numEpochs, timer))
+            epoch += numEpochs
+            epochCounter += numEpochs
+            # if epochCounter % 10000 == 0:
+            #     plotNetwork(network,epoch)
     
-    plt.semilogy(costList)
-    plt.xlabel("Epochs",fontsize = 16)
-    plt.ylabel("Cost",fontsize = 16)
-    plt.title("Example 4: Training Cost",fontsize = 16)
-    plt.show()
-    plotNetwork(network,epoch)
+        plt.semilogy(costList)
+        plt.xlabel("Epochs",fontsize = 16)
+        plt.ylabel("Cost",fontsize = 16)
+        plt.title("Example 4: Training Cost",fontsize = 16)
+        plt.show()
+        plotNetwork(network,epoch)
+finally:
+    timer.close() # stops a profiler window that training ended inside
 
     
 print(f"{totalEpochs} epochs total, final cost = {costList[-1]}")
+if timer.enabled:
+    print(timer.report())
 # plt.semilogy(costList)
 # plt.xlabel("numEpochs", fontsize = 16)
 # plt.ylabel("Error", fontsize = 16)
@@ -1,9 +1,17 @@
 #%%
 import torch
 import torch.utils.data
-import numpy as np
 import matplotlib.pyplot as plt
-from torch.autograd import grad
+import sys
+sys.path.append('..') # repository root, so that diffEqTools can be imported
+from diffEqTools.sampling import AdaptiveSampler, ResamplingDataSet, AdaptivePoints
+from diffEqTools.loaders import TensorLoader
+from diffEqTools.derivatives import tanhNetworkJet
+from diffEqTools.profiling import PhaseTimer, NO_TIMER
+from diffEqTools.trialGeometry import GeometryCache
+from diffEqTools.checkpoints import loadState
+# trial solution, residual, input-only terms and analytic solution of Lagaris problem 7, shared with diffEqTools.lagaris
+from diffEqTools.lagaris import trial7 as trial, residual7 as residual, geometry7 as geometry, solution78 as solution
 
 # TODO: CLEAN UP CODE 
 
@@ -135,115 +143,49 @@ class PDESolver(torch.nn.Module):
         z = self.fc2(h)
         return z
 
-def trial_term(x,y):
-    """
-    First term B(x,y) in trial solution that helps to satisfy BCs
-    f(0,y) = 0, f(1,y) = 0, f(x,0) = 0, f_{y}(x,1) = 2*sin(pi*x)
-    B(x,y) = y * 2 * sin(pi*x)
-    """
-    return 2 * y * torch.sin(np.pi * x)
-
-def trial(x,y,n_outXY,n_outX1,n_outX1_y):
-    return trial_term(x,y) + x*(1-x)*y*(n_outXY - n_outX1 - n_outX1_y)
+    def forwardDerivatives(self, input, orders):
+        """
+        Output of the neural network together with its derivatives w.r.t. the input, pushed forward
+        through the hidden layer alongside the activations (tanh' = 1 - tanh^2, and so on) in a single pass,
+        without an autograd graph for the derivatives w.r.t. the input.
 
-def dx_trial(x,y,n_outXY, n_outX1, n_outX1_y, n_outXY_x, n_outX1_x, n_outX1_xy):
-    """
-    f_x = 2*y*pi*cos(pi*x) + 
-                y * [(1-2*x)(N - N(x,1) - N_{y}(x,1)) 
-                    + x(1-x)(N_{x} - N_{x}(x,1) - N_{xy}(x,1)]
-    """
-    return ( 2* y *np.pi * torch.cos(np.pi*x) 
-            + y * ((1-2*x) * (n_outXY - n_outX1 - n_outX1_y)
-                + x*(1-x)*(n_outXY_x - n_outX1_x - n_outX1_xy)))
+        Arguments:
+        input (PyTorch tensor shape (batchSize,2)) -- input of neural network
+        orders (list of tuples of length 2) -- number of derivatives w.r.t. x and y, e.g. (0,0) for the output,
+            (2,0) for d^2/dx^2 and (1,1) for d^2/dxdy
 
-def dx2_trial(x,y,n_outXY, n_outX1, n_outX1_y, n_outXY_x, n_outX1_x, n_outX1_xy, n_outXY_xx, n_outX1_xx, n_outX1_xxy):
-    """
-    f_xx = -2*y*pi^2*sin(pi*x) 
-                + y [ (-2)*(N - N(x,1) - N_{y}(x,1)
-                        + 2(1-2x)((N_{x} - N_{x}(x,1) - N_{xy}(x,1))
-                        + x(1-x)(N_{xx} - N_{xx}(x,1) - N_{xxy}(x,1))]"""
-    return ( -2* y *(np.pi)**2 * torch.sin(np.pi*x) 
-            + y * ( (-2) * (n_outXY - n_outX1 - n_outX1_y)
-                + 2*(1-2*x) * (n_outXY_x - n_outX1_x - n_outX1_xy)
-                + x*(1-x)*(n_outXY_xx - n_outX1_xx - n_outX1_xxy)))
-
-def dy_trial(x,y, n_outXY, n_outX1, n_outX1_y, n_outXY_y):
-    """
-    f_y = 2sin(pi*x) + 
-            + x(1-x)[(N - N(x,1) - N_{y}(x,1)) + y * N_{y}]
-    """
-    return (2*torch.sin(np.pi *x) + x*(1-x) *
-        ((n_outXY - n_outX1 - n_outX1_y) + (y* n_outXY_y)))
+        Returns:
+        derivatives (list of PyTorch tensors shape (batchSize,1)) -- output or derivative for every entry of orders
+        """
+        return tanhNetworkJet(self, input, orders)
 
-def dy2_trial(x,y,n_outXY_y,n_outXY_yy):
+def train(network, loader, lossFn, optimiser,numEpochs, geometryCache, resampler = None, timer = NO_TIMER):
     """
-    f_yy = x(1-x)[2N_{y} + y * N_{yy}]
+    Trains the neural network on the batches of points and cached geometry terms from 'loader',
+    regenerating the points of 'resampler' (the loader's dataset) if given
     """
-    return (x * (1-x) * (2 * n_outXY_y + y * n_outXY_yy))
-
-def diffEq(x,y,trial_dx2,trial_dy2):
-    RHS = (2-((np.pi*y)**2)) * torch.sin(np.pi * x)
-    return trial_dx2 + trial_dy2 - RHS
-
-def solution(x, y):
-    return (y**2) * torch.sin(np.pi * x)
-
-
-def train(network, loader, lossFn, optimiser,numEpochs):
-    """Trains the neural network"""
     cost_list=[]
     network.train(True)
     for _ in range(numEpochs):
-        for batch in loader:
-            x, y = torch.split(batch,1, dim=1)
-            y_ones = torch.ones_like(y)
-            # Coordinates (x,1) for all x in batch
-            x1 = torch.cat((x,y_ones),1)
-
-            # Neural network output at (x,y)
-            n_outXY = network(batch)
-            # Neural network output at (x,1)
-            n_outX1 = network(x1)
-
-            # Get all required derivatives of n(x,y)
-            dn = grad(n_outXY, batch, torch.ones_like(n_outXY), retain_graph=True, create_graph=True)[0]
-            # n_x , n_y
-            n_outXY_x, n_outXY_y = dn[:,0].view(-1,1), dn[:,1].view(-1,1)
-            dn2 = grad(dn, batch, torch.ones_like(dn), retain_graph=True, create_graph=True)[0]
-            # n_xx , n_yy
-            n_outXY_xx, n_outXY_yy = torch.split(dn2 , 1, dim = 1 )
-
-            # Get all required derivatives of n(x,1):
-            dn_x1 = grad(n_outX1, x1, torch.ones_like(n_outX1), retain_graph=True, create_graph=True)[0]
-            # n_x |(y=1) , n_y |(y=1)
-            n_outX1_x, n_outX1_y = torch.split(dn_x1 , 1, dim = 1 )
-
-            dn2dx_x1 = grad(n_outX1_x, x1, torch.ones_like(n_outX1_x), retain_graph = True, create_graph = True)[0]
-            # n_xx |(y=1)
-            n_outX1_xx , _= torch.split(dn2dx_x1, 1, dim = 1)
-
-            dn2dy_x1 = grad(n_outX1_y, x1, torch.ones_like(n_outX1_y), retain_graph = True, create_graph = True)[0]
-            # n_xy |(y=1)
-            n_outX1_xy , _ = torch.split(dn2dy_x1, 1, dim=1)
-
-            dn3dy_x1 = grad(n_outX1_xy, x1, torch.ones_like(n_outX1_xy), retain_graph = True, create_graph = True)[0]
-            # n_xxy |(y=1)
-            n_outX1_xxy ,  _= torch.split(dn3dy_x1, 1, dim=1)
-            
-            # Get second derivatives of trial solution
-            trial_dx2 = dx2_trial(x,y,n_outXY, n_outX1, n_outX1_y, n_outXY_x, n_outX1_x, n_outX1_xy, n_outXY_xx, n_outX1_xx, n_outX1_xxy)
-            trial_dy2 = dy2_trial(x,y,n_outXY_y,n_outXY_yy)
-            
-            # Calculate LHS of differential equation D(x,y) = 0
-            D = diffEq(x,y,trial_dx2,trial_dy2)
+        timer.restart() # storing the costs is not attributed to the next phase
+        if resampler is not None: # new points every 'refreshInterval' epochs, written into the loader's tensor
+            if resampler.step(network):
+                geometryCache.refresh()
+        for batch, terms in loader:
+            timer.lap('sampling')
+            D = residual(network, batch, terms) # LHS of differential equation D(x,y) = 0
 
             # calculate cost
             cost = lossFn(D, torch.zeros_like(D))
+            timer.lap('residual')
         
             # Optimization algorithm
             cost.backward() # perform backpropagation
+            timer.lap('backward')
             optimiser.step() # perform parameter optimisation
             optimiser.zero_grad() # reset gradients to zero
+            timer.lap('optimiser')
+            timer.step()
 
         cost_list.append(cost.item()) # store final cost of every epoch
 
@@ -257,57 +199,19 @@ def plotNetwork(network, epoch, samplingMethod):
     analytic solution in the same range
     """
     batch = UniformDataSet(xRange,yRange,numSamples).data_in
-    x, y = torch.split(batch,1, dim=1)
-    y_ones = torch.ones_like(y)
-    # Coordinates (x,1) for all x in batch
-    x1 = torch.cat((x,y_ones),1)
-
-    # Neural network output at (x,y)
-    n_outXY = network(batch)
-    # Neural network output at (x,1)
-    n_outX1 = network(x1)
-
-    # Get all required derivatives of n(x,y)
-    dn = grad(n_outXY, batch, torch.ones_like(n_outXY), retain_graph=True, create_graph=True)[0]
-    # n_x , n_y
-    n_outXY_x, n_outXY_y = dn[:,0].view(-1,1), dn[:,1].view(-1,1)
-    dn2 = grad(dn, batch, torch.ones_like(dn), retain_graph=True, create_graph=True)[0]
-    # n_xx , n_yy
-    n_outXY_xx, n_outXY_yy = torch.split(dn2 , 1, dim = 1 )
-
-    # Get all required derivatives of n(x,1):
-    dn_x1 = grad(n_outX1, x1, torch.ones_like(n_outX1), retain_graph=True, create_graph=True)[0]
-    # n_x |(y=1) , n_y |(y=1)
-    n_outX1_x, n_outX1_y = torch.split(dn_x1 , 1, dim = 1 )
-
-    dn2dx_x1 = grad(n_outX1_x, x1, torch.ones_like(n_outX1_x), retain_graph = True, create_graph = True)[0]
-    # n_xx |(y=1)
-    n_outX1_xx , _= torch.split(dn2dx_x1, 1, dim = 1)
-
-    dn2dy_x1 = grad(n_outX1_y, x1, torch.ones_like(n_outX1_y), retain_graph = True, create_graph = True)[0]
-    # n_xy |(y=1)
-    n_outX1_xy , _ = torch.split(dn2dy_x1, 1, dim=1)
-
-    dn3dy_x1 = grad(n_outX1_xy, x1, torch.ones_like(n_outX1_xy), retain_graph = True, create_graph = True)[0]
-    # n_xxy |(y=1)
-    n_outX1_xxy ,  _= torch.split(dn3dy_x1, 1, dim=1)
-    
-    # Get second derivatives of trial solution
-    trial_dx2 = dx2_trial(x,y,n_outXY, n_outX1, n_outX1_y, n_outXY_x, n_outX1_x, n_outX1_xy, n_outXY_xx, n_outX1_xx, n_outX1_xxy)
-    trial_dy2 = dy2_trial(x,y,n_outXY_y,n_outXY_yy)
-    
+
     # Calculate LHS of differential equation D(x,y) = 0
-    D = diffEq(x,y,trial_dx2,trial_dy2)
+    D = residual(network, batch)
 
     # calculate cost
     cost = lossFn(D, torch.zeros_like(D))
     print("test cost = ", cost.item())
 
-    # Get trial solution
-    trialSolution = trial(x,y,n_outXY,n_outX1,n_outX1_y)
+    # Get trial solution, from the neural network output at (x,y), at (x,1) and n_y |(y=1)
+    trialSolution = trial(network, batch)
 
     # Get exact solution
-    exact = solution(x,y).detach().numpy()
+    exact = solution(batch).detach().numpy()
 
     # Calculate residual error
     trialSolution = trialSolution.detach().numpy()
@@ -316,31 +220,15 @@ def plotNetwork(network, epoch, samplingMethod):
 
     # PLOT SURFACE
 
-    x_lin  = torch.linspace(xRange[0],xRange[1],numSamples, requires_grad=True)
-    y_lin  = torch.linspace(yRange[0],yRange[1],numSamples, requires_grad=True)
+    x_lin  = torch.linspace(xRange[0],xRange[1],numSamples)
+    y_lin  = torch.linspace(yRange[0],yRange[1],numSamples)
     X,Y = torch.meshgrid(x_lin,y_lin)
-    x, y  = X.reshape(-1,1), Y.reshape(-1,1)
-
-    # Get network output at (x,y)
-    xy = torch.cat((x,y),1)
-    y_ones = torch.ones_like(y)
-    # Coordinates (x,1) for all x in batch
-    x1 = torch.cat((x,y_ones),1)
-
-    # Neural network output at (x,y)
-    n_outXY = network(xy)
-    # Neural network output at (x,1)
-    n_outX1 = network(x1)
-
-    # Get all required derivatives of n(x,1):
-    dn_x1 = grad(n_outX1, x1, torch.ones_like(n_outX1), retain_graph=True, create_graph=True)[0]
-    # n_x |(y=1) , n_y |(y=1)
-    n_outX1_x, n_outX1_y = torch.split(dn_x1 , 1, dim = 1 )
+    xy = torch.cat((X.reshape(-1,1),Y.reshape(-1,1)),1)
 
     # Get trial solution
-    trialSolution = trial(x,y,n_outXY,n_outX1,n_outX1_y)
+    trialSolution = trial(network, xy)
     # Get exact solution
-    exact = solution(x,y).detach().numpy()
+    exact = solution(xy).detach().numpy()
     trialSolution = trialSolution.reshape(numSamples,numSamples).detach().numpy()
 
     # Plot trial and exact solutions
@@ -365,33 +253,45 @@ yRange      = [0,1]
 numEpochs   = 1000
 totalEpochs = 5000
 networkDict = {}
+resampleInterval = 100 # epochs between adaptive resampling steps
+timing = False # True for a breakdown of the time spent in every phase of training
+profileSteps = None # (first, last) for a torch.profiler trace of those steps
+adaptiveSampler  = AdaptiveSampler([xRange, yRange], int(numSamples**2), residual)
 
 datasetDict = {"Uniform" : UniformDataSet(xRange,yRange,numSamples), 
-               "Lattice" : LinearDataSet(xRange,yRange,numSamples)}
+               "Lattice" : LinearDataSet(xRange,yRange,numSamples),
+               "Adaptive" : ResamplingDataSet(AdaptivePoints(adaptiveSampler), int(numSamples**2), 2,
+                                              refreshInterval = resampleInterval)} # towards high residuals
 
 for samplingMethod in datasetDict:
     networkDict = {}
     trainData = datasetDict[samplingMethod]
+    network = PDESolver(numHiddenNodes=16)
     try: # load saved network if possible
-        checkpoint = torch.load('problem7InitialNetwork.pth')
-        network    = checkpoint['network']
-    except: # create new network
-        network    = PDESolver(numHiddenNodes=16)
-        checkpoint = {'network': network}
-        torch.save(checkpoint, 'problem7InitialNetwork.pth')
+        network.load_state_dict(loadState('problem7InitialNetwork.pth')['network'])
+    except FileNotFoundError: # save initial state of the new network
+        torch.save({'network': network.state_dict()}, 'problem7InitialNetwork.pth')
 
     lossFn      = torch.nn.MSELoss()
     optimiser   = torch.optim.Adam(network.parameters(), lr = 1e-3)
-    trainLoader = torch.utils.data.DataLoader(dataset=trainData, batch_size=int(numSamples**2), shuffle=True)
+    trainGeometry = GeometryCache(geometry, trainData.data_in) # input-only terms of the training points
+    trainLoader = TensorLoader((trainData.data_in, trainGeometry.terms), batchSize = int(numSamples**2), shuffle = True)
 
     epoch = 0 
     costList = []
-
-    while epoch < totalEpochs:
-        costList.extend(train(network, trainLoader, lossFn, optimiser, numEpochs))
-        epoch += numEpochs
+    timer = PhaseTimer(enabled = timing, profileSteps = profileSteps, tracePath = 'problem7' + samplingMethod + 'Trace.json')
+
+    try:
+        while epoch < totalEpochs:
+            costList.extend(train(network, trainLoader, lossFn, optimiser, numEpochs, trainGeometry,
+                                  resampler = trainData if isinstance(trainData, ResamplingDataSet) else None, timer = timer))
+            epoch += numEpochs
+    finally:
+        timer.close() # stops a profiler window that training ended inside
     
     print(f"{epoch} epochs total, final cost = {costList[-1]}")
+    if timer.enabled:
+        print(timer.report())
 
     plt.semilogy(costList)
     plt.xlabel("Epochs", fontsize = 16)
@@ -402,7 +302,7 @@ for samplingMethod in datasetDict:
     plotNetwork(network, epoch, samplingMethod)
     
     networkDict["costList"] = costList
-    networkDict["network"] = network
-    networkDict["dataSet"] = trainData
+    networkDict["network"] = network.state_dict()
+    networkDict["points"] = trainData.data_in.detach() # the final training points of the data set
     torch.save(networkDict, 'problem7' + samplingMethod + '.pth')
 #%%
\ No newline at end of file
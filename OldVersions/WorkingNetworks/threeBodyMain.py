@@ -3,6 +3,9 @@ import torch
 import numpy as np
 import matplotlib.pyplot as plt
 from torch.autograd import grad
+import sys
+sys.path.append('../..')
+from diffEqTools.referenceSolutions import batchRungeKutta
 
 class DataSet(torch.utils.data.Dataset):
     """Creates range of evenly-spaced x- and y-coordinates as test data"""
@@ -229,8 +232,9 @@ def train(network, lossFn, optimiser, scheduler, xRange,yRange,uRange,vRange,tRa
 
 def plotNetwork(network, mu, batchNum,
                 xRange, yRange,uRange,vRange,tRange, numTimeSteps):
-    timeStep = (tRange[1] - tRange[0]) / numTimeSteps
     batch = DataSet(xRange,yRange,uRange,vRange,tRange,10).data_in
+    # integrate every initial condition at once, with the same step size as before
+    exact = batchRungeKutta(batch[:,:4], tRange[0], tRange[1], mu, numTimeSteps + 1).numpy()
     t = torch.linspace(tRange[0],tRange[1],numTimeSteps,requires_grad=True).view(-1,1)
     t = t.to(device)
     
@@ -265,11 +269,7 @@ def plotNetwork(network, mu, batchNum,
         
 
         # Plot Runge-Kutta solution
-        x0 = batch[i][0].item()
-        y0 = batch[i][1].item()
-        u0 = batch[i][2].item()
-        v0 = batch[i][3].item()
-        xExact, yExact = rungeKutta(x0, y0, u0, v0, tRange[0], mu, tRange[1], timeStep)
+        xExact, yExact = exact[i,:,0], exact[i,:,1]
         xExact = np.reshape(xExact,(-1,1))[:numTimeSteps]
         yExact = np.reshape(yExact,(-1,1))[:numTimeSteps]
         solutionInaccuracy += np.mean((xExact - xTrial)**2 + (yTrial - yExact)**2)
@@ -294,77 +294,6 @@ def plotNetwork(network, mu, batchNum,
         print("figure saved")
     plt.show()
 
-def rungeKutta(x0, y0, u0, v0, t0, mu, tFinal, timeStep):
-    """
-    Implements 4th-Order Runge-Kutta Method to evaluate
-    system of ODEs from time t0 to time tFinal
-    """
-    # System of ODEs
-    def dxdt(x,y,u,v,mu):
-        return u
-
-    def dydt(x,y,u,v,mu):
-        return v
-
-    def dudt(x,y,u,v,mu):
-        return (x - mu + 2*v - 
-                (((mu*(x-1)) / ((x-1)**2 + y**2)**(3/2)) 
-                    + ((1-mu)*x / (x**2 + y**2)**(3/2)))
-                        )
-
-    def dvdt(x,y,u,v,mu):
-        return (y - 2*u - 
-                (((mu * y) / ((x-1)**2 + y**2)**(3/2))
-                    +((1-mu)*y / (x**2 + y**2)**(3/2) ))
-                    )
-
-    # Count number of iterations using length of timeStep
-    n = (int)((tFinal - t0)/timeStep)
-
-    # Iterate for number of iterations
-    x = x0
-    y = y0
-    u = u0
-    v = v0
-    xList = [x0]
-    yList = [y0]
-    for _ in range(n):
-         # Apply Runge Kutta Formulas to find next value of x, y, u, v
-        a1 = timeStep * dxdt(x,y,u,v,mu)
-        b1 = timeStep * dydt(x,y,u,v,mu)
-        c1 = timeStep * dudt(x,y,u,v,mu)
-        d1 = timeStep * dvdt(x,y,u,v,mu)
-        
-        a2 = timeStep * dxdt(x + 0.5*a1, y + 0.5*b1, u + 0.5*c1, v + 0.5*d1, mu)
-        b2 = timeStep * dydt(x + 0.5*a1, y + 0.5*b1, u + 0.5*c1, v + 0.5*d1, mu)
-        c2 = timeStep * dudt(x + 0.5*a1, y + 0.5*b1, u + 0.5*c1, v + 0.5*d1, mu)        
-        d2 = timeStep * dvdt(x + 0.5*a1, y + 0.5*b1, u + 0.5*c1, v + 0.5*d1, mu)
-
-        a3 = timeStep * dxdt(x + 0.5*a2, y + 0.5*b2, u + 0.5*c2, v + 0.5*d2, mu)
-        b3 = timeStep * dydt(x + 0.5*a2, y + 0.5*b2, u + 0.5*c2, v + 0.5*d2, mu)
-        c3 = timeStep * dudt(x + 0.5*a2, y + 0.5*b2, u + 0.5*c2, v + 0.5*d2, mu)        
-        d3 = timeStep * dvdt(x + 0.5*a2, y + 0.5*b2, u + 0.5*c2, v + 0.5*d2, mu)
-
-        a4 = timeStep * dxdt(x + a3, y + b3, u + c3, v + d3, mu)
-        b4 = timeStep * dydt(x + a3, y + b3, u + c3, v + d3, mu)
-        c4 = timeStep * dudt(x + a3, y + b3, u + c3, v + d3, mu)        
-        d4 = timeStep * dvdt(x + a3, y + b3, u + c3, v + d3, mu)
-
-        # Update next value of x, y, u, v
-        x = x + (1.0 / 6.0)*(a1 + 2 * a2 + 2 * a3 + a4)
-        y = y + (1.0 / 6.0)*(b1 + 2 * b2 + 2 * b3 + b4)
-        u = u + (1.0 / 6.0)*(c1 + 2 * c2 + 2 * c3 + c4)
-        v = v + (1.0 / 6.0)*(d1 + 2 * d2 + 2 * d3 + d4)
-
-        xList.append(x)
-        yList.append(y)
- 
-        # Update next value of t
-        t0 = t0 + timeStep
-
-    return xList, yList
-
-
 if torch.cuda.is_available():
     print("cuda time")
     device=torch.device("cuda")
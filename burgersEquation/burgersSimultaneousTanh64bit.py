@@ -9,136 +9,24 @@ import torch.utils.data
 import torch.distributions
 import numpy as np
 import matplotlib.pyplot as plt
-from torch.autograd import grad
-import scipy.io
+import sys
+sys.path.append('..') # repository root, so that diffEqTools can be imported
+from diffEqTools.loaders import TensorLoader
+from diffEqTools.derivatives import derivatives
+from diffEqTools.profiling import PhaseTimer
+from diffEqTools.metrics import MetricsRecorder
+from diffEqTools.checkpoints import CheckpointWriter
+from diffEqTools.burgers import BurgersEquationSolver, DataSet, loadData, train
 
 
-class DataSet(torch.utils.data.Dataset):
-    """Creates range of evenly-spaced x- and y-coordinates as test data"""
-    def __init__(self, XT, u_exact, numSamples):
-        # generate numSamples random indices to get training sample
-        idx = np.random.choice(XT.shape[0], numSamples, replace=False) 
-
-        XT_train = torch.tensor(XT[idx,:], requires_grad=True)
-        u_train = torch.tensor(u_exact[idx,:], requires_grad=True)
-
-        # input of forward function must have shape (batch_size, 2)
-        # u-values for training must have shape (batch_size, 1)
-        # we load this data as a tuple of tensors
-        self.data_in = (XT_train, u_train)
-        
-    def __len__(self):
-        return self.data_in[0].shape[0]
-    
-    def __getitem__(self, i):
-        return (self.data_in[0][i,:], self.data_in[1][i])
-
-class Fitter(torch.nn.Module):
-    """Forward propagations"""
-
-    def __init__(self, numHiddenNodes, numHiddenLayers):
-        super(Fitter, self).__init__()
-        # 2 inputs: x, t
-        self.fc1 = torch.nn.Linear(2, numHiddenNodes).double()
-        self.fcs = torch.nn.ModuleList([torch.nn.Linear(numHiddenNodes, numHiddenNodes).double()
-                    for _ in range(numHiddenLayers)])
-        # 1 outputs : u
-        self.fcLast = torch.nn.Linear(numHiddenNodes, 1).double()
-
-        # Initialise lambda1, lambda2 as in paper
-        # self.lambda1 = torch.nn.Parameter(torch.tensor(0.))
-        # self.lambda2 = torch.nn.Parameter(torch.tensor(-6.))
-
-        # Initalise lambda1, lambda2 randomly
-        # N.B. should replace exp(lambda2) with lambda2 if doing this
-        self.lambda1 = torch.nn.Parameter(torch.rand(1))
-        self.lambda2 = torch.nn.Parameter(torch.rand(1))
-
-    def forward(self, input):
-        hidden = torch.tanh(self.fc1(input))
-        for i in range(len(self.fcs)):
-            hidden = torch.tanh(self.fcs[i](hidden))
-        # No activation function on final layer
-        out = self.fcLast(hidden)
-        return out
-
-
-def train(network, lossFn, optimiser, scheduler, loader, numEpochs):
-    """Trains the neural network"""
-    costList = []
-    lambda1List = []
-    lambda2List = []
-    network.train(True)
-    for _ in range(numEpochs):
-        for batch in loader:
-            input, batch_u_exact = batch
-            u_out = network.forward(input)
-            # print(u_out)
-            du = grad(u_out, input, torch.ones_like(u_out), retain_graph=True, create_graph=True)[0]
-            # print(du)
-            d2u = grad(du, input, torch.ones_like(du), retain_graph=True, create_graph=True)[0]
-            # print(d2u)
-
-            # Use torch.split to preserve grad history
-            u_x, u_t = torch.split(du, 1, dim =1)
-            # print(u_t)
-            # print(u_x)
-            u_xx, u_tt = torch.split(d2u, 1, dim =1)
-            # print(u_xx)
-
-            # DE with exp(lambda2)
-            diffEqLHS = u_t + (network.lambda1 * u_out * u_x) - (torch.exp(network.lambda2) * u_xx)
-
-            # DE without exp(lambda2), i.e. just with lambda2
-            # diffEqLHS = u_t + (network.lambda1 * u_out * u_x) - (network.lambda2 * u_xx)
-
-            uLoss = lossFn(u_out, batch_u_exact)
-            DELoss = lossFn(diffEqLHS, torch.zeros_like(diffEqLHS))
-
-            loss = uLoss + DELoss
-            loss.backward()
-
-            # Examine lambda1, lambda2 grads
-            # print("lambda1 grad = ", network.lambda1.grad)
-            # print("lambda2 grad = ", network.lambda2.grad)
-
-            optimiser.step()
-            optimiser.zero_grad()
-
-        # update scheduler, tracks loss and updates learning rate if on plateau   
-        scheduler.step(loss)
-
-        # store final loss of each epoch
-        costList.append(loss.detach().numpy())
-        lambda1List.append(network.lambda1.item())
-        lambda2List.append(torch.exp(network.lambda2).item())
-
-    print("u_train loss = ", uLoss.item())
-    print("DE_train loss = ", DELoss.item())
-    print("current train loss = ", loss.detach().numpy())
-
-    network.train(False)
-    return costList, lambda1List, lambda2List
-
 def test(network, XT, u_exact, lossFn):
     """
     Tests network solution on all 25600 sample points
     """
-    testData = DataSet(XT , u_exact, XT.shape[0])
+    testData = DataSet(XT , u_exact, XT.shape[0], dtype = torch.float64)
     batch, batch_u_exact = testData.data_in
-    u_out = network.forward(batch)
-
-    du = grad(u_out, batch, torch.ones_like(u_out), retain_graph=True, create_graph=True)[0]
-    # print(du)
-
-    d2u = grad(du, batch, torch.ones_like(du), retain_graph=True, create_graph=True)[0]
-    # print(d2u)
-
-    u_x, u_t = torch.split(du, 1, dim =1)
-    # print(u_t)
-    # print(u_x)
-
-    u_xx, u_tt = torch.split(d2u, 1, dim =1)
+    # network output u(x,t) and its partial derivatives u_x, u_t, u_xx
+    u_out, u_x, u_t, u_xx = derivatives(network, batch, [(0,0), (1,0), (0,1), (2,0)])
     # print(u_xx)
 
     diffEqLHS = u_t + (network.lambda1 * u_out * u_x) - (torch.exp(network.lambda2) * u_xx)
@@ -195,18 +83,7 @@ def plotNetwork(network, X, T, XT, u_exact, epoch):
 
 # load and format sample data (dictionary) for u(x,t)
 # there are 25600 samples in total 
-data = scipy.io.loadmat('burgersData.mat')
-
-t = data['t'].flatten()[:,None]
-x = data['x'].flatten()[:,None]
-Exact = np.real(data['usol']).T
-# print(Exact)
-
-X, T = np.meshgrid(x,t)
-
-XT = np.hstack((X.flatten()[:,None], T.flatten()[:,None]))
-# `print(XT.shape)
-u_exact = Exact.flatten()[:,None]
+X, T, XT, u_exact = loadData('burgersData.mat')
 # print(u_exact)
 # print(u_exact.reshape(X.shape[0],X.shape[1]))
 # print(u_exact.shape)
@@ -214,39 +91,38 @@ u_exact = Exact.flatten()[:,None]
 # number of training samples
 numSamples = 2000
 
-try: # load saved network if possible
-    checkpoint = torch.load('burgersSimultaneousTanh64bit.pth')
+metrics = MetricsRecorder(['cost', 'lambda1', 'lambda2']) # cost, lambda1 and lambda2 of every epoch
+
+network = BurgersEquationSolver(numHiddenNodes=32, numHiddenLayers=8, activation = 'tanh', dtype = torch.float64, learnCoefficients = True)
+optimiser = torch.optim.Adam(network.parameters(), lr = 1e-3)
+# optimiser = torch.optim.LBFGS(network.parameters(), lr = 1e-3)
+scheduler = torch.optim.lr_scheduler.ReduceLROnPlateau(
+    optimiser, 
+    factor=0.5, 
+    patience=500, 
+    threshold=1e-4, 
+    cooldown=0, 
+    min_lr=0, 
+    eps=1e-8, 
+    verbose=True
+)
+# state_dicts only, written in the background; the 3 most recent are kept
+checkpoints = CheckpointWriter('burgersSimultaneousTanh64bit.pth')
+checkpoint = checkpoints.load()
+if checkpoint is not None: # load saved network if possible
     epoch = checkpoint['epoch']
-    network = checkpoint['network']
-    trainData = checkpoint['trainData']
-    optimiser = checkpoint['optimiser']
-    scheduler = checkpoint['scheduler']
-    losses = checkpoint['losses']
-    lambda1s = checkpoint['lambda1s']
-    lambda2s = checkpoint['lambda2s']
+    network.load_state_dict(checkpoint['network'])
+    optimiser.load_state_dict(checkpoint['optimiser'])
+    scheduler.load_state_dict(checkpoint['scheduler'])
+    metrics.load_state_dict(checkpoint['metrics'])
+    trainData = checkpoint['trainData'] # tensors of the (x,t) samples and their u(x,t)
     print("model loaded")
-except: # create new network
+else:
     epoch = 0
-    network    = Fitter(numHiddenNodes=32, numHiddenLayers=8)
-    optimiser  = torch.optim.Adam(network.parameters(), lr = 1e-3)
-    # optimiser = torch.optim.LBFGS(network.parameters(), lr = 1e-3)
-    scheduler = torch.optim.lr_scheduler.ReduceLROnPlateau(
-        optimiser, 
-        factor=0.5, 
-        patience=500, 
-        threshold=1e-4, 
-        cooldown=0, 
-        min_lr=0, 
-        eps=1e-8, 
-        verbose=True
-    )
-    losses = []
-    lambda1s = []
-    lambda2s = []
-    trainData = DataSet(XT, u_exact, numSamples)
+    trainData = DataSet(XT, u_exact, numSamples, dtype = torch.float64).data_in
     print("new model created")
 
-trainLoader = torch.utils.data.DataLoader(dataset=trainData, batch_size=numSamples, shuffle=True)
+trainLoader = TensorLoader(trainData, batchSize = numSamples, shuffle = True)
 lossFn   = torch.nn.MSELoss()
 # for n in network.parameters():
 #     print(n)
@@ -259,45 +135,50 @@ test(network, XT, u_exact, lossFn)
 
 iterations = 0
 numEpochs = 10000 # number of epochs to train each iteration
-while iterations < 10:
-    newLoss, newLambda1, newLambda2 = train(network, lossFn, optimiser, scheduler, trainLoader, numEpochs)
-    losses.extend(newLoss)
-    lambda1s.extend(newLambda1)
-    lambda2s.extend(newLambda2)
-    iterations += 1
-    epoch += numEpochs
-
-    plotNetwork(network, X, T, XT, u_exact, epoch)
-    plt.semilogy(losses)
-    plt.xlabel("Epochs", fontsize = 16)
-    plt.ylabel("Cost", fontsize = 16)
-    plt.title("Burger's Equation Training Cost", fontsize = 16)
-    plt.show()
-
-    plt.plot(lambda1s)
-    plt.xlabel("Epochs", fontsize = 16)
-    plt.ylabel("\u03BB\u2081 Value", fontsize = 16)
-    plt.title("Burger's Equation \u03BB\u2081 Values", fontsize = 16)
-    plt.show()
-
-    plt.plot(lambda2s)
-    plt.xlabel("Epochs", fontsize = 16)
-    plt.ylabel("\u03BB\u2082 Value", fontsize = 16)
-    plt.title("Burger's Equation \u03BB\u2082 Values", fontsize = 16)
-    plt.show()
+# enabled = True for a breakdown of the time spent in every phase of training,
+# profileSteps = (first, last) for a torch.profiler trace of those steps
+timer = PhaseTimer(enabled = False, profileSteps = None, tracePath = 'burgersSimultaneousTanh64bitTrace.json')
+try:
+    while iterations < 10:
+        train(network, lossFn, optimiser, scheduler, trainLoader, numEpochs, metrics, timer)
+        print("current train loss = ", metrics.last('cost'))
+        if timer.enabled:
+            print(timer.report())
+        iterations += 1
+        epoch += numEpochs
+
+        plotNetwork(network, X, T, XT, u_exact, epoch)
+        metrics.plot('cost')
+        plt.xlabel("Epochs", fontsize = 16)
+        plt.ylabel("Cost", fontsize = 16)
+        plt.title("Burger's Equation Training Cost", fontsize = 16)
+        plt.show()
+
+        metrics.plot('lambda1', logScale = False)
+        plt.xlabel("Epochs", fontsize = 16)
+        plt.ylabel("\u03BB\u2081 Value", fontsize = 16)
+        plt.title("Burger's Equation \u03BB\u2081 Values", fontsize = 16)
+        plt.show()
+
+        metrics.plot('lambda2', logScale = False)
+        plt.xlabel("Epochs", fontsize = 16)
+        plt.ylabel("\u03BB\u2082 Value", fontsize = 16)
+        plt.title("Burger's Equation \u03BB\u2082 Values", fontsize = 16)
+        plt.show()
     
-    # save network
-    checkpoint = { 
-    'epoch': epoch,
-    'network': network,
-    'trainData' : trainData,
-    'optimiser': optimiser,
-    'scheduler': scheduler,
-    'losses': losses,
-    'lambda1s' : lambda1s,
-    'lambda2s' : lambda2s
-    }
-    torch.save(checkpoint, 'burgersSimultaneousTanh64bit.pth')
+        # save network
+        checkpoint = { 
+        'epoch': epoch,
+        'network': network,
+        'trainData' : trainData,
+        'optimiser': optimiser,
+        'scheduler': scheduler,
+        'metrics': metrics.state_dict()
+        }
+        checkpoints.save(checkpoint, epoch)
+finally:
+    timer.close() # stops a profiler window that training ended inside
+checkpoints.wait() # the last checkpoint is on disk
 
 print("Final value of lambda1 = ", network.lambda1.item())
 print("Final value of lambda2 = ", torch.exp(network.lambda2).item())
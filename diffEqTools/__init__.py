@@ -0,0 +1,6 @@
+"""
+Shared, importable tools used by the scripts in LagarisProblems, ThreeBodyProblem and burgersEquation.
+Scripts run from their own folder, so they add the repository root to sys.path before importing these modules.
+The Lagaris problems can also be trained headless from the repository root with
+`python -m diffEqTools run --problem N`, see lagaris.py.
+"""
@@ -0,0 +1,148 @@
+"""
+Command line entry point, run from the repository root, e.g.
+
+    python -m diffEqTools run --problem 8 --sampler lattice --epochs 10000
+    python -m diffEqTools run --problem 5 --epochs 2000 --timing --profile-steps 100 110 --trace prob5.json
+    python -m diffEqTools sweep --problem 5 --lr 1e-3 2e-3 5e-3 1e-2 --epochs 10000 --out prob5Sweep.pth
+    python -m diffEqTools ensemble --problem 8 --sampler lattice uniform sobol halton --epochs 10000
+    python -m diffEqTools benchmark --batch-size 100 1000 --width 16 128 --depth 1 8 --out benchmark.json
+    python -m diffEqTools list
+
+Training is headless; figures are only drawn with --plot.
+"""
+import argparse
+import torch
+from diffEqTools.lagaris import PROBLEMS, SAMPLERS, run, plotSolution
+from diffEqTools.sweep import grid, sweep
+from diffEqTools.ensemble import runEnsemble
+from diffEqTools.benchmark import CASES, benchmark
+from diffEqTools.burgers import ACTIVATIONS
+from diffEqTools.profiling import PhaseTimer
+
+
+def addTimingArguments(parser):
+    parser.add_argument('--timing', action = 'store_true',
+                        help = "print the time spent in every phase of a training step")
+    parser.add_argument('--profile-steps', type = int, nargs = 2, default = None, metavar = ('FIRST', 'LAST'),
+                        help = "record a torch.profiler trace of steps FIRST to LAST (implies --timing)")
+    parser.add_argument('--trace', default = 'trace.json', help = "file the torch.profiler trace is written to")
+
+def main(args = None):
+    parser = argparse.ArgumentParser(prog = 'python -m diffEqTools',
+                                     description = "Solve the Lagaris problems with neural networks")
+    commands = parser.add_subparsers(dest = 'command', required = True)
+    commands.add_parser('list', help = "list the registered problems")
+
+    runParser = commands.add_parser('run', help = "train a network to solve one problem")
+    runParser.add_argument('--problem', type = int, required = True, choices = sorted(PROBLEMS))
+    runParser.add_argument('--sampler', default = 'lattice', choices = SAMPLERS)
+    runParser.add_argument('--epochs', type = int, default = 10000)
+    runParser.add_argument('--samples', type = int, default = None,
+                           help = "training points along every axis (default: the problem's own)")
+    runParser.add_argument('--batch-size', type = int, default = None, help = "default: all training points")
+    runParser.add_argument('--hidden-nodes', type = int, default = None)
+    runParser.add_argument('--lr', type = float, default = None)
+    runParser.add_argument('--refresh-interval', type = int, default = None,
+                           help = "epochs between regenerations of random training points")
+    runParser.add_argument('--seed', type = int, default = None)
+    runParser.add_argument('--save', default = None, help = "file the network and cost list are saved to")
+    runParser.add_argument('--plot', nargs = '?', const = '', default = None, metavar = 'FILE',
+                           help = "plot the cost and solution, saved to FILE if given, otherwise shown")
+    addTimingArguments(runParser)
+
+    sweepParser = commands.add_parser('sweep', help = "train every combination of the given settings in parallel")
+    sweepParser.add_argument('--problem', type = int, nargs = '+', required = True, choices = sorted(PROBLEMS))
+    sweepParser.add_argument('--sampler', nargs = '+', default = ['lattice'], choices = SAMPLERS)
+    sweepParser.add_argument('--lr', type = float, nargs = '+', default = [None])
+    sweepParser.add_argument('--epochs', type = int, nargs = '+', default = [10000])
+    sweepParser.add_argument('--samples', type = int, nargs = '+', default = [None])
+    sweepParser.add_argument('--hidden-nodes', type = int, nargs = '+', default = [None])
+    sweepParser.add_argument('--seed', type = int, nargs = '+', default = [None])
+    sweepParser.add_argument('--workers', type = int, default = None, help = "default: one per available core")
+    sweepParser.add_argument('--threads', type = int, default = 1, help = "torch threads in every worker")
+    sweepParser.add_argument('--out', default = None, help = "file the results are saved to")
+
+    ensembleParser = commands.add_parser('ensemble', help = "train one network per learning rate and/or sampler "
+                                                            "together, in one batched computation")
+    ensembleParser.add_argument('--problem', type = int, required = True, choices = sorted(PROBLEMS))
+    ensembleParser.add_argument('--sampler', nargs = '+', default = None, choices = SAMPLERS)
+    ensembleParser.add_argument('--lr', type = float, nargs = '+', default = None)
+    ensembleParser.add_argument('--epochs', type = int, default = 10000)
+    ensembleParser.add_argument('--samples', type = int, default = None)
+    ensembleParser.add_argument('--hidden-nodes', type = int, default = None)
+    ensembleParser.add_argument('--seed', type = int, default = None)
+    ensembleParser.add_argument('--out', default = None, help = "file the results are saved to")
+    addTimingArguments(ensembleParser)
+
+    benchmarkParser = commands.add_parser('benchmark', help = "measure the training throughput of every problem")
+    benchmarkParser.add_argument('--case', nargs = '+', default = CASES, choices = CASES)
+    benchmarkParser.add_argument('--batch-size', type = int, nargs = '+', default = [1000])
+    benchmarkParser.add_argument('--width', type = int, nargs = '+', default = [16])
+    benchmarkParser.add_argument('--depth', type = int, nargs = '+', default = [1],
+                                 help = "hidden layers after the first, of the three-body and Burgers networks")
+    benchmarkParser.add_argument('--dtype', nargs = '+', default = ['float32'], choices = ['float32', 'float64'])
+    benchmarkParser.add_argument('--activation', nargs = '+', default = ['tanh'], choices = ACTIVATIONS,
+                                 help = "activation functions of the Burgers' equation networks")
+    benchmarkParser.add_argument('--device', default = 'cpu')
+    benchmarkParser.add_argument('--warmup', type = int, default = 10)
+    benchmarkParser.add_argument('--steps', type = int, default = 100)
+    benchmarkParser.add_argument('--threads', type = int, default = None)
+    benchmarkParser.add_argument('--no-isolate', action = 'store_true',
+                                 help = "run every configuration in this process instead of a new one")
+    benchmarkParser.add_argument('--out', default = None, help = "JSON file the results are written to")
+    args = parser.parse_args(args)
+
+    if args.command == 'list':
+        for number, problem in PROBLEMS.items():
+            print(f"{number}: {problem.name}, {problem.numInputs} input(s) on {problem.ranges}")
+        return
+
+    if args.command == 'sweep':
+        configs = grid(problemNumber = args.problem, sampler = args.sampler, learningRate = args.lr,
+                       numEpochs = args.epochs, numSamples = args.samples, numHiddenNodes = args.hidden_nodes,
+                       seed = args.seed)
+        sweep(configs, numWorkers = args.workers, threadsPerWorker = args.threads, resultsPath = args.out)
+        return
+
+    if args.command in ('run', 'ensemble'):
+        timer = PhaseTimer(enabled = args.timing or args.profile_steps is not None,
+                           profileSteps = args.profile_steps, tracePath = args.trace)
+
+    if args.command == 'ensemble':
+        result = runEnsemble(args.problem, learningRates = args.lr, samplers = args.sampler, numEpochs = args.epochs,
+                             numSamples = args.samples, numHiddenNodes = args.hidden_nodes, seed = args.seed,
+                             timer = timer)
+        print(f"{len(result['costLists'])} networks, {args.epochs} epochs in {result['trainingTime']:.2f} seconds")
+        for k, (costList, error) in enumerate(zip(result['costLists'], result['errors'])):
+            print(f"network {k}: final cost = {costList[-1]:.3e}, MSE against exact solution = {error:.3e}")
+        if timer.enabled:
+            print(timer.report())
+        if args.out is not None:
+            torch.save({'costLists': result['costLists'], 'errors': result['errors'],
+                        'state': result['ensemble'].state_dict()}, args.out)
+        return
+
+    if args.command == 'benchmark':
+        benchmark(args.case, args.batch_size, args.width, args.depth, args.dtype, args.activation, args.device,
+                  args.warmup, args.steps, args.threads, isolate = not args.no_isolate, resultsPath = args.out)
+        return
+
+    result = run(args.problem, sampler = args.sampler, numEpochs = args.epochs, numSamples = args.samples,
+                 batchSize = args.batch_size, numHiddenNodes = args.hidden_nodes, learningRate = args.lr,
+                 refreshInterval = args.refresh_interval, seed = args.seed, timer = timer)
+    print(f"problem {args.problem}, sampler {args.sampler}: {args.epochs} epochs in "
+          f"{result['trainingTime']:.2f} seconds, final cost = {result['costList'][-1]:.3e}, "
+          f"MSE against exact solution = {result['error']:.3e}")
+    if timer.enabled:
+        print(timer.report())
+
+    if args.save is not None:
+        torch.save({'network': result['network'], 'costList': result['costList']}, args.save)
+    if args.plot is not None:
+        plotSolution(PROBLEMS[args.problem], result['network'], result['costList'],
+                     title = f"Problem {args.problem}, Sampling Method: {args.sampler}",
+                     path = args.plot or None)
+
+
+if __name__ == '__main__':
+    main()
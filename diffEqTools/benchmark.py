@@ -0,0 +1,259 @@
+import os
+import sys
+import json
+import time
+import platform
+import itertools
+import functools
+import multiprocessing
+import torch
+from diffEqTools.burgers import BurgersEquationSolver, DataSet, loadData, trainU, trainDE
+from diffEqTools.burgers import train as trainBurgers
+from diffEqTools.lagaris import PROBLEMS, TanhNetwork
+from diffEqTools.loaders import TensorLoader
+from diffEqTools.metrics import MetricsRecorder
+from diffEqTools.sampling import BundleSampler
+from diffEqTools.solutionBundles import SolutionBundle
+from diffEqTools.solutionBundles import train as trainBundle
+from diffEqTools.trialGeometry import GeometryCache
+
+try: # not available on Windows
+    import resource
+except ImportError:
+    resource = None
+
+# names of all benchmarks, see buildCase
+CASES = ['lagaris' + str(number) for number in PROBLEMS] + ['threeBody', 'burgersU', 'burgersDE', 'burgers']
+REPOSITORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@functools.lru_cache(maxsize = None)
+def burgersData():
+    """
+    Returns the inputs (x,t) of shape (25600,2) and the values u(x,t) of shape (25600,1) of burgersData.mat
+    """
+    _, _, XT, u_exact = loadData(os.path.join(REPOSITORY, 'burgersEquation', 'burgersData.mat'))
+    return XT, u_exact
+
+
+def lagarisStep(problemNumber, batchSize, width, depth, device):
+    """
+    One full-batch training step of a Lagaris problem on 'batchSize' uniformly sampled points
+    with cached geometry terms, as in lagaris.train. The networks have a single hidden layer, so depth must be 1.
+    """
+    if depth != 1:
+        raise ValueError("the Lagaris networks have a single hidden layer")
+    problem = PROBLEMS[problemNumber]
+    network = TanhNetwork(problem.numInputs, width, problem.numOutputs).to(device)
+    lower = torch.tensor([valueRange[0] for valueRange in problem.ranges], device = device)
+    sizes = torch.tensor([valueRange[1] - valueRange[0] for valueRange in problem.ranges], device = device)
+    points = (lower + sizes * torch.rand(batchSize, problem.numInputs, device = device)).requires_grad_()
+    terms = None if problem.geometry is None else GeometryCache(problem.geometry, points).terms
+    optimiser = torch.optim.Adam(network.parameters(), lr = 1e-3)
+
+    def step():
+        D = problem.residual(network, points, terms)
+        cost = (D**2).mean(0).sum()
+        cost.backward()
+        optimiser.step()
+        optimiser.zero_grad()
+    return step
+
+def threeBodyStep(batchSize, width, depth, device):
+    """
+    One call of solutionBundles.train with the SolutionBundle network of the three-body scripts ('depth'
+    hidden layers after the first): sampling a batch, the residual cost, backpropagation and Adam, with the
+    ranges and settings of threeBodyOriginalMethod.py
+    """
+    network = SolutionBundle(numHiddenNodes = width, numHiddenLayers = depth).to(device)
+    ranges = [[1.05,1.052], [0.099, 0.101], [-0.5,-0.4], [-0.3,-0.2], [-0.01,3]]
+    sampler = BundleSampler(ranges, batchSize, device)
+    lossFn = torch.nn.MSELoss()
+    optimiser = torch.optim.Adam(network.parameters(), lr = 1e-3)
+    mu, lmbda = 0.01, 2
+
+    def step():
+        trainBundle(network, lossFn, optimiser, sampler, mu, lmbda)
+    return step
+
+def burgersStep(mode, activation, batchSize, width, depth, dtype, device):
+    """
+    One epoch of the Burgers' equation training with the given activation and precision, with the
+    BurgersEquationSolver network of the Burgers' equation scripts ('depth' hidden layers after the first)
+    on 'batchSize' samples of burgersData.mat: 'burgersU' is burgers.trainU, fitting u(x,t), 'burgersDE' is
+    burgers.trainDE, fitting lambda1, lambda2 to the equation, and 'burgers' is burgers.train, fitting
+    u and lambda together
+    """
+    dtype = getattr(torch, dtype)
+    network = BurgersEquationSolver(numHiddenNodes = width, numHiddenLayers = depth, activation = activation,
+                                    dtype = dtype, learnCoefficients = mode == 'burgers').to(device)
+    XT, u_exact = burgersData()
+    trainData = DataSet(XT, u_exact, batchSize, dtype = dtype)
+    loader = TensorLoader(tuple(tensor.to(device) for tensor in trainData.data_in), batchSize = batchSize,
+                          shuffle = True)
+    lossFn = torch.nn.MSELoss()
+    lambda1 = torch.rand(1, dtype = dtype, device = device, requires_grad = True)
+    lambda2 = torch.rand(1, dtype = dtype, device = device, requires_grad = True)
+    parameters = [lambda1, lambda2] if mode == 'burgersDE' else network.parameters()
+    optimiser = torch.optim.Adam(parameters, lr = 1e-3)
+    scheduler = torch.optim.lr_scheduler.ReduceLROnPlateau(optimiser, factor = 0.5, patience = 500,
+                                                           threshold = 1e-4, min_lr = 1e-6)
+    metrics = MetricsRecorder(['cost'] if mode == 'burgersU' else ['cost', 'lambda1', 'lambda2'])
+
+    def step():
+        if mode == 'burgersU':
+            trainU(network, lossFn, optimiser, scheduler, loader, 1, metrics)
+        elif mode == 'burgersDE':
+            trainDE(network, lambda1, lambda2, lossFn, optimiser, scheduler, loader, 1, metrics)
+        else:
+            trainBurgers(network, lossFn, optimiser, scheduler, loader, 1, metrics)
+    return step
+
+def buildCase(case, batchSize, width, depth, device, activation = 'tanh', dtype = 'float32'):
+    """
+    Returns the function performing one training step of the benchmark 'case' (one of CASES);
+    the activation (one of burgers.ACTIVATIONS) and dtype configure the Burgers' equation network
+    """
+    if case.startswith('lagaris'):
+        return lagarisStep(int(case[len('lagaris'):]), batchSize, width, depth, device)
+    if case == 'threeBody':
+        return threeBodyStep(batchSize, width, depth, device)
+    if case in ('burgersU', 'burgersDE', 'burgers'):
+        return burgersStep(case, activation, batchSize, width, depth, dtype, device)
+    raise ValueError(f"unknown benchmark '{case}', expected one of {CASES}")
+
+def residentMemory():
+    """
+    Returns the current and the peak resident set size of this process in bytes (None if unavailable)
+    """
+    current = None
+    try: # Linux
+        with open('/proc/self/statm') as statm:
+            current = int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        pass
+    peak = None
+    if resource is not None:
+        # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == 'darwin' else 1024)
+    return current, peak
+
+def runCase(config):
+    """
+    Times one benchmark configuration
+
+    Arguments:
+    config (dict) -- 'case', 'batchSize', 'width', 'depth', 'activation' (of the Burgers' equation cases),
+        'dtype' ('float32' or 'float64'), 'device', 'warmupSteps', 'steps' and 'threads' (torch intra-op threads,
+        left unchanged if None)
+
+    Returns:
+    result (dict) -- the config and 'stepsPerSecond', 'samplesPerSecond', 'secondsPerStep', 'rssBefore',
+        'rssAfter' and 'peakRSS' (bytes), and for CUDA devices the allocator's 'peakAllocated', 'peakReserved',
+        'numAllocs' and 'allocRetries'; 'error' instead if the configuration could not run
+    """
+    result = dict(config)
+    device = torch.device(config['device'])
+    previousDtype = torch.get_default_dtype()
+    if config.get('threads') is not None:
+        torch.set_num_threads(config['threads'])
+    torch.set_default_dtype(getattr(torch, config['dtype']))
+    try:
+        torch.manual_seed(0)
+        result['rssBefore'], _ = residentMemory()
+        step = buildCase(config['case'], config['batchSize'], config['width'], config['depth'], device,
+                         config.get('activation') or 'tanh', config['dtype'])
+        for _ in range(config['warmupSteps']):
+            step()
+        if device.type == 'cuda':
+            torch.cuda.synchronize(device)
+            torch.cuda.reset_peak_memory_stats(device)
+        start = time.perf_counter()
+        for _ in range(config['steps']):
+            step()
+        if device.type == 'cuda':
+            torch.cuda.synchronize(device) # wait for the last step to finish
+        elapsed = time.perf_counter() - start
+    except (ValueError, RuntimeError) as error: # e.g. an unsupported depth, or out of memory
+        result['error'] = str(error)
+        return result
+    finally:
+        torch.set_default_dtype(previousDtype)
+
+    result['secondsPerStep'] = elapsed / config['steps']
+    result['stepsPerSecond'] = config['steps'] / elapsed
+    result['samplesPerSecond'] = config['steps'] * config['batchSize'] / elapsed
+    result['rssAfter'], result['peakRSS'] = residentMemory()
+    if device.type == 'cuda':
+        stats = torch.cuda.memory_stats(device)
+        result['peakAllocated'] = stats.get('allocated_bytes.all.peak')
+        result['peakReserved'] = stats.get('reserved_bytes.all.peak')
+        result['numAllocs'] = stats.get('allocation.all.allocated')
+        result['allocRetries'] = stats.get('num_alloc_retries')
+    return result
+
+def environment():
+    """
+    Returns a description of the machine and library versions the benchmarks ran on
+    """
+    return {'torch': torch.__version__, 'python': platform.python_version(), 'platform': platform.platform(),
+            'processor': platform.processor(), 'cpuCount': os.cpu_count(), 'threads': torch.get_num_threads(),
+            'cuda': torch.cuda.get_device_name(0) if torch.cuda.is_available() else None}
+
+def benchmark(cases = CASES, batchSizes = [1000], widths = [16], depths = [1], dtypes = ['float32'],
+              activations = ['tanh'], device = 'cpu', warmupSteps = 10, steps = 100, threads = None, isolate = True, resultsPath = None,
+              verbose = True):
+    """
+    Measures the training throughput of every combination of the given cases and settings
+
+    Arguments:
+    cases (list of strings) -- benchmarks to run, see CASES
+    batchSizes (list of ints) -- number of points (or samples) in every batch
+    widths (list of ints) -- numbers of nodes in every hidden layer
+    depths (list of ints) -- numbers of hidden layers after the first for the deep networks (three-body
+        and Burgers); the Lagaris networks only run with depth 1
+    dtypes (list of strings) -- 'float32' and/or 'float64', the precision of the networks and data
+    activations (list of strings) -- activation functions of the Burgers' equation cases, see burgers.ACTIVATIONS
+    device (string) -- e.g. 'cpu' or 'cuda'
+    warmupSteps (int) -- untimed steps before the timing starts
+    steps (int) -- timed steps
+    threads (int or None) -- torch intra-op threads, left unchanged if None
+    isolate (bool) -- if True, every configuration runs in a new process, started with 'spawn' as in sweep.py,
+        so its peak RSS and allocator state do not depend on the configurations before it
+    resultsPath (string or None) -- if given, the environment and results are written to this file as JSON
+    verbose (bool) -- if True, prints a line for every configuration
+
+    Returns:
+    results (list of dicts) -- result of runCase for every configuration
+    """
+    configs = [{'case': case, 'batchSize': batchSize, 'width': width, 'depth': depth,
+                'activation': activation if case.startswith('burgers') else None, 'dtype': dtype,
+                'device': device, 'warmupSteps': warmupSteps, 'steps': steps, 'threads': threads}
+               for case, batchSize, width, depth, activation, dtype
+               in itertools.product(cases, batchSizes, widths, depths, activations, dtypes)
+               if (depth == 1 or not case.startswith('lagaris'))
+               and (case.startswith('burgers') or activation == activations[0])]
+    pool = None
+    if isolate: # a fresh interpreter for every configuration, also safe for CUDA
+        pool = multiprocessing.get_context('spawn').Pool(processes = 1, maxtasksperchild = 1)
+
+    results = []
+    for config in configs:
+        result = runCase(config) if pool is None else pool.apply(runCase, (config,))
+        results.append(result)
+        if verbose:
+            settings = f"{config['case']:>10} batch {config['batchSize']:>6} width {config['width']:>4} " \
+                       f"depth {config['depth']:>2} {config['activation'] or '':>5} {config['dtype']}"
+            if 'error' in result:
+                print(f"{settings}: {result['error']}")
+            else:
+                print(f"{settings}: {result['stepsPerSecond']:10.1f} steps/s {result['samplesPerSecond']:12.0f} samples/s"
+                      + ("" if result['peakRSS'] is None else f" peak RSS {result['peakRSS'] / 2**20:8.1f} MB"))
+    if pool is not None:
+        pool.close()
+        pool.join()
+
+    if resultsPath is not None:
+        with open(resultsPath, 'w') as file:
+            json.dump({'environment': environment(), 'results': results}, file, indent = 1)
+    return results
@@ -0,0 +1,300 @@
+import numpy as np
+import torch
+import torch.utils.data
+from diffEqTools.derivatives import derivatives
+from diffEqTools.profiling import NO_TIMER
+
+# activation functions of the networks, see BurgersEquationSolver
+ACTIVATIONS = ['tanh', 'silu', 'swish']
+
+
+def loadData(path):
+    """
+    Loads and formats the sample data of u(x,t), there are 25600 samples in total
+
+    Arguments:
+    path (string) -- path of burgersData.mat
+
+    Returns:
+    X, T (arrays of shape (100, 256)) -- grids of the x- and t-values of the samples
+    XT (array of shape (25600, 2)) -- (x,t) input samples
+    u_exact (array of shape (25600, 1)) -- exact values u(x,t) at every sample
+    """
+    import scipy.io # only the Burgers' equation needs scipy
+    data = scipy.io.loadmat(path)
+    t = data['t'].flatten()[:,None]
+    x = data['x'].flatten()[:,None]
+    Exact = np.real(data['usol']).T
+    X, T = np.meshgrid(x,t)
+
+    XT = np.hstack((X.flatten()[:,None], T.flatten()[:,None]))
+    u_exact = Exact.flatten()[:,None]
+    return X, T, XT, u_exact
+
+class DataSet(torch.utils.data.Dataset):
+    """Samples 'numSamples' random samples of (x, t, u(x,t)) training data from data set of 25,600"""
+    def __init__(self, XT, u_exact, numSamples, dtype = torch.float32):
+        """
+        Arguments:
+        XT (array of shape (25600, 2)) -- (x,t) input samples
+        u_exact (array of shape (25600, 1)) -- exact values u(x,t) for training
+        numSamples (int) -- number of training data samples required
+        dtype (torch.dtype) -- precision of the samples, torch.float32 or torch.float64
+
+        Returns:
+        DataSet object with one attribute:
+            data_in (tuple of PyTorch tensors of shape (numSamples,2) and (numSamples,1)) -- 'numSamples'
+                randomly sampled (x,t) points with their corresponding function values u(x,t)
+        """
+        # generate numSamples random indices to get training samples
+        idx = np.random.choice(XT.shape[0], numSamples, replace=False)
+
+        # store (x,t) values and u(x,t) values in two separate tensors
+        XT_train = torch.tensor(XT[idx,:], dtype = dtype, requires_grad=True)
+        u_train = torch.tensor(u_exact[idx,:], dtype = dtype, requires_grad=True)
+
+        # input of forward function must have shape (batch_size, 2)
+        # u-values for training must have shape (batch_size, 1)
+        self.data_in = (XT_train, u_train)
+
+    def __len__(self):
+        return self.data_in[0].shape[0]
+
+    def __getitem__(self, idx):
+        return (self.data_in[0][idx,:], self.data_in[1][idx])
+
+def silu(x):
+    return x * torch.sigmoid(x)
+
+def swish(x, mu):
+    return x * torch.sigmoid(mu*x)
+
+class BurgersEquationSolver(torch.nn.Module):
+    """
+    A deep neural network object, with 2 nodes in the input layer, 1 node in the
+    output layer, and 'numHiddenLayers' hidden layers each with 'numHiddenNodes' nodes.
+    Used by all of the Burgers' equation scripts.
+    """
+    def __init__(self, numHiddenNodes, numHiddenLayers, activation = 'tanh', dtype = torch.float32,
+                 initGain = None, bounds = None, learnCoefficients = False):
+        """
+        Arguments:
+        numHiddenNodes (int) -- number of nodes in hidden layers
+        numHiddenLayers (int) -- number of hidden layers
+        activation (string) -- activation function of the hidden layers, one of ACTIVATIONS; 'swish'
+            has a trainable factor mu in every layer
+        dtype (torch.dtype) -- precision of the parameters, torch.float32 or torch.float64
+        initGain (string or None) -- nonlinearity of the gain of the Xavier initialisation, e.g. 'tanh';
+            PyTorch's default initialisation if None
+        bounds (tuple of tensors of shape (2) or None) -- lower and upper bounds of (x,t); if given, inputs
+            are scaled to [-1,1]
+        learnCoefficients (bool) -- if True, the parameters lambda1 and lambda2 of Burger's equation
+            are trained alongside the network
+
+        Returns:
+        BurgersEquationSolver object (neural network) with three attributes:
+        fc1 (fully connected layer) -- linear transformation of first layer
+        fcs (list of fully connected layers) -- linear transformations of hidden layers
+        fcLast (fully connected layer) -- linear transformation of outer layer
+        """
+        super(BurgersEquationSolver, self).__init__()
+        if activation not in ACTIVATIONS:
+            raise ValueError(f"unknown activation '{activation}', expected one of {ACTIVATIONS}")
+        self.activation = activation
+        self.initGain = initGain
+        # create first layer with 2 inputs (x and t)
+        self.fc1 = torch.nn.Linear(2, numHiddenNodes, dtype = dtype)
+        # create list of hidden layers
+        self.fcs = torch.nn.ModuleList([torch.nn.Linear(numHiddenNodes, numHiddenNodes, dtype = dtype)
+                    for _ in range(numHiddenLayers)])
+        # create final layer with one output (u(x,t))
+        self.fcLast = torch.nn.Linear(numHiddenNodes, 1, dtype = dtype)
+        if initGain is not None: # apply Xavier initialisation
+            self.apply(self.initWeightsXavier)
+
+        if learnCoefficients: # initialise parameters lambda1, lambda2 randomly
+            self.lambda1 = torch.nn.Parameter(torch.rand(1, dtype = dtype))
+            self.lambda2 = torch.nn.Parameter(torch.rand(1, dtype = dtype))
+        if activation == 'swish': # trainable multiplicative factors mu in swish activation function
+            self.mus = torch.nn.ParameterList([torch.nn.Parameter(torch.tensor(1., dtype = dtype))
+                                               for _ in range(numHiddenLayers+1)])
+        self.normalise = bounds is not None
+        if self.normalise: # not in the state_dict, the bounds are given with the data
+            self.register_buffer('lb', torch.as_tensor(bounds[0], dtype = dtype), persistent = False)
+            self.register_buffer('ub', torch.as_tensor(bounds[1], dtype = dtype), persistent = False)
+
+    def activate(self, z, layer):
+        """
+        Applies the activation function to the output z of the layer with index 'layer'
+        """
+        if self.activation == 'tanh':
+            return torch.tanh(z)
+        if self.activation == 'silu':
+            return silu(z)
+        return swish(z, self.mus[layer])
+
+    def forward(self, input):
+        """
+        Function which performs forward propagation in the neural network.
+
+        Arguments:
+        input (PyTorch tensor shape (batchSize, 2)) -- input of neural network
+        Returns:
+        output (PyTorch tensor shape (batchSize, 1)) -- output of neural network
+        """
+        if self.normalise: # scale (x,t) to [-1,1]
+            input = 2.0*(input - self.lb)/(self.ub - self.lb) - 1.0
+        hidden = self.activate(self.fc1(input), 0)
+        # pass through all hidden layers
+        for i in range(len(self.fcs)):
+            hidden = self.activate(self.fcs[i](hidden), i+1)
+        # No activation function on final layer
+        output = self.fcLast(hidden)
+        return output
+
+    def initWeightsXavier(self, layer):
+        """
+        Function which initialises weights according to Xavier initialisation
+
+        Arguments:
+        layer (Linear object) -- weights and biases of a layer
+        Returns:
+        None
+        """
+        if type(layer) == torch.nn.Linear:
+            torch.nn.init.xavier_uniform_(layer.weight, gain = torch.nn.init.calculate_gain(self.initGain))
+
+def trainU(network, lossFn, optimiser, scheduler, loader, numEpochs, metrics, timer = NO_TIMER):
+    """
+    A function to train a neural network to approximate the solution u(x,t) to Burger's equation
+    based on sample data from the exact solution
+
+    Arguments:
+    network (Module) -- the neural network
+    lossFn (Loss Function) -- network's loss function
+    optimiser (Optimiser) -- carries out parameter optimisation
+    scheduler (Learning Rate Scheduler) -- reduces learning rate if cost value is plateauing
+    loader (TensorLoader) -- generates batches from the training dataset
+    numEpochs (int) -- number of training epochs
+    metrics (MetricsRecorder) -- records the cost of every epoch
+    timer (PhaseTimer) -- if enabled, records the time spent in every phase of training
+    """
+    network.train(True) # set network into training mode
+    for _ in range(numEpochs):
+        timer.restart() # storing the costs is not attributed to the next phase
+        for batch in loader:
+            input, batch_u_exact = batch # separate (x,t) and u(x,t) values
+            timer.lap('sampling')
+            u_out = network.forward(input) # pass batch of values (x,t) through network
+            timer.lap('forward')
+
+            cost = lossFn(u_out, batch_u_exact) # calculate cost
+            timer.lap('residual')
+            cost.backward() # perform back propagation
+            timer.lap('backward')
+            optimiser.step() # update parameters
+            optimiser.zero_grad() # reset gradients to zero
+            timer.lap('optimiser')
+            timer.step()
+
+        scheduler.step(cost) # update scheduler, reduces learning rate if on plateau
+        timer.lap('scheduler')
+        metrics.record(cost.detach()) # store final cost of each epoch
+
+    network.train(False)
+
+def trainDE(network, lambda1, lambda2, lossFn, optimiser, scheduler, loader, numEpochs, metrics, timer = NO_TIMER):
+    """
+    A function to approximate the parameter values lambda1 and lambda2 in Burger's equation
+    using a neural network which has been trained to approximate the solution function
+
+    Arguments:
+    network (Module) -- the neural network
+    lambda1 (tensor of shape (1)) -- the parameter lambda1
+    lambda2 (tensor of shape (1)) -- the parameter lambda2, the equation uses exp(lambda2)
+    lossFn (Loss Function) -- network's loss function
+    optimiser (Optimiser) -- carries out parameter optimisation
+    scheduler (Learning Rate Scheduler) -- reduces learning rate if cost value is plateauing
+    loader (TensorLoader) -- generates batches from the training dataset
+    numEpochs (int) -- number of training epochs for every batch
+    metrics (MetricsRecorder) -- records the cost, lambda1 and exp(lambda2) of every step
+    timer (PhaseTimer) -- if enabled, records the time spent in every phase of training
+    """
+    network.train(True) # set network into train mode
+    timer.restart()
+    for batch in loader:
+        # calculate u(x,t) and its derivative only once
+        input, batch_u_exact = batch # separate (x,t) and u(x,t) values
+        timer.lap('sampling')
+        # network output u(x,t) and its partial derivatives u_x, u_t, u_xx
+        u_out, u_x, u_t, u_xx = derivatives(network, input, [(0,0), (1,0), (0,1), (2,0)], timer = timer)
+
+        for _ in range(numEpochs): # with u and its derivatives fixed, train lambda1 and lambda2
+            timer.restart() # storing the costs is not attributed to the next phase
+            # since we know lambda2 will always be positive, we train with exp(lambda2)
+            diffEqLHS = u_t + (lambda1 * u_out * u_x) - (torch.exp(lambda2) * u_xx)
+
+            cost = lossFn(diffEqLHS, torch.zeros_like(diffEqLHS))
+            timer.lap('residual')
+
+            cost.backward(retain_graph = True) # perform back propagation
+            timer.lap('backward')
+            optimiser.step() # update parameters
+            optimiser.zero_grad() # reset gradients to zero
+            timer.lap('optimiser')
+            timer.step()
+            scheduler.step(cost) # update scheduler, reduces learning rate if on plateau
+            timer.lap('scheduler')
+
+            # store final cost, lambda1- and lambda2-values of each epoch
+            metrics.record(cost.detach(), lambda1.detach().clone(), torch.exp(lambda2.detach()))
+
+    network.train(False)
+
+def train(network, lossFn, optimiser, scheduler, loader, numEpochs, metrics, timer = NO_TIMER):
+    """
+    A function to train a neural network to approximate the solution u(x,t) to Burger's equation,
+    while simultaneously estimating the parameters lambda1 and lambda2 from the equation
+
+    Arguments:
+    network (Module) -- the neural network, created with learnCoefficients = True
+    lossFn (Loss Function) -- network's loss function
+    optimiser (Optimiser) -- carries out parameter optimisation
+    scheduler (Learning Rate Scheduler) -- reduces learning rate if cost value is plateauing
+    loader (TensorLoader) -- generates batches from the training dataset
+    numEpochs (int) -- number of training epochs
+    metrics (MetricsRecorder) -- records the cost, lambda1 and exp(lambda2) of every epoch
+    timer (PhaseTimer) -- if enabled, records the time spent in every phase of training
+    """
+    network.train(True) # set network into training mode
+    for _ in range(numEpochs):
+        timer.restart() # storing the costs is not attributed to the next phase
+        for batch in loader:
+            input, batch_u_exact = batch # separate inputs (x,t) and exact values u(x,t)
+            timer.lap('sampling')
+            # network output u(x,t) and its partial derivatives u_x, u_t, u_xx
+            u_out, u_x, u_t, u_xx = derivatives(network, input, [(0,0), (1,0), (0,1), (2,0)], timer = timer)
+
+            # evaluate differential equation
+            # since we know lambda2 will always be positive, we train with exp(lambda2)
+            diffEqLHS = u_t + (network.lambda1 * u_out * u_x) - (torch.exp(network.lambda2) * u_xx)
+
+            # calculate J_u and J_D, cost functions for approximation of u(x,t) and DE respectively
+            uCost = lossFn(u_out, batch_u_exact)
+            DECost = lossFn(diffEqLHS, torch.zeros_like(diffEqLHS))
+            cost = uCost + DECost
+            timer.lap('residual')
+
+            cost.backward() # perform back propagation
+            timer.lap('backward')
+            optimiser.step() # update parameters
+            optimiser.zero_grad() # reset gradients to zero
+            timer.lap('optimiser')
+            timer.step()
+
+        scheduler.step(cost) # update scheduler, reduces learning rate if on plateau
+        timer.lap('scheduler')
+        # store cost, lambda1- and lambda2-value of each epoch
+        metrics.record(cost.detach(), network.lambda1.detach().clone(), torch.exp(network.lambda2.detach()))
+
+    network.train(False)
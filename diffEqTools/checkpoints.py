@@ -0,0 +1,281 @@
+import os
+import glob
+import pickle
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+import torch
+from diffEqTools.metrics import MetricsRecorder
+
+
+def stateDicts(checkpoint):
+    """
+    Replaces every object with a state_dict method (network, optimiser, scheduler, MetricsRecorder) in a
+    checkpoint dictionary by its state_dict, leaving numbers, strings and tensors as they are
+
+    Arguments:
+    checkpoint (dict) -- e.g. {'batchNum': batchNum, 'network': network, 'optimiser': optimiser}
+
+    Returns:
+    state (dict) -- the checkpoint holding only tensors and plain Python values
+    """
+    return {key: value.state_dict() if hasattr(value, 'state_dict') else value for key, value in checkpoint.items()}
+
+def loadState(path, map_location = None):
+    """
+    Reads a checkpoint of state_dicts, or one written before them (a pickled dictionary holding the
+    network, optimiser and scheduler objects, whose classes must then be defined), with its objects
+    converted to state_dicts
+
+    Arguments:
+    path (string) -- the checkpoint file
+    map_location -- device the tensors are loaded onto, see torch.load
+
+    Returns:
+    state (dict) -- the checkpoint, holding only tensors and plain Python values
+    """
+    try:
+        return torch.load(path, map_location = map_location, weights_only = True)
+    except pickle.UnpicklingError: # pickled objects, refused by the weights-only unpickler
+        return stateDicts(torch.load(path, map_location = map_location, weights_only = False))
+
+def detachedCopy(state):
+    """
+    Copies every tensor in a (nested) state on the CPU, so that it can be written while training goes on
+    and updates the original tensors in place
+    """
+    if isinstance(state, torch.Tensor):
+        return state.detach().to('cpu', copy = True)
+    if isinstance(state, dict):
+        return {key: detachedCopy(value) for key, value in state.items()}
+    if isinstance(state, (list, tuple)):
+        return type(state)(detachedCopy(value) for value in state)
+    return state
+
+
+class CheckpointWriter:
+    """
+    Saves checkpoints of state_dicts only (no pickled modules or optimisers), so that they can be loaded
+    into networks of a refactored class and read with torch.load(..., weights_only = True).
+    save() copies the state on the calling thread and writes it on a background thread, first to a
+    temporary file which is then renamed, so an interrupted write never replaces a good checkpoint.
+    Checkpoints are numbered by step ('name.50000.pth' for path 'name.pth') and only the last 'keep' are kept;
+    load() returns the newest one that can be read.
+    """
+    def __init__(self, path, keep = 3):
+        """
+        Arguments:
+        path (string) -- file name the checkpoints are numbered from, e.g. 'threeBodyOriginalMethod.pth'
+        keep (int) -- number of most recent checkpoints kept on disk
+
+        Returns:
+        CheckpointWriter object
+        """
+        self.path = path
+        self.stem, self.extension = os.path.splitext(path)
+        self.keep = keep
+        self.executor = ThreadPoolExecutor(max_workers = 1)
+        self.pending = None
+
+    def checkpointPath(self, step):
+        return f"{self.stem}.{step}{self.extension}"
+
+    def checkpoints(self):
+        """
+        Returns the (step, path) of every numbered checkpoint on disk, oldest first
+        """
+        found = []
+        for path in glob.glob(glob.escape(self.stem) + '.*' + glob.escape(self.extension)):
+            step = path[len(self.stem) + 1:len(path) - len(self.extension)]
+            if step.isdigit():
+                found.append((int(step), path))
+        return sorted(found)
+
+    def save(self, checkpoint, step):
+        """
+        Starts writing a checkpoint, after the previous one has been written
+
+        Arguments:
+        checkpoint (dict) -- values to be saved; networks, optimisers, schedulers and MetricsRecorders
+            are saved as their state_dicts (see stateDicts)
+        step (int) -- number of the checkpoint, e.g. the batch number
+
+        Returns:
+        None
+        """
+        self.wait()
+        state = detachedCopy(stateDicts(checkpoint))
+        self.pending = self.executor.submit(self.write, state, step)
+
+    def write(self, state, step):
+        path = self.checkpointPath(step)
+        temporaryPath = path + '.tmp'
+        with open(temporaryPath, 'wb') as file:
+            torch.save(state, file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporaryPath, path) # atomic, readers see either the old file or the complete new one
+        for _, oldPath in self.checkpoints()[:-self.keep]:
+            os.remove(oldPath)
+
+    def wait(self):
+        """
+        Waits until the checkpoint being written, if any, is on disk, raising any error of the write
+        """
+        if self.pending is not None:
+            pending, self.pending = self.pending, None
+            pending.result()
+
+    def load(self, map_location = None):
+        """
+        Returns the newest checkpoint that can be read, or None if there is none. A checkpoint written
+        before state_dict-only checkpoints (a pickled dictionary at 'path' itself) is read if there is no
+        numbered one, with its objects converted to state_dicts.
+        """
+        self.wait()
+        for _, path in reversed(self.checkpoints()):
+            try:
+                return torch.load(path, map_location = map_location, weights_only = True)
+            except Exception as error:
+                print(f"could not read checkpoint {path}: {error}")
+        if os.path.exists(self.path):
+            return loadState(self.path, map_location)
+        return None
+
+
+def splitTensors(state, tensors):
+    """
+    Replaces every tensor in a (nested) state by a placeholder {'tensor': index}, appending it to 'tensors'
+    """
+    if isinstance(state, torch.Tensor):
+        tensors.append(state)
+        return {'tensor': len(tensors) - 1}
+    if isinstance(state, dict):
+        return {key: splitTensors(value, tensors) for key, value in state.items()}
+    if isinstance(state, (list, tuple)):
+        return type(state)(splitTensors(value, tensors) for value in state)
+    return state
+
+def joinTensors(state, tensors):
+    """
+    Inverse of splitTensors, puts the tensors back in place of their placeholders
+    """
+    if isinstance(state, dict):
+        if list(state) == ['tensor']:
+            return tensors[state['tensor']]
+        return {key: joinTensors(value, tensors) for key, value in state.items()}
+    if isinstance(state, (list, tuple)):
+        return type(state)(joinTensors(value, tensors) for value in state)
+    return state
+
+
+class DeltaCheckpointWriter(CheckpointWriter):
+    """
+    Checkpoints whose cost does not grow with the length of the run. All tensors (parameters, optimiser
+    moments) are kept in one memory-mapped file ('name.tensors' for path 'name.pth') that is overwritten in
+    place rather than re-serialised into a new file at every checkpoint. The file holds two copies and the
+    checkpoint alternates between them, so the copy the last checkpoint points to is never being written.
+    Everything else (step numbers, scheduler and sampler state) is saved to a small file 'name.state.pth',
+    replaced atomically once the tensors are on disk, which also records which file and copy are current.
+    MetricsRecorders with a log file are saved as their number of steps only; their history is the log,
+    appended to as training goes on, and replayed from it when loaded.
+
+    Writing happens on a background thread as for CheckpointWriter. Only the latest checkpoint is kept;
+    numbered snapshots to go back to can be kept alongside it with a CheckpointWriter of the same path,
+    which load() falls back to.
+    """
+    def __init__(self, path):
+        """
+        Arguments:
+        path (string) -- file name the checkpoint files are named from, e.g. 'threeBodyOriginalMethod.pth';
+            numbered or older pickled checkpoints at this path are read if there is no delta checkpoint
+
+        Returns:
+        DeltaCheckpointWriter object
+        """
+        super(DeltaCheckpointWriter, self).__init__(path)
+        # a new layout of the tensors is written to the file not in use, so the current one stays intact
+        self.tensorPaths = [self.stem + '.tensors', self.stem + '.new.tensors']
+        self.statePath = self.stem + '.state' + self.extension
+
+    def save(self, checkpoint, step):
+        """
+        Starts writing a checkpoint, after the previous one has been written, see CheckpointWriter.save
+        """
+        self.wait()
+        checkpoint = {key: value.state_dict(windows = False) if isinstance(value, MetricsRecorder) else value
+                      for key, value in checkpoint.items()}
+        state = detachedCopy(stateDicts(checkpoint))
+        self.pending = self.executor.submit(self.write, state, step)
+
+    def tensorPath(self, meta):
+        """
+        Returns the path of the tensor file of a checkpoint (the first file for checkpoints that did not record it)
+        """
+        return os.path.join(os.path.dirname(self.stem), meta.get('tensorFile', os.path.basename(self.tensorPaths[0])))
+
+    def write(self, state, step):
+        tensors = []
+        skeleton = splitTensors(state, tensors)
+        layout, offset = [], 0
+        for tensor in tensors:
+            numBytes = tensor.numel() * tensor.element_size()
+            layout.append((list(tensor.shape), str(tensor.dtype).replace('torch.', ''), offset, numBytes))
+            offset += numBytes
+        slotSize = offset
+
+        previous = self.readState()
+        if previous is not None and [entry[:2] for entry in previous['layout']] == [entry[:2] for entry in layout] \
+                and os.path.exists(self.tensorPath(previous)) \
+                and os.path.getsize(self.tensorPath(previous)) == 2 * slotSize:
+            tensorPath = self.tensorPath(previous)
+            slot = 1 - previous['slot'] # the copy not in use by the last checkpoint
+            storage = np.memmap(tensorPath, dtype = np.uint8, mode = 'r+')
+        else: # first checkpoint, or the tensors changed shape: a new file, not the one the last checkpoint uses
+            current = None if previous is None else self.tensorPath(previous)
+            tensorPath = self.tensorPaths[1] if current == self.tensorPaths[0] else self.tensorPaths[0]
+            slot = 0
+            storage = np.memmap(tensorPath, dtype = np.uint8, mode = 'w+', shape = (max(2 * slotSize, 1),))
+        for tensor, (_, _, offset, numBytes) in zip(tensors, layout):
+            start = slot * slotSize + offset
+            storage[start:start + numBytes] = tensor.reshape(-1).view(torch.uint8).numpy()
+        storage.flush()
+        del storage
+
+        temporaryPath = self.statePath + '.tmp'
+        with open(temporaryPath, 'wb') as file:
+            torch.save({'step': step, 'slot': slot, 'slotSize': slotSize, 'layout': layout, 'state': skeleton,
+                        'tensorFile': os.path.basename(tensorPath)}, file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporaryPath, self.statePath) # the checkpoint now points to the copy just written
+        for otherPath in self.tensorPaths: # the file of an older layout, no longer used
+            if otherPath != tensorPath and os.path.exists(otherPath):
+                os.remove(otherPath)
+
+    def readState(self):
+        if not os.path.exists(self.statePath):
+            return None
+        return torch.load(self.statePath, weights_only = True)
+
+    def load(self, map_location = None):
+        """
+        Returns the last checkpoint, or None if there is none, see CheckpointWriter.load
+        """
+        self.wait()
+        try:
+            meta = self.readState()
+            if meta is not None:
+                storage = np.memmap(self.tensorPath(meta), dtype = np.uint8, mode = 'r')
+                base = meta['slot'] * meta['slotSize']
+                tensors = [torch.from_numpy(np.array(storage[base + offset:base + offset + numBytes]))
+                           .view(getattr(torch, dtype)).reshape(shape)
+                           for shape, dtype, offset, numBytes in meta['layout']]
+                del storage
+        except Exception as error:
+            print(f"could not read checkpoint {self.statePath}: {error}")
+            meta = None
+        if meta is None:
+            return super(DeltaCheckpointWriter, self).load(map_location)
+        if map_location is not None:
+            tensors = [tensor.to(map_location) for tensor in tensors]
+        return joinTensors(meta['state'], tensors)
@@ -0,0 +1,183 @@
+import math
+import torch
+import torch.autograd.forward_ad as fwAD
+from torch.autograd import grad
+from diffEqTools.profiling import NO_TIMER
+
+
+def tanhDerivatives(t, order):
+    """
+    Derivatives of tanh up to a given order, written as polynomials in t = tanh(z):
+    tanh^(k+1)(z) = P_k'(t) * (1 - t^2) where tanh^(k)(z) = P_k(t)
+
+    Arguments:
+    t (tensor) -- values of tanh(z)
+    order (int) -- highest derivative required
+
+    Returns:
+    derivatives (list of length order+1) -- tanh(z), tanh'(z), ..., tanh^(order)(z), each shaped like t
+    """
+    coeffs = [0., 1.] # P_0(t) = t, coefficients of increasing powers of t
+    derivatives = [t]
+    tSquared = t * t
+    for k in range(1, order + 1):
+        dCoeffs = [i * coeffs[i] for i in range(1, len(coeffs))]
+        # multiply P_k'(t) by (1 - t^2)
+        coeffs = [(dCoeffs[i] if i < len(dCoeffs) else 0.) - (dCoeffs[i - 2] if i >= 2 else 0.)
+                  for i in range(len(dCoeffs) + 2)]
+        # P_k is even for odd k and odd for even k, so evaluate it by Horner's method in t^2
+        parity = (k + 1) % 2
+        powers = coeffs[parity::2]
+        value = tSquared * powers[-1] + powers[-2]
+        for c in reversed(powers[:-2]):
+            value = value * tSquared + c
+        derivatives.append(value * t if parity else value)
+    return derivatives
+
+def tanhNetworkJet(network, inputs, multiIndices):
+    """
+    Partial derivatives w.r.t. the inputs of a network with one tanh hidden layer, out = fc2(tanh(fc1(input))),
+    as used for the Lagaris problems. With z = fc1(input) and W the weights of fc1, every partial derivative has
+    the closed form
+        d^k out / dx_1^i_1 ... dx_d^i_d = tanh^(k)(z) @ (fc2.weight * prod_m W[:,m]^i_m).T,
+    so all of them come from one forward pass, without autograd w.r.t. the inputs. The results stay
+    differentiable w.r.t. the network parameters.
+
+    Arguments:
+    network (Module) -- the neural network, with layers fc1 and fc2
+    inputs (tensor of shape (batchSize, d)) -- points at which the derivatives are evaluated
+    multiIndices (list of tuples of length d) -- number of derivatives w.r.t. every input, e.g. for 2 inputs
+        (0,0) is the network output, (1,0) is d/dx, (0,2) is d^2/dy^2 and (2,1) is d^3/dx^2dy
+
+    Returns:
+    derivatives (list of tensors of shape (batchSize, outputs)) -- one tensor for every multi-index
+
+    The weights may also carry a leading dimension stacking K networks (see ensemble.StackedLinear), in which
+    case every derivative has shape (K, batchSize, outputs).
+    """
+    t = torch.tanh(network.fc1(inputs))
+    weights = network.fc1.weight # shape (numHiddenNodes, d), or (K, numHiddenNodes, d)
+    outWeights = network.fc2.weight # shape (outputs, numHiddenNodes), or (K, outputs, numHiddenNodes)
+    numOutputs = outWeights.shape[-2]
+    sigma = tanhDerivatives(t, max(sum(index) for index in multiIndices))
+
+    derivatives = [None] * len(multiIndices)
+    for order in sorted(set(sum(index) for index in multiIndices)):
+        positions = [i for i, index in enumerate(multiIndices) if sum(index) == order]
+        if order == 0:
+            out = network.fc2(t)
+            for i in positions:
+                derivatives[i] = out
+            continue
+        # the chain rule factors prod_m W[:,m]^i_m only depend on the hidden node, so they scale the weights
+        # of fc2 rather than every point, and all multi-indices of one order share a single matrix product
+        # (the bias of fc2 is constant, so it drops out of every derivative)
+        scaledWeights = torch.cat([outWeights * math.prod([weights[...,m].unsqueeze(-2)**j
+                                                           for m, j in enumerate(multiIndices[i]) if j > 0])
+                                   for i in positions], -2)
+        out = sigma[order] @ scaledWeights.transpose(-1,-2)
+        for n, i in enumerate(positions):
+            derivatives[i] = out[..., n * numOutputs:(n + 1) * numOutputs]
+    return derivatives
+
+def derivativePlan(orders):
+    """
+    Chooses which derivatives are differentiated again to reach every requested partial derivative, reusing
+    lower-order derivatives shared between them, so that as few backward passes as possible are needed.
+    One backward pass of a derivative gives its derivatives w.r.t. every input at once.
+
+    Arguments:
+    orders (list of tuples of length d) -- requested multi-indices, see tanhNetworkJet
+
+    Returns:
+    children (dict) -- maps every multi-index that is differentiated to a list of (input, multi-index) pairs,
+        the derivatives it gives w.r.t. each input
+    """
+    computed = {(0,) * len(orders[0])}
+    children = {}
+
+    def require(index):
+        if index in computed:
+            return
+        parents = [(m, index[:m] + (index[m] - 1,) + index[m + 1:]) for m in range(len(index)) if index[m] > 0]
+        # prefer a parent that is differentiated anyway, then one that is computed anyway
+        parents.sort(key = lambda pair: (pair[1] not in children, pair[1] not in computed))
+        m, parent = parents[0]
+        require(parent)
+        children.setdefault(parent, []).append((m, index))
+        computed.add(index)
+
+    for index in sorted(set(orders), key = sum):
+        require(index)
+    return children
+
+def derivatives(network, inputs, orders, mode = 'reverse', timer = NO_TIMER):
+    """
+    Evaluates the network and the requested partial derivatives of its output w.r.t. the inputs,
+    replacing hand-chained grad calls. Every derivative keeps its graph, so a cost built from them can be
+    backpropagated to the network parameters.
+
+    Arguments:
+    network (Module) -- the neural network, with one output
+    inputs (tensor of shape (batchSize, d)) -- points at which the derivatives are evaluated
+    orders (list of tuples of length d) -- number of derivatives w.r.t. every input, e.g. for inputs (x,y)
+        (0,0) is the network output, (1,0) is n_x, (0,2) is n_yy and (2,1) is n_xxy
+    mode (string) -- 'reverse' takes each derivative by a backward pass through the previous one,
+        'forwardOverReverse' gets all second derivatives in a direction from a single backward pass
+        carrying a forward-mode tangent, which needs fewer passes when d is small (e.g. n_xx and n_yy
+        from two passes instead of three). Higher orders are always taken in reverse mode.
+    timer (PhaseTimer) -- if enabled, the network evaluation is timed as phase 'forward' and the grad calls
+        as phase 'derivatives' (both together as 'derivatives' in mode 'forwardOverReverse')
+
+    Returns:
+    derivatives (list of tensors of shape (batchSize, 1)) -- one tensor for every multi-index in orders
+    """
+    if not inputs.requires_grad:
+        inputs = inputs.detach().requires_grad_()
+    numInputs = inputs.shape[1]
+    children = derivativePlan(orders)
+    values = {}
+
+    if mode not in ('reverse', 'forwardOverReverse'):
+        raise ValueError(f"unknown differentiation mode '{mode}'")
+    # inputs differentiated to reach every second derivative, e.g. [0,1] for (1,1)
+    pairs = {index: [m for m in range(numInputs) for _ in range(index[m])]
+             for parent in children if sum(parent) == 1 for _, index in children[parent]}
+
+    if mode == 'reverse' or not pairs:
+        values[(0,) * numInputs] = network(inputs)
+        timer.lap('forward')
+    else:
+        # second derivatives w.r.t. (x_k, x_j) come from the tangent in direction j of the backward pass,
+        # so choose directions covering every required pair, favouring those covering the most pairs
+        directions = []
+        uncovered = list(pairs.values())
+        while uncovered:
+            direction = max(range(numInputs), key = lambda j: sum(j in pair for pair in uncovered))
+            directions.append(direction)
+            uncovered = [pair for pair in uncovered if direction not in pair]
+        for j in directions:
+            with fwAD.dual_level():
+                tangent = torch.zeros_like(inputs)
+                tangent[:,j] = 1
+                dualInputs = fwAD.make_dual(inputs, tangent)
+                dualOut = network(dualInputs)
+                gradient = grad(dualOut, dualInputs, torch.ones_like(dualOut), create_graph = True)[0]
+                out = fwAD.unpack_dual(dualOut).primal
+                gradient, hessianColumn = fwAD.unpack_dual(gradient)
+            values[(0,) * numInputs] = out
+            for m in range(numInputs):
+                values[tuple(int(i == m) for i in range(numInputs))] = gradient[:,m:m+1]
+            for index, pair in pairs.items():
+                if j in pair and index not in values:
+                    k = pair[1] if pair[0] == j else pair[0]
+                    values[index] = hessianColumn[:,k:k+1]
+        # derivatives up to second order are known, and only higher orders are left to the backward passes
+        children = {parent: indices for parent, indices in children.items() if sum(parent) >= 2}
+
+    for parent in sorted(children, key = sum):
+        gradient = grad(values[parent], inputs, torch.ones_like(values[parent]), create_graph = True)[0]
+        for m, index in children[parent]:
+            values[index] = gradient[:,m:m+1]
+    timer.lap('derivatives')
+    return [values[index] for index in orders]
@@ -0,0 +1,250 @@
+import math
+import time
+import torch
+from diffEqTools.derivatives import tanhNetworkJet
+from diffEqTools.lagaris import PROBLEMS, TanhNetwork, lattice, trainingData
+from diffEqTools.profiling import NO_TIMER
+from diffEqTools.sampling import AdaptivePoints
+from diffEqTools.trialGeometry import GeometryCache
+
+
+class StackedLinear(torch.nn.Module):
+    """
+    K independent linear layers with their parameters stacked along a leading dimension,
+    applied to the same inputs (shape (N,in)) or to one set of inputs per layer (shape (K,N,in))
+    with a single batched matrix product
+    """
+    def __init__(self, numModels, in_features, out_features):
+        """
+        Arguments:
+        numModels (int) -- number of stacked layers K
+        in_features (int) -- size of every input
+        out_features (int) -- size of every output
+
+        Returns:
+        StackedLinear object with two attributes:
+        weight (Parameter of shape (K, out_features, in_features))
+        bias (Parameter of shape (K, out_features))
+        """
+        super(StackedLinear, self).__init__()
+        # same initialisation as torch.nn.Linear, independently for every layer
+        bound = 1 / math.sqrt(in_features)
+        self.weight = torch.nn.Parameter(torch.empty(numModels, out_features, in_features).uniform_(-bound, bound))
+        self.bias = torch.nn.Parameter(torch.empty(numModels, out_features).uniform_(-bound, bound))
+
+    def forward(self, input):
+        """
+        Arguments:
+        input (PyTorch tensor shape (N,in_features) or (K,N,in_features))
+
+        Returns:
+        output (PyTorch tensor shape (K,N,out_features)) -- output of every layer
+        """
+        return torch.matmul(input, self.weight.transpose(-1,-2)) + self.bias.unsqueeze(-2)
+
+
+class EnsembleNetwork(torch.nn.Module):
+    """
+    K TanhNetworks of the same shape evaluated together: every layer is a StackedLinear, so the outputs,
+    input derivatives and costs of all K networks come from the same few batched kernels instead of
+    K separate small ones. Outputs have shape (K,N,numOutputs), and the residuals of lagaris.py broadcast
+    over the leading dimension.
+    """
+    def __init__(self, numModels, numInputs, numHiddenNodes, numOutputs = 1):
+        """
+        Arguments:
+        numModels (int) -- number of networks K
+        numInputs (int) -- number of inputs of every network
+        numHiddenNodes (int) -- number of nodes in the hidden layer of every network
+        numOutputs (int) -- number of outputs of every network
+
+        Returns:
+        EnsembleNetwork object with two attributes:
+        fc1 (StackedLinear) -- linear transformations of the hidden layers
+        fc2 (StackedLinear) -- linear transformations of the outer layers
+        """
+        super(EnsembleNetwork, self).__init__()
+        self.numModels = numModels
+        self.fc1 = StackedLinear(numModels, numInputs, numHiddenNodes)
+        self.fc2 = StackedLinear(numModels, numHiddenNodes, numOutputs)
+
+    def forward(self, input):
+        h = torch.tanh(self.fc1(input))
+        return self.fc2(h)
+
+    def forwardDerivatives(self, input, orders):
+        """
+        Outputs of all networks and their derivatives w.r.t. the input, see TanhNetwork.forwardDerivatives;
+        every derivative has shape (K,N,numOutputs)
+        """
+        return tanhNetworkJet(self, input, orders)
+
+    def loadMember(self, k, state):
+        """
+        Overwrites the parameters of network k with the state_dict of a TanhNetwork (or of any network
+        with layers fc1 and fc2 of the same shape, e.g. a PDESolver)
+        """
+        with torch.no_grad():
+            for name in ['fc1', 'fc2']:
+                getattr(self, name).weight[k].copy_(state[name + '.weight'])
+                getattr(self, name).bias[k].copy_(state[name + '.bias'])
+
+    def member(self, k):
+        """
+        Returns a TanhNetwork holding a copy of the current parameters of network k
+        """
+        numHiddenNodes, numInputs = self.fc1.weight.shape[1:]
+        network = TanhNetwork(numInputs, numHiddenNodes, self.fc2.weight.shape[1])
+        network.load_state_dict({'fc1.weight': self.fc1.weight[k], 'fc1.bias': self.fc1.bias[k],
+                                 'fc2.weight': self.fc2.weight[k], 'fc2.bias': self.fc2.bias[k]})
+        return network.to(self.fc1.weight.device)
+
+
+def trainEnsemble(problem, ensemble, points, learningRates, numEpochs, geometryCache = None, resamplers = None,
+                  timer = NO_TIMER):
+    """
+    Trains all networks of an ensemble together by full-batch Adam, each on its own mean squared residual.
+    The networks share no parameters, so the gradient of the summed costs is the gradient of every cost
+    w.r.t. its own network. Adam acts elementwise, so one optimiser over the stacked parameters takes
+    exactly the steps K separate optimisers would; the step of network k is scaled by its learning rate.
+
+    The stacked parameters of all K networks form a single parameter group, so there is no per-network
+    'lr' for the optimiser to read: Adam runs with lr = 1 and every step is rescaled afterwards. This
+    matches K separate runs only for a constant learning rate and an optimiser whose step is proportional
+    to it, as Adam's is. It does not carry over to a learning-rate scheduler (e.g. ReduceLROnPlateau,
+    which would see the summed cost and change the learning rates of all networks together) nor to an
+    optimiser whose state depends on the learning rate; train such networks separately with lagaris.run.
+
+    Arguments:
+    problem (LagarisProblem) -- the problem to be solved
+    ensemble (EnsembleNetwork) -- the K networks
+    points (PyTorch tensor shape (N,numInputs) or (K,N,numInputs)) -- training points shared by all networks,
+        or one set per network
+    learningRates (list of K floats) -- learning rate of every network
+    numEpochs (int) -- number of training epochs
+    geometryCache (GeometryCache or None) -- holds the geometry terms of 'points'
+    resamplers (list of K ResamplingDataSets or Nones, or None) -- if given, resamplers[k] regenerates
+        the points points[k] of network k as training goes on
+    timer (PhaseTimer) -- if enabled, records the time spent in every phase of training
+
+    Returns:
+    costLists (list of K lists of length 'numEpochs') -- cost values of all epochs, for every network
+    """
+    parameters = list(ensemble.parameters())
+    # Adam with lr = 1, and every step rescaled by the learning rate of its network (see above:
+    # valid only for Adam with constant learning rates)
+    optimiser = torch.optim.Adam(parameters, lr = 1)
+    rates = torch.tensor(learningRates, dtype = parameters[0].dtype, device = parameters[0].device)
+    scales = [rates.view(-1, *([1] * (parameter.dim() - 1))) for parameter in parameters]
+    terms = None if geometryCache is None else geometryCache.terms
+
+    costs = []
+    ensemble.train(True)
+    timer.restart()
+    for _ in range(numEpochs):
+        if resamplers is not None:
+            refreshed = False
+            for k, resampler in enumerate(resamplers):
+                if resampler is None:
+                    continue
+                network = None # only residual-based generators need network k, and only when they refresh
+                if isinstance(resampler.generator, AdaptivePoints) and resampler.epoch % resampler.refreshInterval == 0:
+                    network = ensemble.member(k)
+                if resampler.step(network):
+                    with torch.no_grad():
+                        points[k].copy_(resampler.data_in)
+                    refreshed = True
+            if refreshed and geometryCache is not None:
+                geometryCache.refresh()
+        timer.lap('sampling')
+        D = problem.residual(ensemble, points, terms)
+        cost = (D**2).mean(-2).sum(-1) # mean squared residual of every network, shape (K,)
+        timer.lap('residual')
+        cost.sum().backward()
+        timer.lap('backward')
+        previous = [parameter.detach().clone() for parameter in parameters]
+        optimiser.step()
+        optimiser.zero_grad()
+        with torch.no_grad():
+            for parameter, old, scale in zip(parameters, previous, scales):
+                parameter.sub_(old).mul_(scale).add_(old)
+        timer.lap('optimiser')
+        costs.append(cost.detach()) # kept on the device, so the loop never waits for a single cost
+        timer.step()
+    ensemble.train(False)
+    return torch.stack(costs, 1).tolist()
+
+def solutionErrors(problem, ensemble, numSamples = 50):
+    """
+    Mean squared difference between the trial solution of every network and the analytic solution,
+    on a lattice of test points (see lagaris.solutionError)
+
+    Returns:
+    errors (list of K floats)
+    """
+    points = lattice(problem.ranges, numSamples).detach()
+    with torch.no_grad():
+        return torch.mean((problem.trial(ensemble, points) - problem.solution(points))**2, (-2,-1)).tolist()
+
+def runEnsemble(problemNumber, learningRates = None, samplers = None, numEpochs = 10000, numSamples = None,
+                numHiddenNodes = None, refreshInterval = None, seed = None, initialState = None,
+                timer = NO_TIMER):
+    """
+    Trains K networks on one of the registered problems together, one for every learning rate and/or
+    sampling method, e.g. runEnsemble(5, learningRates = [1e-3, 2e-3, ...]) for a learning-rate study or
+    runEnsemble(8, samplers = ['lattice', 'uniform', 'sobol']) for a comparison of sampling methods.
+    Settings given as a single-element list (or None, for the problem's default) are shared by all networks.
+
+    Arguments:
+    problemNumber (int) -- key of the problem in PROBLEMS
+    learningRates (list of floats or None) -- learning rate of every network
+    samplers (list of strings or None) -- sampling method of the training points of every network,
+        'lattice' if None, see lagaris.trainingData
+    numEpochs (int) -- number of training epochs
+    numSamples (int or None) -- number of training points along every axis, the problem's default if None
+    numHiddenNodes (int or None) -- size of the hidden layers, the problem's default if None
+    refreshInterval (int or None) -- number of epochs between regenerations of random training points,
+        every epoch if None (every 100 epochs for the adaptive sampler)
+    seed (int or None) -- seed of the network initialisation and the training points
+    initialState (dict or None) -- state_dict of a network all K networks start from, e.g. from
+        problem5InitialNetwork.pth, independent random networks if None
+    timer (PhaseTimer) -- if enabled, records the time spent in every phase of training
+
+    Returns:
+    result (dict) -- 'ensemble', 'costLists' and 'errors' (one entry per network) and 'trainingTime' (seconds)
+    """
+    problem = PROBLEMS[problemNumber]
+    learningRates = [problem.learningRate] if learningRates is None else learningRates
+    samplers = ['lattice'] if samplers is None else samplers
+    numModels = max(len(learningRates), len(samplers))
+    learningRates = learningRates * numModels if len(learningRates) == 1 else learningRates
+    samplers = samplers * numModels if len(samplers) == 1 else samplers
+    if len(learningRates) != numModels or len(samplers) != numModels:
+        raise ValueError("learningRates and samplers must have the same length, or a single element")
+    if seed is not None:
+        torch.manual_seed(seed)
+
+    ensemble = EnsembleNetwork(numModels, problem.numInputs,
+                               problem.numHiddenNodes if numHiddenNodes is None else numHiddenNodes, problem.numOutputs)
+    if initialState is not None:
+        for k in range(numModels):
+            ensemble.loadMember(k, initialState)
+
+    if all(sampler == 'lattice' for sampler in samplers):
+        points, resamplers = lattice(problem.ranges, problem.numSamples if numSamples is None else numSamples), None
+    else:
+        data = [trainingData(problem, sampler, numSamples,
+                             refreshInterval or (100 if sampler == 'adaptive' else 1), seed) for sampler in samplers]
+        points = torch.stack([dataIn.detach() for dataIn, _ in data])
+        resamplers = [resampler for _, resampler in data]
+    geometryCache = None if problem.geometry is None else GeometryCache(problem.geometry, points)
+
+    start = time.time()
+    try:
+        costLists = trainEnsemble(problem, ensemble, points, learningRates, numEpochs, geometryCache, resamplers,
+                                  timer)
+    finally:
+        timer.close() # exports the profiler trace even if training ended before the profiled steps did
+    end = time.time()
+    return {'ensemble': ensemble, 'costLists': costLists, 'errors': solutionErrors(problem, ensemble),
+            'trainingTime': end - start}
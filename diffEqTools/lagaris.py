@@ -0,0 +1,517 @@
+import time
+import numpy as np
+import torch
+from diffEqTools.derivatives import tanhNetworkJet
+from diffEqTools.loaders import TensorLoader
+from diffEqTools.profiling import NO_TIMER
+from diffEqTools.sampling import (QMCSampler, AdaptiveSampler, ResamplingDataSet, UniformPoints, NormalPoints,
+                                  SequencePoints, AdaptivePoints)
+from diffEqTools.trialGeometry import GeometryCache
+
+# sampling methods of the training points, see trainingData
+SAMPLERS = ['lattice', 'uniform', 'normal', 'sobol', 'halton', 'adaptive']
+
+
+class TanhNetwork(torch.nn.Module):
+    """
+    The neural network used for all Lagaris problems, with 'numInputs' nodes in the input layer,
+    'numOutputs' nodes in the output layer, and 1 hidden layer with 'numHiddenNodes' nodes.
+    """
+    def __init__(self, numInputs, numHiddenNodes, numOutputs = 1):
+        """
+        Arguments:
+        numInputs (int) -- number of inputs, e.g. 2 for (x,y)
+        numHiddenNodes (int) -- number of nodes in hidden layer
+        numOutputs (int) -- number of outputs, one for every unknown function
+
+        Returns:
+        TanhNetwork object (neural network) with two attributes:
+        fc1 (fully connected layer) -- linear transformation of hidden layer
+        fc2 (fully connected layer) -- linear transformation of outer layer
+        """
+        super(TanhNetwork, self).__init__()
+        self.fc1 = torch.nn.Linear(in_features = numInputs, out_features = numHiddenNodes)
+        self.fc2 = torch.nn.Linear(in_features = numHiddenNodes, out_features = numOutputs)
+
+    def forward(self, input):
+        """
+        Function which connects inputs to outputs in the neural network.
+
+        Arguments:
+        input (PyTorch tensor shape (batchSize,numInputs)) -- input of neural network
+
+        Returns:
+        z (PyTorch tensor shape (batchSize,numOutputs)) -- output of neural network
+        """
+        # tanh activation function used on hidden layer
+        h = torch.tanh(self.fc1(input))
+        # Linear activation function used on outer layer
+        z = self.fc2(h)
+        return z
+
+    def forwardDerivatives(self, input, orders):
+        """
+        Output of the neural network together with its derivatives w.r.t. the input, in closed form from a single pass
+
+        Arguments:
+        input (PyTorch tensor shape (batchSize,numInputs)) -- input of neural network
+        orders (list of tuples of length numInputs) -- number of derivatives w.r.t. every input, e.g. (0,0) for
+            the output and (2,0) for d^2/dx^2
+
+        Returns:
+        derivatives (list of PyTorch tensors shape (batchSize,numOutputs)) -- output or derivative for every entry of orders
+        """
+        return tanhNetworkJet(self, input, orders)
+
+
+class LagarisProblem:
+    """
+    A differential equation from Lagaris et al., solved by a trial solution built from a TanhNetwork
+    which satisfies the boundary conditions exactly. Every function acts on a tensor of points of
+    shape (N, numInputs) and returns one column per unknown function or equation. Leading dimensions
+    broadcast, so the same functions evaluate a stack of networks (see ensemble.py) at once.
+    """
+    def __init__(self, name, ranges, trial, residual, solution, numOutputs = 1, geometry = None,
+                 numHiddenNodes = 10, numSamples = 20, learningRate = 1e-3):
+        """
+        Arguments:
+        name (string) -- short description of the problem
+        ranges (list of lists of length 2) -- lower and upper limits of every input, e.g. [xRange, yRange]
+        trial (function) -- called as trial(network, points), returns the trial solution(s), shape (N,numOutputs)
+        residual (function) -- called as residual(network, points, terms = None), returns the LHS D of the
+            differential equation(s) D = 0 for the trial solution, shape (N,numEquations)
+        solution (function) -- called as solution(points), returns the analytic solution(s), shape (N,numOutputs)
+        numOutputs (int) -- number of network outputs
+        geometry (function or None) -- called as geometry(points), returns the input-only terms of the
+            residual for a GeometryCache, or None if the residual has no such terms
+        numHiddenNodes (int) -- default size of the hidden layer
+        numSamples (int) -- default number of training points along every axis
+        learningRate (float) -- default learning rate of the Adam optimiser
+
+        Returns:
+        LagarisProblem object
+        """
+        self.name = name
+        self.ranges = ranges
+        self.trial = trial
+        self.residual = residual
+        self.solution = solution
+        self.numInputs = len(ranges)
+        self.numOutputs = numOutputs
+        self.geometry = geometry
+        self.numHiddenNodes = numHiddenNodes
+        self.numSamples = numSamples
+        self.learningRate = learningRate
+
+    def network(self, numHiddenNodes = None):
+        """
+        Returns a new, untrained TanhNetwork of the right shape for this problem
+        """
+        if numHiddenNodes is None:
+            numHiddenNodes = self.numHiddenNodes
+        return TanhNetwork(self.numInputs, numHiddenNodes, self.numOutputs)
+
+
+#### Problem 1: f' + (x + (1+3x^2)/(1+x+x^3)) f = x^3 + 2x + x^2 (1+3x^2)/(1+x+x^3), f(0) = 1
+
+def trial1(network, x):
+    """f(x) = 1 + x * N(x)"""
+    return 1 + x * network(x)
+
+def residual1(network, x, terms = None):
+    n_out, dndx = network.forwardDerivatives(x, [(0,), (1,)])
+    f_trial = 1 + x * n_out
+    df_trial = n_out + x * dndx
+    ratio = (1 + 3*x**2) / (1 + x + x**3)
+    return df_trial + (x + ratio) * f_trial - (x**3 + 2*x + x**2 * ratio)
+
+def solution1(x):
+    return torch.exp(-(x**2)/2) / (1 + x + x**3) + x**2
+
+#### Problem 2: f' + f/5 = exp(-x/5) cos(x), f(0) = 0
+
+def trial2(network, x):
+    """f(x) = x * N(x)"""
+    return x * network(x)
+
+def residual2(network, x, terms = None):
+    n_out, dndx = network.forwardDerivatives(x, [(0,), (1,)])
+    f_trial = x * n_out
+    df_trial = n_out + x * dndx
+    return torch.exp(-x/5) * torch.cos(x) - (df_trial + f_trial/5)
+
+def solution2(x):
+    return torch.exp(-x/5) * torch.sin(x)
+
+#### Problem 3: f'' + f'/5 + f = -exp(-x/5) cos(x) / 5, f(0) = 0, f'(0) = 1
+
+def trial3(network, x):
+    """f(x) = x + x^2 * N(x)"""
+    return x + x**2 * network(x)
+
+def residual3(network, x, terms = None):
+    n_out, dndx, d2ndx2 = network.forwardDerivatives(x, [(0,), (1,), (2,)])
+    f_trial = x + x**2 * n_out
+    df_trial = 1 + 2*x*n_out + x**2 * dndx
+    d2f_trial = 2*n_out + 4*x*dndx + x**2 * d2ndx2
+    return d2f_trial + df_trial/5 + f_trial + torch.exp(-x/5) * torch.cos(x) / 5
+
+def solution3(x):
+    return torch.exp(-x/5) * torch.sin(x)
+
+#### Problem 4: coupled first-order ODEs f1' = cos(x) + f1^2 + f2 - (1 + x^2 + sin(x)^2),
+#### f2' = 2x - (1+x^2) sin(x) + f1 f2, f1(0) = 0, f2(0) = 1
+
+def trial4(network, x):
+    """f1(x) = x * N1(x), f2(x) = 1 + x * N2(x)"""
+    n1_out, n2_out = torch.split(network(x), 1, dim=-1)
+    return torch.cat((x * n1_out, 1 + x * n2_out), -1)
+
+def residual4(network, x, terms = None):
+    n_out, dndx = network.forwardDerivatives(x, [(0,), (1,)])
+    n1_out, n2_out = torch.split(n_out, 1, dim=-1)
+    dn1dx, dn2dx = torch.split(dndx, 1, dim=-1)
+    f1_trial, f2_trial = x * n1_out, 1 + x * n2_out
+    df1_trial, df2_trial = n1_out + x * dn1dx, n2_out + x * dn2dx
+    D1 = df1_trial - (torch.cos(x) + f1_trial**2 + f2_trial - (1 + x**2 + torch.sin(x)**2))
+    D2 = df2_trial - (2*x - (1 + x**2) * torch.sin(x) + f1_trial * f2_trial)
+    return torch.cat((D1, D2), -1)
+
+def solution4(x):
+    return torch.cat((torch.sin(x), 1 + x**2), -1)
+
+#### Problem 5: f_xx + f_yy = exp(-x) (x - 2 + y^3 + 6y) with Dirichlet BCs on [0,1]^2
+
+def trialTerm5(x, y):
+    """First term in the trial solution, which satisfies the BCs"""
+    e_inv = np.exp(-1)
+    return ((1-x)*(y**3) + x*(1+(y**3))*e_inv + (1-y)*x*(torch.exp(-x)-e_inv) +
+            y * ((1+x)*torch.exp(-x) - (1-x+(2*x*e_inv))))
+
+def trial5(network, points):
+    """f(x,y) = trialTerm5(x,y) + x(1-x)y(1-y) N(x,y)"""
+    x, y = torch.split(points, 1, dim=-1)
+    return trialTerm5(x,y) + x*(1-x)*y*(1-y)*network(points)
+
+def geometry5(points):
+    """Columns x(1-x), y(1-y), 2(1-2x), 2(1-2y), second derivatives of trialTerm5 w.r.t. x and y, and the RHS"""
+    x, y = torch.split(points, 1, dim=-1)
+    trialTerm_xx = torch.exp(-x) * (x+y-2)
+    trialTerm_yy = np.exp(-1) * 6 * y * (-np.exp(1)*x + x + np.exp(1))
+    RHS = torch.exp(-x) * (x - 2 + y**3 + 6*y)
+    return torch.cat((x*(1-x), y*(1-y), 2*(1-2*x), 2*(1-2*y), trialTerm_xx, trialTerm_yy, RHS), -1)
+
+def residual5(network, points, terms = None):
+    if terms is None:
+        terms = geometry5(points)
+    xTerm, yTerm, dxTerm, dyTerm, trialTerm_xx, trialTerm_yy, RHS = torch.split(terms, 1, dim=-1)
+    n_out, n_x, n_y, n_xx, n_yy = network.forwardDerivatives(points, [(0,0), (1,0), (0,1), (2,0), (0,2)])
+    f_xx = trialTerm_xx + yTerm * (-2*n_out + dxTerm*n_x + xTerm*n_xx)
+    f_yy = trialTerm_yy + xTerm * (-2*n_out + dyTerm*n_y + yTerm*n_yy)
+    return f_xx + f_yy - RHS
+
+def solution5(points):
+    x, y = torch.split(points, 1, dim=-1)
+    return torch.exp(-x) * (x + y**3)
+
+#### Problems 7 and 8: f(0,y) = f(1,y) = f(x,0) = 0, f_y(x,1) = 2 sin(pi x) on [0,1]^2, with trial solutions
+#### F(x,y) + x(1-x)y [N(x,y) - N(x,1) - N_y(x,1)]
+
+def boundaryJet(network, points):
+    """
+    Network output and the derivatives needed by the trial solutions of problems 7 and 8, at (x,y) and at (x,1),
+    from one pass through the network
+
+    Arguments:
+    network (Module) -- the neural network
+    points (PyTorch tensor shape (batchSize,2)) -- (x,y) points
+
+    Returns:
+    A, A_x, A_xx (PyTorch tensors shape (batchSize,1)) -- A = N(x,y) - N(x,1) - N_y(x,1) and its derivatives w.r.t. x
+    n_y, n_yy (PyTorch tensors shape (batchSize,1)) -- N_y(x,y) and N_yy(x,y)
+    """
+    x, y = torch.split(points, 1, dim=-1)
+    # interior points (x,y) and boundary points (x,1) stacked, so they share one pass through the network
+    stacked = torch.cat((points, torch.cat((x, torch.ones_like(y)), -1)), -2)
+    jet = network.forwardDerivatives(stacked, [(0,0), (1,0), (0,1), (2,0), (0,2), (1,1), (2,1)])
+    (nXY, nX1), (nXY_x, nX1_x), (nXY_y, nX1_y), (nXY_xx, nX1_xx), (nXY_yy, _), (_, nX1_xy), (_, nX1_xxy) = \
+        [torch.split(derivative, points.shape[-2], dim=-2) for derivative in jet]
+    return nXY - nX1 - nX1_y, nXY_x - nX1_x - nX1_xy, nXY_xx - nX1_xx - nX1_xxy, nXY_y, nXY_yy
+
+def boundaryTrial(network, points, trialTerm):
+    """Trial solution trialTerm(x,y) + x(1-x)y [N(x,y) - N(x,1) - N_y(x,1)] of problems 7 and 8"""
+    x, y = torch.split(points, 1, dim=-1)
+    x1 = torch.cat((x, torch.ones_like(y)), -1)
+    nX1, nX1_y = network.forwardDerivatives(x1, [(0,0), (0,1)])
+    return trialTerm(x,y) + x*(1-x)*y*(network(points) - nX1 - nX1_y)
+
+def solution78(points):
+    x, y = torch.split(points, 1, dim=-1)
+    return y**2 * torch.sin(np.pi * x)
+
+#### Problem 7: f_xx + f_yy = (2 - pi^2 y^2) sin(pi x)
+
+def trial7(network, points):
+    return boundaryTrial(network, points, lambda x, y: 2 * y * torch.sin(np.pi * x))
+
+def geometry7(points):
+    """Columns y, x(1-x), 2(1-2x), second derivative of 2y sin(pi x) w.r.t. x, and the RHS"""
+    x, y = torch.split(points, 1, dim=-1)
+    sinPiX = torch.sin(np.pi * x)
+    return torch.cat((y, x*(1-x), 2*(1-2*x), -2 * y * np.pi**2 * sinPiX, (2 - (np.pi*y)**2) * sinPiX), -1)
+
+def residual7(network, points, terms = None):
+    if terms is None:
+        terms = geometry7(points)
+    y, xTerm, dxTerm, trialTerm_xx, RHS = torch.split(terms, 1, dim=-1)
+    A, A_x, A_xx, n_y, n_yy = boundaryJet(network, points)
+    f_xx = trialTerm_xx + y * (-2*A + dxTerm*A_x + xTerm*A_xx)
+    f_yy = xTerm * (2*n_y + y*n_yy)
+    return f_xx + f_yy - RHS
+
+#### Problem 8: f_xx + f_yy + f f_y = sin(pi x) (2 - pi^2 y^2 + 2 y^3 sin(pi x))
+
+def trial8(network, points):
+    return boundaryTrial(network, points, lambda x, y: y**2 * torch.sin(np.pi * x))
+
+def geometry8(points):
+    """Columns y, x(1-x), 2(1-2x), F(x,y) = y^2 sin(pi x), F_xx, F_y, F_yy, and the RHS"""
+    x, y = torch.split(points, 1, dim=-1)
+    sinPiX = torch.sin(np.pi * x)
+    F = y**2 * sinPiX
+    RHS = sinPiX * (2 - np.pi**2 * y**2 + 2 * y**3 * sinPiX)
+    return torch.cat((y, x*(1-x), 2*(1-2*x), F, -np.pi**2 * F, 2*y*sinPiX, 2*sinPiX, RHS), -1)
+
+def residual8(network, points, terms = None):
+    if terms is None:
+        terms = geometry8(points)
+    y, xTerm, dxTerm, F, F_xx, F_y, F_yy, RHS = torch.split(terms, 1, dim=-1)
+    A, A_x, A_xx, n_y, n_yy = boundaryJet(network, points)
+    f = F + xTerm*y*A
+    f_y = F_y + xTerm * (A + y*n_y)
+    f_xx = F_xx + y * (-2*A + dxTerm*A_x + xTerm*A_xx)
+    f_yy = F_yy + xTerm * (2*n_y + y*n_yy)
+    return f_xx + f_yy + f*f_y - RHS
+
+
+PROBLEMS = {1: LagarisProblem("first-order ODE", [[0, 2]], trial1, residual1, solution1),
+            2: LagarisProblem("first-order ODE", [[0, 10]], trial2, residual2, solution2, numSamples = 50),
+            3: LagarisProblem("second-order ODE", [[0, 10]], trial3, residual3, solution3, numSamples = 50),
+            4: LagarisProblem("coupled first-order ODEs", [[0, 3]], trial4, residual4, solution4, numOutputs = 2,
+                              numHiddenNodes = 16, numSamples = 30),
+            5: LagarisProblem("Poisson equation", [[0, 1], [0, 1]], trial5, residual5, solution5,
+                              geometry = geometry5, numHiddenNodes = 16, numSamples = 10),
+            7: LagarisProblem("Poisson equation, mixed BCs", [[0, 1], [0, 1]], trial7, residual7, solution78,
+                              geometry = geometry7, numHiddenNodes = 16, numSamples = 10),
+            8: LagarisProblem("nonlinear PDE, mixed BCs", [[0, 1], [0, 1]], trial8, residual8, solution78,
+                              geometry = geometry8, numHiddenNodes = 16, numSamples = 10)}
+
+
+def lattice(ranges, numSamples):
+    """
+    Returns 'numSamples' evenly-spaced values along every axis of the box given by 'ranges', and their
+    Cartesian product as a tensor of shape (numSamples^len(ranges), len(ranges)) with requires_grad = True
+    """
+    axes = [torch.linspace(valueRange[0], valueRange[1], numSamples) for valueRange in ranges]
+    grid = torch.meshgrid(*axes, indexing = 'ij')
+    return torch.stack([values.reshape(-1) for values in grid], 1).requires_grad_()
+
+def trainingData(problem, sampler = 'lattice', numSamples = None, refreshInterval = 1, seed = None):
+    """
+    Training points of a problem, fixed for the lattice and regenerated in place as training goes on otherwise
+
+    Arguments:
+    problem (LagarisProblem) -- the problem to be solved
+    sampler (string) -- one of SAMPLERS: 'lattice' (evenly-spaced grid), 'uniform', 'normal' (centred on the
+        domain, sigma 1/9 of its width), 'sobol', 'halton' (low-discrepancy sequences) or 'adaptive'
+        (towards high residuals)
+    numSamples (int or None) -- number of points along every axis (numSamples^numInputs points in total),
+        problem.numSamples if None
+    refreshInterval (int) -- number of epochs between regenerations of the points
+    seed (int or None) -- seed of the scrambling of a low-discrepancy sequence
+
+    Returns:
+    data_in (PyTorch tensor of shape (numPoints,numInputs)) -- the training points, with requires_grad = True
+    resampler (ResamplingDataSet or None) -- owner of data_in if the points are regenerated, None for the lattice
+    """
+    if numSamples is None:
+        numSamples = problem.numSamples
+    if sampler == 'lattice':
+        return lattice(problem.ranges, numSamples), None
+    ranges = problem.ranges
+    if sampler == 'uniform':
+        generator = UniformPoints(ranges)
+    elif sampler == 'normal':
+        generator = NormalPoints([(r[0] + r[1])/2 for r in ranges], [(r[1] - r[0])/9 for r in ranges])
+    elif sampler in ('sobol', 'halton'):
+        generator = SequencePoints(ranges, QMCSampler(problem.numInputs, sampler, seed = seed))
+    elif sampler == 'adaptive':
+        generator = AdaptivePoints(AdaptiveSampler(ranges, numSamples**problem.numInputs, problem.residual))
+    else:
+        raise ValueError(f"unknown sampler '{sampler}', expected one of {SAMPLERS}")
+    resampler = ResamplingDataSet(generator, numSamples**problem.numInputs, problem.numInputs, refreshInterval)
+    return resampler.data_in, resampler
+
+def train(problem, network, loader, optimiser, numEpochs, geometryCache = None, resampler = None, timer = NO_TIMER):
+    """
+    A function to train a neural network to solve a Lagaris problem, by minimising the mean squared residual
+    of every equation
+
+    Arguments:
+    problem (LagarisProblem) -- the problem to be solved
+    network (Module) -- the neural network
+    loader (TensorLoader) -- generates batches of training points, with their cached geometry terms if
+        geometryCache is given
+    optimiser (Optimiser) -- carries out parameter optimisation
+    numEpochs (int) -- number of training epochs
+    geometryCache (GeometryCache or None) -- holds the geometry terms of the training points
+    resampler (ResamplingDataSet or None) -- if given, the training dataset of the loader,
+        whose points are regenerated in place as training goes on
+    timer (PhaseTimer) -- if enabled, records the time spent in every phase of training; the residual
+        includes the network and its input derivatives, which the jet evaluates in the same pass
+
+    Returns:
+    cost_list (list of length 'numEpochs') -- cost values of all epochs
+    """
+    cost_list = []
+    network.train(True)
+    for _ in range(numEpochs):
+        timer.restart() # storing the costs is not attributed to the next phase
+        if resampler is not None: # new points every 'refreshInterval' epochs, written into the loader's tensor
+            if resampler.step(network) and geometryCache is not None:
+                geometryCache.refresh()
+        for batch in loader:
+            timer.lap('sampling')
+            if geometryCache is None:
+                D = problem.residual(network, batch)
+            else:
+                D = problem.residual(network, *batch)
+            cost = (D**2).mean(0).sum() # sum of the mean squared residuals of all equations
+            timer.lap('residual')
+            cost.backward()
+            timer.lap('backward')
+            optimiser.step()
+            optimiser.zero_grad()
+            timer.lap('optimiser')
+            timer.step()
+        cost_list.append(cost.detach()) # final cost of every epoch, kept on the device until training ends
+    network.train(False)
+    return torch.stack(cost_list).tolist()
+
+def solutionError(problem, network, numSamples = 50):
+    """
+    Mean squared difference between the trial solution and the analytic solution on a lattice of test points
+
+    Arguments:
+    problem (LagarisProblem) -- the problem being solved
+    network (Module) -- the trained neural network
+    numSamples (int) -- number of test points along every axis
+
+    Returns:
+    error (float) -- mean squared error over the test points and all unknown functions
+    """
+    points = lattice(problem.ranges, numSamples).detach()
+    with torch.no_grad():
+        return torch.mean((problem.trial(network, points) - problem.solution(points))**2).item()
+
+def plotSolution(problem, network, costList, title = "", path = None):
+    """
+    Plots the training cost and the trial solution against the analytic solution. matplotlib is only
+    imported here, so that training runs headless without it.
+
+    Arguments:
+    problem (LagarisProblem) -- the problem being solved
+    network (Module) -- the trained neural network
+    costList (list) -- cost values of all epochs
+    title (string) -- title of the figure
+    path (string or None) -- file the figure is saved to, shown on screen if None
+
+    Returns:
+    None
+    """
+    import matplotlib.pyplot as plt
+    fig = plt.figure(figsize = (12, 5))
+    costAxis = fig.add_subplot(1, 2, 1)
+    costAxis.semilogy(costList)
+    costAxis.set_xlabel("Epochs", fontsize = 16)
+    costAxis.set_ylabel("Cost", fontsize = 16)
+
+    if problem.numInputs == 1:
+        x = lattice(problem.ranges, 100).detach()
+        with torch.no_grad():
+            trial, exact = problem.trial(network, x).numpy(), problem.solution(x).numpy()
+        solutionAxis = fig.add_subplot(1, 2, 2)
+        for i in range(problem.numOutputs):
+            solutionAxis.plot(x.numpy(), trial[:,i], 'r-', label = "Neural Network Output" if i == 0 else None)
+            solutionAxis.plot(x.numpy(), exact[:,i], 'b.', label = "True Solution" if i == 0 else None)
+        solutionAxis.set_xlabel("x", fontsize = 16)
+        solutionAxis.set_ylabel("f(x)", fontsize = 16)
+        solutionAxis.legend(loc = "upper right", fontsize = 12)
+    else:
+        numSamples = 50
+        points = lattice(problem.ranges, numSamples).detach()
+        with torch.no_grad():
+            error = (problem.trial(network, points) - problem.solution(points)).view(numSamples, numSamples)
+        x, y = [values.view(numSamples, numSamples).numpy() for values in torch.split(points, 1, dim=-1)]
+        solutionAxis = fig.add_subplot(1, 2, 2, projection = '3d')
+        solutionAxis.plot_surface(x, y, error.numpy(), cmap = 'viridis')
+        solutionAxis.set_xlabel("x", fontsize = 16)
+        solutionAxis.set_ylabel("y", fontsize = 16)
+        solutionAxis.set_zlabel("Error", fontsize = 16)
+    fig.suptitle(title, fontsize = 16)
+    if path is None:
+        plt.show()
+    else:
+        fig.savefig(path)
+    plt.close(fig)
+
+def run(problemNumber, sampler = 'lattice', numEpochs = 10000, numSamples = None, batchSize = None,
+        numHiddenNodes = None, learningRate = None, refreshInterval = None, seed = None, network = None,
+        timer = NO_TIMER):
+    """
+    Trains a network to solve one of the registered problems, without any plotting or interaction
+
+    Arguments:
+    problemNumber (int) -- key of the problem in PROBLEMS
+    sampler (string) -- sampling method of the training points, see trainingData
+    numEpochs (int) -- number of training epochs
+    numSamples (int or None) -- number of training points along every axis, the problem's default if None
+    batchSize (int or None) -- number of points in every batch, all training points if None
+    numHiddenNodes (int or None) -- size of the hidden layer, the problem's default if None
+    learningRate (float or None) -- learning rate of the Adam optimiser, the problem's default if None
+    refreshInterval (int or None) -- number of epochs between regenerations of the training points,
+        every epoch if None (every 100 epochs for the adaptive sampler)
+    seed (int or None) -- seed of the network initialisation and the training points
+    network (Module or None) -- network to continue training, a new one if None
+    timer (PhaseTimer) -- if enabled, records the time spent in every phase of training
+
+    Returns:
+    result (dict) -- 'network', 'costList', 'error' (see solutionError) and 'trainingTime' (seconds)
+    """
+    if problemNumber not in PROBLEMS:
+        raise ValueError(f"unknown problem {problemNumber}, expected one of {list(PROBLEMS)}")
+    problem = PROBLEMS[problemNumber]
+    if seed is not None:
+        torch.manual_seed(seed)
+    if network is None:
+        network = problem.network(numHiddenNodes)
+    if refreshInterval is None:
+        refreshInterval = 100 if sampler == 'adaptive' else 1
+    dataIn, resampler = trainingData(problem, sampler, numSamples, refreshInterval, seed)
+    if problem.geometry is None:
+        geometryCache = None
+        loader = TensorLoader(dataIn, batchSize = batchSize, shuffle = True)
+    else:
+        geometryCache = GeometryCache(problem.geometry, dataIn) # input-only terms of the training points
+        loader = TensorLoader((dataIn, geometryCache.terms), batchSize = batchSize, shuffle = True)
+    optimiser = torch.optim.Adam(network.parameters(),
+                                 lr = problem.learningRate if learningRate is None else learningRate)
+
+    start = time.time()
+    try:
+        costList = train(problem, network, loader, optimiser, numEpochs, geometryCache, resampler, timer)
+    finally:
+        timer.close() # exports the profiler trace even if training ended before the profiled steps did
+    end = time.time()
+    return {'network': network, 'costList': costList, 'error': solutionError(problem, network),
+            'trainingTime': end - start}
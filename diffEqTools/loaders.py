@@ -0,0 +1,54 @@
+import math
+import torch
+
+
+class TensorLoader:
+    """
+    Iterates over batches of a data set that is already held in memory as one tensor (or a tuple of tensors
+    sharing their first dimension), by slicing the tensors directly instead of indexing and restacking every
+    sample like a DataLoader. Can be used in place of a DataLoader in the training loops.
+    """
+    def __init__(self, tensors, batchSize = None, shuffle = False):
+        """
+        Arguments:
+        tensors (tensor or tuple of tensors) -- the data set, e.g. DataSet.data_in
+        batchSize (int or None) -- number of samples in every batch, the whole data set if None
+        shuffle (bool) -- if True, samples are assigned to batches by a new random permutation every epoch
+
+        Returns:
+        TensorLoader object
+        """
+        self.tensors = tensors
+        self.numSamples = (tensors[0] if isinstance(tensors, tuple) else tensors).shape[0]
+        self.batchSize = self.numSamples if batchSize is None else min(int(batchSize), self.numSamples)
+        self.shuffle = shuffle
+
+    def __len__(self):
+        """
+        Returns the number of batches in every epoch
+        """
+        return math.ceil(self.numSamples / self.batchSize)
+
+    def select(self, index):
+        """
+        Returns the samples at 'index' (a slice or a tensor of indices) from every tensor
+        """
+        if isinstance(self.tensors, tuple):
+            return tuple(tensor[index] for tensor in self.tensors)
+        return self.tensors[index]
+
+    def __iter__(self):
+        """
+        Yields the batches of one epoch
+        """
+        if self.batchSize == self.numSamples:
+            # a single batch holds the whole data set, and the order of its samples does not change a mean cost
+            yield self.tensors
+            return
+        device = (self.tensors[0] if isinstance(self.tensors, tuple) else self.tensors).device
+        order = torch.randperm(self.numSamples, device = device) if self.shuffle else None
+        for start in range(0, self.numSamples, self.batchSize):
+            if order is None:
+                yield self.select(slice(start, start + self.batchSize))
+            else:
+                yield self.select(order[start:start + self.batchSize])
@@ -0,0 +1,348 @@
+import os
+import numpy as np
+import torch
+
+
+class MetricsRecorder:
+    """
+    History of one or more scalar metrics (e.g. cost, lambda and nu) recorded once per training step,
+    in memory that does not grow with the length of the run. Consecutive steps are summarised in windows
+    holding the minimum, mean and maximum of every metric; at most 'capacity' windows are kept, and when
+    they are all full, neighbouring windows are merged in pairs and the window length doubles. Plots of
+    millions of steps are drawn from these few thousand windows, and checkpoints store only them.
+    Every raw value can also be appended to a binary log file, so the full-resolution history stays
+    available on disk without being held in memory (see readLog). The log is kept open while steps are
+    recorded, written out by flush() and state_dict(), and closed by close().
+
+    Values still on the GPU are recorded with record(), which keeps the tensors without waiting for them:
+    every 'flushInterval' steps they are gathered on their device and copied to the host asynchronously,
+    and only stored at the next flush, long after the copy has finished. Reading the history (last,
+    series, plot, state_dict, len) flushes first.
+    """
+    def __init__(self, names, capacity = 4096, logPath = None, flushInterval = 1000):
+        """
+        Arguments:
+        names (list of strings) -- names of the metrics, e.g. ['cost', 'lmbda', 'nu']
+        capacity (even int) -- maximum number of windows kept in memory
+        logPath (string or None) -- if given, binary file (float64, one row per step) every value is appended to
+        flushInterval (int) -- number of steps recorded with record() between copies to the host
+
+        Returns:
+        MetricsRecorder object with attributes:
+        numSteps (int) -- number of steps recorded so far
+        window (int) -- number of steps summarised by every window
+        """
+        if capacity < 2 or capacity % 2:
+            raise ValueError("capacity must be an even number of at least 2")
+        self.names = list(names)
+        self.capacity = capacity
+        self.logPath = logPath
+        self.window = 1
+        self.numSteps = 0
+        self.minimum = np.zeros((capacity, len(self.names)))
+        self.maximum = np.zeros((capacity, len(self.names)))
+        self.total = np.zeros((capacity, len(self.names)))
+        self.lastValues = np.full(len(self.names), np.nan)
+        self.flushInterval = flushInterval
+        self.buffered = [] # values recorded with record() since the last flush, left where they are
+        self.hostBuffer = None
+        self.transfer = None # (host tensor, source tensor, CUDA event or None) of the copy in flight
+        self.log = None # the log file, opened for appending at the first step stored
+
+    def __len__(self):
+        self.flush()
+        return self.numSteps
+
+    def record(self, *values):
+        """
+        Records one step from tensors with a single element (e.g. a detached cost), one for every metric,
+        without copying them to the host. The tensors are read at the next flush, so parameters updated
+        in place by the optimiser must be recorded as copies, e.g. lmbda.detach().clone()
+        """
+        self.buffered.append(values)
+        if len(self.buffered) >= self.flushInterval:
+            self.dispatch()
+
+    def dispatch(self):
+        """
+        Gathers the buffered values on their device and starts copying them to the host, after storing the
+        values of the previous copy
+        """
+        self.collect()
+        if not self.buffered:
+            return
+        with torch.no_grad():
+            values = torch.stack([torch.stack(column).reshape(len(column)).to(torch.float64)
+                                  for column in zip(*self.buffered)], 1)
+        self.buffered = []
+        if values.device.type != 'cuda':
+            self.transfer = (values, values, None)
+            return
+        if self.hostBuffer is None or len(self.hostBuffer) < len(values):
+            # page-locked memory, so that the copy runs asynchronously
+            self.hostBuffer = torch.empty(max(self.flushInterval, len(values)), len(self.names),
+                                          dtype = torch.float64, pin_memory = True)
+        host = self.hostBuffer[:len(values)]
+        host.copy_(values, non_blocking = True)
+        event = torch.cuda.Event()
+        event.record()
+        self.transfer = (host, values, event)
+
+    def collect(self):
+        """
+        Waits for the copy in flight, if any, and stores its values
+        """
+        if self.transfer is None:
+            return
+        host, _, event = self.transfer
+        self.transfer = None
+        if event is not None:
+            event.synchronize()
+        self.store(host.numpy())
+
+    def flush(self):
+        """
+        Stores all values recorded with record() so far, waiting for them if necessary, and writes them to the log
+        """
+        self.dispatch()
+        self.collect()
+        if self.log is not None:
+            self.log.flush()
+
+    def close(self):
+        """
+        Stores all values recorded so far and closes the log file, e.g. at the end of training.
+        Steps recorded afterwards open it again.
+        """
+        self.flush()
+        self.closeLog()
+
+    def closeLog(self):
+        if self.log is not None:
+            self.log.close()
+            self.log = None
+
+    def append(self, *values):
+        """
+        Records one step, with one value (number) for every metric in the order of 'names'
+        """
+        if self.logPath is not None or len(values) != len(self.names) or self.buffered or self.transfer is not None:
+            self.extend(*([value] for value in values))
+            return
+        values = np.array(values, dtype = np.float64)
+        if self.numSteps == self.capacity * self.window:
+            self.compress()
+        index, offset = divmod(self.numSteps, self.window)
+        if offset:
+            np.minimum(self.minimum[index], values, out = self.minimum[index])
+            np.maximum(self.maximum[index], values, out = self.maximum[index])
+            self.total[index] += values
+        else:
+            self.minimum[index] = self.maximum[index] = self.total[index] = values
+        self.lastValues = values
+        self.numSteps += 1
+
+    def extend(self, *columns):
+        """
+        Records consecutive steps, with one sequence of values (list, array or tensor on the CPU) for every metric
+        """
+        if len(columns) != len(self.names):
+            raise ValueError(f"expected values of {len(self.names)} metric(s) {self.names}, got {len(columns)}")
+        self.dispatch() # values recorded before these come first
+        self.collect()
+        self.store(np.stack([np.asarray(column, dtype = np.float64).reshape(-1) for column in columns], 1))
+
+    def store(self, values):
+        """
+        Adds consecutive steps (array of shape (numSteps, numMetrics)) to the windows and the log
+        """
+        if len(values) == 0:
+            return
+        if self.logPath is not None:
+            if self.log is None:
+                self.log = open(self.logPath, 'ab')
+            self.log.write(values.tobytes())
+        self.lastValues = values[-1].copy()
+        while len(values):
+            if self.numSteps == self.capacity * self.window:
+                self.compress()
+            room = self.capacity * self.window - self.numSteps
+            chunk, values = values[:room], values[room:]
+            index, offset = divmod(self.numSteps, self.window)
+            if offset: # complete the partially filled window first
+                head, chunk = chunk[:self.window - offset], chunk[self.window - offset:]
+                self.minimum[index] = np.minimum(self.minimum[index], head.min(0))
+                self.maximum[index] = np.maximum(self.maximum[index], head.max(0))
+                self.total[index] += head.sum(0)
+                self.numSteps += len(head)
+                index += 1
+            numFull = len(chunk) // self.window
+            if numFull:
+                blocks = chunk[:numFull * self.window].reshape(numFull, self.window, -1)
+                self.minimum[index:index + numFull] = blocks.min(1)
+                self.maximum[index:index + numFull] = blocks.max(1)
+                self.total[index:index + numFull] = blocks.sum(1)
+                index += numFull
+            tail = chunk[numFull * self.window:]
+            if len(tail): # start a new, partially filled window
+                self.minimum[index] = tail.min(0)
+                self.maximum[index] = tail.max(0)
+                self.total[index] = tail.sum(0)
+            self.numSteps += len(chunk)
+
+    def compress(self):
+        """
+        Merges neighbouring windows in pairs, halving the memory in use and doubling the window length
+        """
+        half = self.capacity // 2
+        self.minimum[:half] = np.minimum(self.minimum[0::2], self.minimum[1::2])
+        self.maximum[:half] = np.maximum(self.maximum[0::2], self.maximum[1::2])
+        self.total[:half] = self.total[0::2] + self.total[1::2]
+        self.window *= 2
+
+    def last(self, name = None):
+        """
+        Returns the most recent value of metric 'name' (of the first metric if None)
+        """
+        self.flush()
+        return float(self.lastValues[0 if name is None else self.names.index(name)])
+
+    def stored(self, name = None):
+        """
+        Returns the most recent value of metric 'name' (of the first metric if None) that has already been
+        copied to the host, without waiting for the values recorded since; None if no value is stored yet.
+        Cheap enough to be called every step, e.g. for a learning rate scheduler
+        """
+        if self.numSteps == 0:
+            return None
+        return float(self.lastValues[0 if name is None else self.names.index(name)])
+
+    def series(self, name = None):
+        """
+        Returns the downsampled history of metric 'name' (of the first metric if None)
+
+        Returns:
+        steps (array) -- step at the centre of every window
+        minimum, mean, maximum (arrays) -- statistics of the metric in every window
+        """
+        self.flush()
+        m = 0 if name is None else self.names.index(name)
+        numWindows = -(-self.numSteps // self.window)
+        counts = np.full(numWindows, self.window)
+        if numWindows:
+            counts[-1] = self.numSteps - (numWindows - 1) * self.window
+        steps = np.arange(numWindows) * self.window + (counts - 1) / 2
+        return (steps, self.minimum[:numWindows, m].copy(), self.total[:numWindows, m] / counts,
+                self.maximum[:numWindows, m].copy())
+
+    def plot(self, name = None, logScale = True, ax = None, **kwargs):
+        """
+        Plots the mean of metric 'name' in every window, shading the range between its minimum and maximum
+
+        Arguments:
+        name (string or None) -- metric to be plotted, the first if None
+        logScale (bool) -- if True, the y axis is logarithmic (as plt.semilogy)
+        ax (Axes or None) -- axes to draw on, the current axes if None
+        kwargs -- passed on to ax.plot, e.g. label
+        """
+        if ax is None:
+            import matplotlib.pyplot as plt
+            ax = plt.gca()
+        steps, minimum, mean, maximum = self.series(name)
+        line, = ax.plot(steps, mean, **kwargs)
+        if self.window > 1:
+            ax.fill_between(steps, minimum, maximum, color = line.get_color(), alpha = 0.3, linewidth = 0)
+        if logScale:
+            ax.set_yscale('log')
+        return line
+
+    def state_dict(self, windows = True):
+        """
+        Returns the windows in use and the settings of the recorder, e.g. to be saved in a checkpoint.
+        With windows = False and a log file holding the whole history, only the number of steps is returned:
+        the history is then restored from the log, so the checkpoint does not grow with it (see load_state_dict).
+        """
+        self.flush()
+        if not windows and self.logPath is not None and os.path.exists(self.logPath) \
+                and os.path.getsize(self.logPath) == 8 * len(self.names) * self.numSteps:
+            return {'names': self.names, 'capacity': self.capacity, 'numSteps': self.numSteps}
+        numWindows = -(-self.numSteps // self.window)
+        # tensors rather than arrays, so that checkpoints can be read with torch.load(..., weights_only = True)
+        return {'names': self.names, 'capacity': self.capacity, 'window': self.window, 'numSteps': self.numSteps,
+                'minimum': torch.tensor(self.minimum[:numWindows]), 'maximum': torch.tensor(self.maximum[:numWindows]),
+                'total': torch.tensor(self.total[:numWindows]), 'lastValues': torch.tensor(self.lastValues)}
+
+    def load_state_dict(self, state):
+        """
+        Restores the history from state_dict(). Checkpoints written before the recorder existed stored a list
+        of values of every metric; such a list (for a single metric), or a tuple of them (one per metric),
+        is recorded step by step instead. A log file longer than the restored history, written by steps after
+        the checkpoint, is truncated so that the log continues from the checkpoint.
+        """
+        if not isinstance(state, dict):
+            self.clear()
+            self.extend(*(state if isinstance(state, tuple) else (state,)))
+            return
+        if state['names'] != self.names:
+            raise ValueError(f"checkpoint holds metrics {state['names']}, expected {self.names}")
+        if 'minimum' not in state: # only the number of steps, see state_dict(windows = False)
+            self.replayLog(state['numSteps'], state['capacity'])
+            return
+        self.buffered, self.transfer = [], None # values recorded after the checkpoint are discarded
+        self.closeLog() # written out before the steps after the checkpoint are truncated below
+        self.capacity = state['capacity']
+        self.window = state['window']
+        self.numSteps = state['numSteps']
+        for key in ['minimum', 'maximum', 'total']:
+            array = np.zeros((self.capacity, len(self.names)))
+            array[:len(state[key])] = np.asarray(state[key])
+            setattr(self, key, array)
+        self.lastValues = np.array(np.asarray(state['lastValues']), dtype = np.float64)
+        if self.logPath is not None and os.path.exists(self.logPath):
+            rowSize = 8 * len(self.names)
+            if os.path.getsize(self.logPath) > self.numSteps * rowSize:
+                os.truncate(self.logPath, self.numSteps * rowSize)
+
+    def clear(self):
+        """
+        Forgets the history, emptying the log file, e.g. when a new run starts from scratch
+        """
+        self.closeLog()
+        if self.logPath is not None and os.path.exists(self.logPath):
+            os.truncate(self.logPath, 0)
+        self.__init__(self.names, self.capacity, self.logPath, self.flushInterval)
+
+    def replayLog(self, numSteps, capacity, chunkSize = 1 << 20):
+        """
+        Rebuilds the windows from the first 'numSteps' steps of the log file, truncating the steps after them
+        """
+        self.closeLog()
+        if self.logPath is None or not os.path.exists(self.logPath):
+            raise ValueError("the checkpoint holds no history and the recorder has no log file to restore it from")
+        rowSize = 8 * len(self.names)
+        if os.path.getsize(self.logPath) < numSteps * rowSize:
+            raise ValueError(f"log file {self.logPath} holds fewer than the {numSteps} steps of the checkpoint")
+        os.truncate(self.logPath, numSteps * rowSize)
+        logPath = self.logPath
+        self.__init__(self.names, capacity, None, self.flushInterval) # without a log, so it is not appended to
+        if numSteps:
+            log = readLog(logPath, len(self.names))
+            for start in range(0, numSteps, chunkSize):
+                self.store(np.array(log[start:start + chunkSize]))
+            del log
+        self.logPath = logPath
+
+
+def readLog(logPath, numMetrics = 1):
+    """
+    Reads the full-resolution history written by a MetricsRecorder with a log file,
+    memory-mapped so that only the parts used are loaded
+
+    Arguments:
+    logPath (string) -- the log file
+    numMetrics (int) -- number of metrics recorded
+
+    Returns:
+    values (array of shape (numSteps, numMetrics))
+    """
+    return np.memmap(logPath, dtype = np.float64, mode = 'r').reshape(-1, numMetrics)
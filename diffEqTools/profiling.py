@@ -0,0 +1,193 @@
+import math
+import time
+import torch
+
+
+class RunningHistogram:
+    """
+    Histogram of durations with logarithmically spaced bins (from 1 microsecond to about 1000 seconds,
+    'binsPerOctave' bins per factor of 2), updated in constant time and memory however many values are added
+    """
+    def __init__(self, binsPerOctave = 4, smallest = 1e-6, numOctaves = 30):
+        self.binsPerOctave = binsPerOctave
+        self.smallest = smallest
+        self.counts = [0] * (binsPerOctave * numOctaves + 1)
+        self.count = 0
+        self.total = 0.
+        self.minimum = math.inf
+        self.maximum = 0.
+
+    def add(self, value):
+        """
+        Adds one duration (in seconds)
+        """
+        if value > self.smallest:
+            index = min(int(math.log2(value / self.smallest) * self.binsPerOctave) + 1, len(self.counts) - 1)
+        else:
+            index = 0
+        self.counts[index] += 1
+        self.count += 1
+        self.total += value
+        self.minimum = min(self.minimum, value)
+        self.maximum = max(self.maximum, value)
+
+    def quantile(self, q):
+        """
+        Returns an estimate of the q-quantile (0 <= q <= 1) of the durations, the geometric midpoint of its bin
+        """
+        if self.count == 0:
+            return math.nan
+        target = q * self.count
+        cumulative = 0
+        for index, count in enumerate(self.counts):
+            cumulative += count
+            if cumulative >= target and count > 0:
+                break
+        if index == 0:
+            return self.minimum
+        value = self.smallest * 2 ** ((index - 0.5) / self.binsPerOctave)
+        return min(max(value, self.minimum), self.maximum)
+
+    def mean(self):
+        return self.total / self.count if self.count else math.nan
+
+
+class PhaseTimer:
+    """
+    Opt-in per-phase timing of a training loop. The loop marks the end of every phase with lap(name), which
+    adds the time since the previous mark to the running histogram of that phase, and the end of every
+    step with step(). A disabled timer returns from every call immediately, so instrumented loops cost nothing
+    when timing is off. Optionally records a torch.profiler trace of a window of steps, which is
+    stopped and exported by close() if training ends before the window does.
+
+    Usage in a loop:
+        timer.lap('sampling')   # after drawing the batch
+        timer.lap('forward')    # after the forward pass
+        ...
+        timer.step()            # at the end of the step
+
+    and around the training, so an interrupted run still exports its trace:
+        try:
+            ... # training loop
+        finally:
+            timer.close()
+    or equivalently 'with timer:'
+    """
+    def __init__(self, enabled = True, synchronize = False, profileSteps = None, tracePath = 'trace.json'):
+        """
+        Arguments:
+        enabled (bool) -- if False, the timer does nothing
+        synchronize (bool) -- if True, waits for the GPU at every mark, so that asynchronous CUDA kernels are
+            attributed to the phase that launched them (at some cost in speed)
+        profileSteps (tuple of 2 ints or None) -- if given, steps [first, last) are recorded by torch.profiler,
+            counting steps from 0
+        tracePath (string) -- file the torch.profiler trace is exported to (Chrome trace format)
+
+        Returns:
+        PhaseTimer object with one attribute:
+            histograms (dict) -- RunningHistogram of the durations of every phase, in order of first use
+        """
+        self.enabled = enabled
+        self.synchronize = synchronize and torch.cuda.is_available()
+        self.profileSteps = profileSteps
+        self.tracePath = tracePath
+        self.histograms = {}
+        self.numSteps = 0
+        self.profiler = None
+        self.last = time.perf_counter()
+
+    def lap(self, phase):
+        """
+        Ends the phase 'phase', which started at the previous call of lap or step
+        """
+        if not self.enabled:
+            return
+        if self.profiler is None and self.profileSteps is not None and self.numSteps == self.profileSteps[0]:
+            self.startProfiler() # a window starting at step 0, which no call of step() precedes
+        if self.synchronize:
+            torch.cuda.synchronize()
+        now = time.perf_counter()
+        if phase not in self.histograms:
+            self.histograms[phase] = RunningHistogram()
+        self.histograms[phase].add(now - self.last)
+        self.last = time.perf_counter() # the bookkeeping above is not attributed to the next phase
+
+    def step(self):
+        """
+        Ends a training step, and starts or stops the torch.profiler window
+        """
+        if not self.enabled:
+            return
+        self.numSteps += 1
+        if self.profileSteps is not None:
+            if self.numSteps == self.profileSteps[1]:
+                self.stopProfiler()
+            elif self.numSteps == self.profileSteps[0]:
+                self.startProfiler()
+        self.last = time.perf_counter()
+
+    def restart(self):
+        """
+        Starts the next phase now, e.g. at the start of a train function, so time spent outside it is not counted
+        """
+        if self.enabled and self.profiler is None and self.profileSteps is not None \
+           and self.numSteps == self.profileSteps[0]:
+            self.startProfiler()
+        self.last = time.perf_counter()
+
+    def startProfiler(self):
+        """
+        Starts recording the torch.profiler window, unless it is empty
+        """
+        if self.profileSteps[1] > self.profileSteps[0]:
+            self.profiler = torch.profiler.profile(record_shapes = True, with_stack = True)
+            self.profiler.__enter__()
+
+    def stopProfiler(self):
+        """
+        Stops recording the torch.profiler window, if it is running, and exports its trace to tracePath
+        """
+        if self.profiler is not None:
+            self.profiler.__exit__(None, None, None)
+            self.profiler.export_chrome_trace(self.tracePath)
+            self.profiler = None
+
+    def close(self):
+        """
+        Ends the timing at the end of training: stops a torch.profiler window that training ended before the
+        last step of, exporting the steps recorded so far
+        """
+        self.stopProfiler()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        self.close()
+
+    def summary(self):
+        """
+        Returns the statistics of every phase as a dictionary {phase: {'count', 'mean', 'min', 'p50', 'p90',
+        'p99', 'max', 'total', 'fraction'}}, times in seconds and 'fraction' the share of the total time
+        """
+        total = sum(histogram.total for histogram in self.histograms.values())
+        return {phase: {'count': histogram.count, 'mean': histogram.mean(), 'min': histogram.minimum,
+                        'p50': histogram.quantile(0.5), 'p90': histogram.quantile(0.9),
+                        'p99': histogram.quantile(0.99), 'max': histogram.maximum, 'total': histogram.total,
+                        'fraction': histogram.total / total if total > 0 else math.nan}
+                for phase, histogram in self.histograms.items()}
+
+    def report(self):
+        """
+        Returns a table of the statistics of every phase, times in milliseconds
+        """
+        lines = [f"{'phase':>12} {'count':>9} {'mean':>9} {'p50':>9} {'p90':>9} {'p99':>9} {'max':>9} {'share':>7}"]
+        for phase, stats in self.summary().items():
+            lines.append(f"{phase:>12} {stats['count']:>9} " +
+                         " ".join(f"{1000 * stats[key]:9.3f}" for key in ['mean', 'p50', 'p90', 'p99', 'max']) +
+                         f" {100 * stats['fraction']:6.1f}%")
+        return "\n".join(lines)
+
+
+# disabled timer, the default of every instrumented train function
+NO_TIMER = PhaseTimer(enabled = False)
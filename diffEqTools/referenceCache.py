@@ -0,0 +1,229 @@
+import os
+import json
+import hashlib
+import contextlib
+from collections import OrderedDict
+import numpy as np
+import torch
+from diffEqTools.referenceSolutions import dormandPrince
+
+
+class TrajectoryStore:
+    """
+    Memory-mapped array of reference trajectories sharing one time grid, with least-recently-used eviction
+    """
+    def __init__(self, path, capacity, numTimeSteps):
+        """
+        Arguments:
+        path (string) -- path of the store without extension, '.dat' holds the trajectories and '.json' the index
+        capacity (int) -- maximum number of trajectories kept in the store
+        numTimeSteps (int) -- number of times in every stored trajectory
+
+        Returns:
+        TrajectoryStore object with three attributes:
+        trajectories (numpy memmap of shape (capacity, numTimeSteps, 4)) -- stored values of (x, y, u, v)
+        slots (OrderedDict) -- maps initial-condition keys to rows of trajectories, least recently used first
+        freeSlots (list of int) -- rows of trajectories not yet holding a trajectory
+        """
+        self.indexPath = path + '.json'
+        self.dataPath = path + '.dat'
+        self.shape = (capacity, numTimeSteps, 4)
+        self.reload()
+
+    def reload(self):
+        """
+        Opens the trajectories and index on disk again, picking up changes made by other processes sharing the cache.
+        If the files were removed (the grid was evicted from the cache) an empty store is created again.
+
+        Arguments:
+        None
+
+        Returns:
+        None
+        """
+        capacity = self.shape[0]
+        if os.path.exists(self.indexPath) and os.path.exists(self.dataPath):
+            with open(self.indexPath) as indexFile:
+                index = json.load(indexFile)
+            self.trajectories = np.memmap(self.dataPath, dtype = np.float64, mode = 'r+', shape = self.shape)
+            self.slots = OrderedDict((key, slot) for key, slot in index['slots'] if slot < capacity)
+        else:
+            self.trajectories = np.memmap(self.dataPath, dtype = np.float64, mode = 'w+', shape = self.shape)
+            self.slots = OrderedDict()
+        usedSlots = set(self.slots.values())
+        self.freeSlots = [slot for slot in range(capacity - 1, -1, -1) if slot not in usedSlots]
+
+    def lookup(self, keys):
+        """
+        Finds the stored rows of the given initial conditions, marking them as recently used
+
+        Arguments:
+        keys (list of strings) -- keys of the initial conditions
+
+        Returns:
+        slots (list of int) -- row of each trajectory in the store, or -1 if it is not stored
+        """
+        slots = []
+        for key in keys:
+            slot = self.slots.get(key, -1)
+            if slot >= 0:
+                self.slots.move_to_end(key)
+            slots.append(slot)
+        return slots
+
+    def insert(self, keys, trajectories):
+        """
+        Stores new trajectories, evicting the least recently used ones if the store is full.
+        A key that is already stored (or repeated in 'keys') keeps its row, which is overwritten.
+
+        Arguments:
+        keys (list of strings) -- keys of the initial conditions
+        trajectories (numpy array of shape (len(keys), numTimeSteps, 4)) -- trajectories to store
+
+        Returns:
+        None
+        """
+        for key, trajectory in zip(keys, trajectories):
+            if key in self.slots:
+                slot = self.slots[key]
+                self.slots.move_to_end(key)
+            elif self.freeSlots:
+                slot = self.freeSlots.pop()
+            else:
+                _, slot = self.slots.popitem(last = False)
+            self.trajectories[slot] = trajectory
+            self.slots[key] = slot
+
+    def flush(self):
+        """
+        Writes the trajectories and the index (in least-recently-used order) to disk
+
+        Arguments:
+        None
+
+        Returns:
+        None
+        """
+        self.trajectories.flush()
+        # write the index to a temporary file first so an interrupted run never leaves a corrupt index
+        with open(self.indexPath + '.tmp', 'w') as indexFile:
+            json.dump({'slots': list(self.slots.items())}, indexFile)
+        os.replace(self.indexPath + '.tmp', self.indexPath)
+
+
+class ReferenceCache:
+    """
+    Persistent on-disk cache of three-body reference trajectories, keyed by the initial condition
+    (x_0, y_0, u_0, v_0), mu, the time range and the number of time steps.
+    Trajectories sharing a time grid are kept in one memory-mapped TrajectoryStore, and at most 'maxGrids'
+    stores are kept on disk, so the cache never holds more than maxGrids * capacity trajectories.
+    Several scripts may share the cache directory, reads and writes are serialised by a lock file.
+    """
+    def __init__(self, cacheDir, capacity = 10000, maxGrids = 8, solver = dormandPrince):
+        """
+        Arguments:
+        cacheDir (string) -- directory holding the cached trajectories
+        capacity (int) -- maximum number of trajectories kept for each time grid
+        maxGrids (int) -- maximum number of time grids kept, the least recently used grid is deleted
+            when a new one is needed
+        solver (function) -- reference solver called as solver(initialConditions, times, mu),
+            returning a tensor of shape (N, T, 4)
+
+        Returns:
+        ReferenceCache object
+        """
+        os.makedirs(cacheDir, exist_ok = True)
+        self.cacheDir = cacheDir
+        self.capacity = capacity
+        self.maxGrids = maxGrids
+        self.solver = solver
+        self.stores = {}
+        self.gridsPath = os.path.join(cacheDir, 'grids.json')
+        self.lockPath = os.path.join(cacheDir, 'cache.lock')
+
+    @contextlib.contextmanager
+    def locked(self):
+        """
+        Holds an exclusive lock on the cache directory, so scripts sharing it do not write at the same time
+        """
+        with open(self.lockPath, 'a') as lockFile:
+            try:
+                import fcntl
+            except ImportError: # no advisory file locks on Windows, the cache is then not safe to share
+                yield
+                return
+            fcntl.flock(lockFile, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lockFile, fcntl.LOCK_UN)
+
+    def getStore(self, mu, tRange, numTimeSteps):
+        """
+        Returns the store of trajectories on the time grid linspace(tRange[0], tRange[1], numTimeSteps),
+        deleting the least recently used grids beyond maxGrids. Must be called holding the lock.
+        """
+        gridKey = repr((self.solver.__name__, float(mu), float(tRange[0]), float(tRange[1]), int(numTimeSteps)))
+        fileName = hashlib.sha1(gridKey.encode()).hexdigest()[:16]
+
+        # grids of every script sharing the directory, least recently used first
+        grids = []
+        if os.path.exists(self.gridsPath):
+            with open(self.gridsPath) as gridsFile:
+                grids = json.load(gridsFile)
+        if fileName in grids:
+            grids.remove(fileName)
+        grids.append(fileName)
+        while len(grids) > self.maxGrids:
+            evicted = grids.pop(0)
+            self.stores.pop(evicted, None) # closes its memory map
+            for extension in ['.dat', '.json']:
+                filePath = os.path.join(self.cacheDir, evicted + extension)
+                if os.path.exists(filePath):
+                    os.remove(filePath)
+        with open(self.gridsPath + '.tmp', 'w') as gridsFile:
+            json.dump(grids, gridsFile)
+        os.replace(self.gridsPath + '.tmp', self.gridsPath)
+
+        if fileName not in self.stores:
+            self.stores[fileName] = TrajectoryStore(os.path.join(self.cacheDir, fileName),
+                                                    self.capacity, numTimeSteps)
+        else:
+            self.stores[fileName].reload() # another script may have changed or evicted it
+        return self.stores[fileName]
+
+    def trajectories(self, initialConditions, mu, tRange, numTimeSteps):
+        """
+        Returns reference trajectories for a batch of initial conditions, solving only those not already cached
+
+        Arguments:
+        initialConditions (tensor of shape (N,4)) -- initial values (x_0, y_0, u_0, v_0) at time tRange[0]
+        mu (float) -- non-dimensionalised mass of the second body
+        tRange (list of length 2) -- first and last times of the trajectories
+        numTimeSteps (int) -- number of evenly-spaced times from tRange[0] to tRange[1] (inclusive)
+
+        Returns:
+        trajectories (tensor of shape (N, numTimeSteps, 4)) -- values of (x, y, u, v) at each time,
+            on the same device as initialConditions
+        """
+        if initialConditions.shape[0] > self.capacity:
+            raise ValueError(f"cannot cache {initialConditions.shape[0]} trajectories with capacity {self.capacity}")
+        conditions = initialConditions.detach().cpu().to(torch.float64).numpy()
+        # exact bytes of the float64 values, so equal initial conditions always share a key
+        keys = [row.tobytes().hex() for row in conditions]
+        with self.locked():
+            store = self.getStore(mu, tRange, numTimeSteps)
+            slots = np.array(store.lookup(keys))
+
+            misses = np.nonzero(slots < 0)[0]
+            if len(misses) > 0:
+                # solve every missing initial condition once, even if it appears several times in the batch
+                firstMisses = {}
+                for i in misses:
+                    firstMisses.setdefault(keys[i], i)
+                times = torch.linspace(tRange[0], tRange[1], numTimeSteps, dtype = torch.float64)
+                solved = self.solver(torch.from_numpy(conditions[list(firstMisses.values())]), times, mu).numpy()
+                store.insert(list(firstMisses), solved)
+                slots[misses] = store.lookup([keys[i] for i in misses])
+            store.flush()
+            return torch.from_numpy(store.trajectories[slots]).to(initialConditions.device)
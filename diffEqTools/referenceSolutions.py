@@ -0,0 +1,176 @@
+import torch
+
+
+def threeBodyDerivatives(state, mu):
+    """
+    Returns RHS of the planar circular restricted three-body equations for a batch of states
+
+    Arguments:
+    state (tensor of shape (N,4)) -- values of (x, y, u, v) for N trajectories
+    mu (float) -- non-dimensionalised mass of the second body
+
+    Returns:
+    dState (tensor of shape (N,4)) -- values of (x'(t), y'(t), u'(t), v'(t)) for N trajectories
+    """
+    x, y, u, v = state.unbind(dim = -1)
+    # distances cubed to the first body at (0,0) and the second body at (1,0), shared by u' and v'
+    r1Cubed = (x**2 + y**2) ** (3/2)
+    r2Cubed = ((x - 1)**2 + y**2) ** (3/2)
+    dudt = x - mu + 2*v - ((mu * (x - 1) / r2Cubed) + ((1 - mu) * x / r1Cubed))
+    dvdt = y - 2*u - ((mu * y / r2Cubed) + ((1 - mu) * y / r1Cubed))
+    return torch.stack((u, v, dudt, dvdt), dim = -1)
+
+def batchRungeKutta(initialConditions, t0, tFinal, mu, numTimeSteps, subSteps = 1, dtype = torch.float64):
+    """
+    Implements 4th-Order Runge-Kutta Method to evaluate the three-body system of ODEs from time t0
+    to time tFinal for every initial condition in a batch at once
+
+    Arguments:
+    initialConditions (tensor of shape (N,4)) -- initial values (x_0, y_0, u_0, v_0) at time t0
+    t0 (float) -- initial time value
+    tFinal (float) -- final time value
+    mu (float) -- non-dimensionalised mass of the second body
+    numTimeSteps (int) -- number of evenly-spaced times from t0 to tFinal (inclusive) at which
+        the solution is returned, matching torch.linspace(t0, tFinal, numTimeSteps)
+    subSteps (int) -- number of Runge-Kutta steps taken between consecutive returned times
+    dtype (torch dtype) -- floating point precision used for the integration
+
+    Returns:
+    trajectories (tensor of shape (N, numTimeSteps, 4)) -- values of (x, y, u, v) at each time
+    """
+    with torch.no_grad():
+        state = initialConditions.detach().to(dtype)
+        trajectories = torch.empty((state.shape[0], numTimeSteps, 4), dtype = dtype, device = state.device)
+        trajectories[:,0] = state
+        timeStep = (tFinal - t0) / ((numTimeSteps - 1) * subSteps)
+        for i in range(1, numTimeSteps):
+            for _ in range(subSteps):
+                # Apply Runge-Kutta formulas to all trajectories simultaneously
+                k1 = threeBodyDerivatives(state, mu)
+                k2 = threeBodyDerivatives(state + 0.5 * timeStep * k1, mu)
+                k3 = threeBodyDerivatives(state + 0.5 * timeStep * k2, mu)
+                k4 = threeBodyDerivatives(state + timeStep * k3, mu)
+                state = state + (timeStep / 6.0) * (k1 + 2*k2 + 2*k3 + k4)
+            trajectories[:,i] = state
+    return trajectories
+
+# Butcher tableau of the Dormand-Prince 5(4) method (the three-body system is autonomous, so no time nodes are needed)
+DOPRI_A = [[],
+           [1/5],
+           [3/40, 9/40],
+           [44/45, -56/15, 32/9],
+           [19372/6561, -25360/2187, 64448/6561, -212/729],
+           [9017/3168, -355/33, 46732/5247, 49/176, -5103/18656]]
+DOPRI_B = [35/384, 0, 500/1113, 125/192, -2187/6784, 11/84]
+# difference between 5th- and 4th-order weights, gives the local error estimate
+DOPRI_E = [-71/57600, 0, 71/16695, -71/1920, 17253/339200, -22/525, 1/40]
+# coefficients of the 4th-order continuous extension (dense output) in powers of theta, theta^2, theta^3, theta^4
+DOPRI_P = [[1, -8048581381/2820520608, 8663915743/2820520608, -12715105075/11282082432],
+           [0, 0, 0, 0],
+           [0, 131558114200/32700410799, -68118460800/10900136933, 87487479700/32700410799],
+           [0, -1754552775/470086768, 14199869525/1410260304, -10690763975/1880347072],
+           [0, 127303824393/49829197408, -318862633887/49829197408, 701980252875/199316789632],
+           [0, -282668133/205662961, 2019193451/616988883, -1453857185/822651844],
+           [0, 40617522/29380423, -110615467/29380423, 69997945/29380423]]
+
+def dormandPrince(initialConditions, times, mu, rtol = 1e-8, atol = 1e-10, firstStep = 1e-3,
+                  maxSteps = 100000, dtype = torch.float64):
+    """
+    Implements the adaptive Dormand-Prince 5(4) Runge-Kutta method to evaluate the three-body system of ODEs
+    for every initial condition in a batch at once. Every trajectory chooses its own step sizes through
+    local error control, and the solution is interpolated at the requested times with the method's dense output,
+    so small steps are only taken near close approaches to the two bodies.
+
+    Arguments:
+    initialConditions (tensor of shape (N,4)) -- initial values (x_0, y_0, u_0, v_0) at time times[0]
+    times (tensor of shape (T,) or (T,1)) -- increasing times at which the solution is returned,
+        e.g. the torch.linspace used to evaluate the network
+    mu (float) -- non-dimensionalised mass of the second body
+    rtol (float) -- relative tolerance of the local error control
+    atol (float) -- absolute tolerance of the local error control
+    firstStep (float) -- size of the first step attempted by every trajectory
+    maxSteps (int) -- maximum number of attempted steps before giving up
+    dtype (torch dtype) -- floating point precision used for the integration
+
+    Returns:
+    trajectories (tensor of shape (N, T, 4)) -- values of (x, y, u, v) at each time
+    """
+    with torch.no_grad():
+        # clone, since the state of accepted trajectories is updated in place
+        state = initialConditions.detach().to(dtype).clone()
+        device = state.device
+        times = times.detach().reshape(-1).to(device = device, dtype = dtype)
+        numTrajectories, numTimes = state.shape[0], times.shape[0]
+        A = [torch.tensor(row, dtype = dtype, device = device) for row in DOPRI_A]
+        B = torch.tensor(DOPRI_B, dtype = dtype, device = device)
+        E = torch.tensor(DOPRI_E, dtype = dtype, device = device)
+        P = torch.tensor(DOPRI_P, dtype = dtype, device = device)
+
+        # one extra time slot collects the padding written by the vectorised dense output below
+        trajectories = torch.empty((numTrajectories, numTimes + 1, 4), dtype = dtype, device = device)
+        trajectories[:,0] = state
+        tFinal = times[-1]
+        t = times[0].repeat(numTrajectories)
+        h = torch.full((numTrajectories,), firstStep, dtype = dtype, device = device)
+        # index of the next output time still to be filled for each trajectory
+        nextOut = torch.ones(numTrajectories, dtype = torch.long, device = device)
+        f = threeBodyDerivatives(state, mu)
+
+        for _ in range(maxSteps):
+            active = nextOut < numTimes
+            if not active.any():
+                break
+            idx = active.nonzero().view(-1)
+            y0, f0, t0 = state[idx], f[idx], t[idx]
+            # do not step past the final time
+            hAct = torch.minimum(h[idx], tFinal - t0).view(-1,1)
+
+            # stages of the method, the last one is f(t + h, yNew) and is reused next step (FSAL)
+            k = [f0]
+            for i in range(1, 6):
+                yStage = y0 + hAct * sum(A[i][j] * k[j] for j in range(i))
+                k.append(threeBodyDerivatives(yStage, mu))
+            yNew = y0 + hAct * sum(B[j] * k[j] for j in range(6))
+            fNew = threeBodyDerivatives(yNew, mu)
+            k.append(fNew)
+            K = torch.stack(k, dim = 1) # shape (n, 7, 4)
+
+            # scaled RMS norm of the local error estimate
+            error = hAct * torch.einsum('s,nsd->nd', E, K)
+            scale = atol + rtol * torch.maximum(y0.abs(), yNew.abs())
+            errorNorm = (error / scale).pow(2).mean(dim = 1).sqrt()
+            accepted = errorNorm <= 1
+
+            # standard step size update with safety factor, limited to [0.2h, 10h]
+            factor = (0.9 * errorNorm.clamp(min = 1e-10).pow(-0.2)).clamp(0.2, 10.)
+            h[idx] = hAct.view(-1) * factor
+
+            if accepted.any():
+                acc = accepted.nonzero().view(-1)
+                rows = idx[acc]
+                tOld, hOld = t0[acc], hAct[acc].view(-1)
+                tNew = tOld + hOld
+                # output times lying in (tOld, tNew] for each accepted trajectory
+                lastOut = torch.searchsorted(times, tNew, right = True)
+                first = nextOut[rows]
+                numOut = (lastOut - first).clamp(min = 0)
+                maxOut = int(numOut.max())
+                if maxOut > 0:
+                    offsets = torch.arange(maxOut, device = device)
+                    outIdx = first.view(-1,1) + offsets.view(1,-1)
+                    # send padding entries to the spare slot at index numTimes
+                    outIdx = torch.where(offsets.view(1,-1) < numOut.view(-1,1), outIdx, torch.full_like(outIdx, numTimes))
+                    theta = ((times[outIdx.clamp(max = numTimes - 1)] - tOld.view(-1,1)) / hOld.view(-1,1)).unsqueeze(-1)
+                    # powers theta, theta^2, theta^3, theta^4 of the interpolation variable
+                    thetaPowers = theta.expand(-1, -1, 4).cumprod(dim = -1)
+                    Q = torch.einsum('nsd,sp->npd', K[acc], P)
+                    interp = y0[acc].unsqueeze(1) + hOld.view(-1,1,1) * torch.bmm(thetaPowers, Q)
+                    flatIdx = (rows.view(-1,1) * (numTimes + 1) + outIdx).view(-1)
+                    trajectories.view(-1,4).index_copy_(0, flatIdx, interp.view(-1,4))
+                nextOut[rows] = torch.maximum(first, lastOut)
+                state[rows] = yNew[acc]
+                f[rows] = fNew[acc]
+                t[rows] = tNew
+        else:
+            raise RuntimeError("dormandPrince did not reach the final time within maxSteps steps")
+    return trajectories[:,:numTimes]
@@ -0,0 +1,348 @@
+import torch
+
+# bases of the Halton sequence, one prime per dimension
+PRIMES = [2, 3, 5, 7, 11, 13, 17, 19, 23, 29]
+
+
+class QMCSampler:
+    """
+    Low-discrepancy (quasi-Monte Carlo) sequence of points in the unit cube [0,1)^dim, either scrambled Sobol
+    or randomly shifted Halton. Consecutive draws continue the same sequence, and the position in the sequence
+    can be saved with getState and restored with setState, e.g. alongside a network checkpoint.
+    """
+    def __init__(self, dim, method = 'sobol', scramble = True, seed = None):
+        """
+        Arguments:
+        dim (int) -- dimension of the points
+        method (string) -- 'sobol' or 'halton'
+        scramble (bool) -- if True, the sequence is randomised (Owen scrambling for Sobol,
+            a random shift modulo 1 for Halton)
+        seed (int or None) -- seed of the randomisation, chosen at random if None
+
+        Returns:
+        QMCSampler object
+        """
+        if seed is None:
+            seed = int(torch.randint(2**31 - 1, ()))
+        self.setState({'dim': dim, 'method': method, 'scramble': scramble, 'seed': seed, 'numDrawn': 0})
+
+    def getState(self):
+        """
+        Returns the settings of the sequence and the number of points drawn so far, as a dictionary
+        """
+        return {'dim': self.dim, 'method': self.method, 'scramble': self.scramble,
+                'seed': self.seed, 'numDrawn': self.numDrawn}
+
+    def setState(self, state):
+        """
+        Continues the sequence described by a dictionary returned by getState
+
+        Arguments:
+        state (dict) -- settings of the sequence and the number of points already drawn
+
+        Returns:
+        None
+        """
+        self.dim, self.method = state['dim'], state['method']
+        self.scramble, self.seed = state['scramble'], state['seed']
+        self.numDrawn = state['numDrawn']
+        if self.method == 'sobol':
+            self.engine = torch.quasirandom.SobolEngine(self.dim, scramble = self.scramble, seed = self.seed)
+            self.engine.fast_forward(self.numDrawn)
+        elif self.method == 'halton':
+            if self.dim > len(PRIMES):
+                raise ValueError(f"Halton sequence is only implemented for up to {len(PRIMES)} dimensions")
+            generator = torch.Generator().manual_seed(self.seed)
+            self.shift = torch.rand(self.dim, generator = generator, dtype = torch.float64)
+            if not self.scramble:
+                self.shift.zero_()
+        else:
+            raise ValueError(f"unknown sequence '{self.method}', expected 'sobol' or 'halton'")
+
+    def draw(self, n, out = None):
+        """
+        Returns the next n points of the sequence
+
+        Arguments:
+        n (int) -- number of points
+        out (tensor of shape (n,dim) or None) -- if given, the points are written into this tensor
+
+        Returns:
+        points (tensor of shape (n,dim)) -- points in [0,1)^dim
+        """
+        if self.method == 'sobol':
+            points = self.engine.draw(n)
+        else:
+            # radical inverse of the indices 1, 2, ... in every prime base (index 0 would give the origin)
+            index = torch.arange(self.numDrawn + 1, self.numDrawn + n + 1, dtype = torch.int64).view(-1,1)
+            bases = torch.tensor(PRIMES[:self.dim], dtype = torch.int64)
+            points = torch.zeros((n, self.dim), dtype = torch.float64)
+            digitWeight = 1 / bases.to(torch.float64)
+            while bool((index > 0).any()):
+                points += digitWeight * (index % bases)
+                index = index // bases
+                digitWeight = digitWeight / bases
+            points = ((points + self.shift) % 1).to(torch.get_default_dtype())
+        self.numDrawn += n
+        if out is None:
+            return points
+        return out.copy_(points)
+
+
+class BundleSampler:
+    """
+    Streams batches of uniformly sampled network inputs, e.g. (x_0, y_0, u_0, v_0, t) for a solution bundle,
+    from the box given by one range per input. Batches are written in place into a preallocated buffer with a
+    single torch.rand (or a draw from a QMCSampler) and an affine transform, so no new tensors are allocated per batch.
+    """
+    def __init__(self, ranges, batchSize, device = torch.device('cpu'), method = 'uniform', seed = None):
+        """
+        Arguments:
+        ranges (list of lists of length 2) -- lower and upper limits of every input, e.g.
+            [xRange, yRange, uRange, vRange, tRange]
+        batchSize (int) -- number of samples in every batch
+        device (torch device) -- device on which batches are generated
+        method (string) -- 'uniform' for independent random samples, or 'sobol' or 'halton' for
+            low-discrepancy samples from a QMCSampler
+        seed (int or None) -- seed of the scrambling of a low-discrepancy sequence
+
+        Returns:
+        BundleSampler object
+        """
+        self.batchSize = batchSize
+        self.device = device
+        self.lower = torch.empty(len(ranges), device = device)
+        self.width = torch.empty(len(ranges), device = device)
+        for dim, valueRange in enumerate(ranges):
+            self.setRange(dim, valueRange)
+        self.buffer = torch.empty((batchSize, len(ranges)), device = device)
+        self.sequence = None if method == 'uniform' else QMCSampler(len(ranges), method, seed = seed)
+
+    def fill(self, buffer):
+        """
+        Overwrites a buffer with points in the unit cube, from torch.rand or the low-discrepancy sequence
+        """
+        if self.sequence is None:
+            torch.rand(buffer.shape, out = buffer)
+        else:
+            self.sequence.draw(buffer.shape[0], out = buffer)
+
+    def getState(self):
+        """
+        Returns the position in the low-discrepancy sequence (None for uniform sampling), to be stored in a checkpoint
+        """
+        if self.sequence is None:
+            return None
+        return self.sequence.getState()
+
+    def setState(self, state):
+        """
+        Resumes the low-discrepancy sequence from a state returned by getState
+
+        Arguments:
+        state (dict or None) -- position in the sequence, None leaves the sampler unchanged
+
+        Returns:
+        None
+        """
+        if state is None or self.sequence is None:
+            return
+        self.sequence.setState(state)
+
+    def setRange(self, dim, valueRange):
+        """
+        Changes the limits of one input, e.g. the time range during curriculum learning.
+        Takes effect from the next batch.
+
+        Arguments:
+        dim (int) -- index of the input
+        valueRange (list of length 2) -- new lower and upper limits of the input
+
+        Returns:
+        None
+        """
+        self.lower[dim] = valueRange[0]
+        self.width[dim] = valueRange[1] - valueRange[0]
+
+    def sample(self):
+        """
+        Returns the next batch. The batch lives in a buffer that is overwritten by the next call,
+        so it must not be kept beyond the training step it is used for.
+
+        Arguments:
+        None
+
+        Returns:
+        batch (tensor of shape (batchSize, len(ranges))) -- sampled inputs
+        """
+        self.fill(self.buffer)
+        # map samples on [0,1) to the ranges of the inputs
+        return self.buffer.mul_(self.width).add_(self.lower)
+
+
+class AdaptiveSampler:
+    """
+    Residual-based adaptive collocation: draws a large pool of candidate points, scores every candidate by the
+    size of the network's residual there and resamples the training points towards high-residual regions,
+    with probability proportional to |residual|^power / mean(|residual|^power) + smoothing
+    """
+    def __init__(self, ranges, numPoints, residualFn, numCandidates = None, power = 1, smoothing = 1,
+                 method = 'uniform', seed = None):
+        """
+        Arguments:
+        ranges (list of lists of length 2) -- lower and upper limits of every input, e.g. [xRange, yRange]
+        numPoints (int) -- number of training points returned by resample
+        residualFn (function) -- called as residualFn(network, points), returns the residual of the
+            differential equation(s) at the points, of shape (N,) or (N,k)
+        numCandidates (int or None) -- size of the candidate pool, 10 * numPoints if None
+        power (float) -- exponent of the residual in the sampling weights, larger values concentrate points more
+        smoothing (float) -- constant added to the normalised weights, so low-residual regions keep some points
+        method (string) -- 'uniform', 'sobol' or 'halton', distribution of the candidate pool
+        seed (int or None) -- seed of the scrambling of a low-discrepancy candidate pool
+
+        Returns:
+        AdaptiveSampler object
+        """
+        self.lower = torch.tensor([valueRange[0] for valueRange in ranges], dtype = torch.get_default_dtype())
+        self.width = torch.tensor([valueRange[1] - valueRange[0] for valueRange in ranges],
+                                  dtype = torch.get_default_dtype())
+        self.numPoints = numPoints
+        self.numCandidates = 10 * numPoints if numCandidates is None else numCandidates
+        self.residualFn = residualFn
+        self.power = power
+        self.smoothing = smoothing
+        self.sequence = None if method == 'uniform' else QMCSampler(len(ranges), method, seed = seed)
+
+    def candidates(self):
+        """
+        Returns a fresh pool of candidate points, tensor of shape (numCandidates, len(ranges))
+        """
+        if self.sequence is None:
+            points = torch.rand(self.numCandidates, len(self.lower))
+        else:
+            points = self.sequence.draw(self.numCandidates)
+        return self.lower + self.width * points
+
+    def resample(self, network, device = torch.device('cpu')):
+        """
+        Scores a new candidate pool with the current network and selects training points from it
+
+        Arguments:
+        network (Module) -- the neural network
+        device (torch device) -- device of the network
+
+        Returns:
+        points (tensor of shape (numPoints, len(ranges))) -- training points, without gradient tracking
+        """
+        candidates = self.candidates().to(device).requires_grad_()
+        residual = self.residualFn(network, candidates).detach()
+        # size of the residual of every candidate, over all equations if there are several
+        score = residual.view(residual.shape[0], -1).norm(dim = 1) ** self.power
+        weights = score / score.mean().clamp(min = 1e-12) + self.smoothing
+        chosen = torch.multinomial(weights, self.numPoints, replacement = False)
+        return candidates.detach()[chosen]
+
+
+class ResamplingDataSet(torch.utils.data.Dataset):
+    """
+    Training points held in one persistent buffer which is regenerated in place every 'refreshInterval' epochs,
+    so stochastic resampling costs one fill of the buffer instead of building a new data set and loader.
+    A TensorLoader over data_in stays valid across refreshes.
+    """
+    def __init__(self, generator, numPoints, dim, refreshInterval = 1):
+        """
+        Arguments:
+        generator (function) -- called as generator(buffer, network), overwrites buffer with new points in place;
+            network is None for the initial points. See UniformPoints, NormalPoints, SequencePoints and AdaptivePoints
+        numPoints (int) -- number of training points
+        dim (int) -- dimension of every point
+        refreshInterval (int) -- number of epochs between regenerations of the points
+
+        Returns:
+        ResamplingDataSet object with one attribute:
+            data_in (PyTorch tensor of shape (numPoints,dim)) -- the current training points, with requires_grad = True
+        """
+        self.generator = generator
+        self.refreshInterval = refreshInterval
+        self.epoch = 0
+        self.data_in = torch.empty((numPoints, dim)).requires_grad_()
+        with torch.no_grad():
+            generator(self.data_in, None)
+
+    def step(self, network = None):
+        """
+        Called once at the start of every epoch, regenerates the points every 'refreshInterval' epochs
+
+        Arguments:
+        network (Module or None) -- the neural network being trained, used by residual-based generators
+
+        Returns:
+        refreshed (bool) -- True if the points were regenerated, so terms cached for them are out of date
+        """
+        refreshed = self.epoch % self.refreshInterval == 0
+        if refreshed:
+            with torch.no_grad(): # writing in place into a tensor which requires grad
+                self.generator(self.data_in, network)
+        self.epoch += 1
+        return refreshed
+
+    def __len__(self):
+        return self.data_in.shape[0]
+
+    def __getitem__(self, i):
+        return self.data_in[i]
+
+
+class UniformPoints:
+    """
+    ResamplingDataSet generator of points sampled uniformly from the box given by one range per dimension
+    """
+    def __init__(self, ranges):
+        self.lower = torch.tensor([valueRange[0] for valueRange in ranges], dtype = torch.get_default_dtype())
+        self.width = torch.tensor([valueRange[1] - valueRange[0] for valueRange in ranges],
+                                  dtype = torch.get_default_dtype())
+
+    def __call__(self, buffer, network):
+        buffer.uniform_().mul_(self.width).add_(self.lower)
+
+
+class NormalPoints:
+    """
+    ResamplingDataSet generator of points sampled from independent Normal distributions N(means, stds^2)
+    """
+    def __init__(self, means, stds):
+        self.means = torch.tensor(means, dtype = torch.get_default_dtype())
+        self.stds = torch.tensor(stds, dtype = torch.get_default_dtype())
+
+    def __call__(self, buffer, network):
+        buffer.normal_().mul_(self.stds).add_(self.means)
+
+
+class SequencePoints(UniformPoints):
+    """
+    ResamplingDataSet generator taking the next points of the low-discrepancy sequence of a QMCSampler,
+    scaled to the box given by one range per dimension
+    """
+    def __init__(self, ranges, sampler):
+        super(SequencePoints, self).__init__(ranges)
+        self.sampler = sampler
+
+    def __call__(self, buffer, network):
+        self.sampler.draw(buffer.shape[0], out = buffer).mul_(self.width).add_(self.lower)
+
+
+class AdaptivePoints:
+    """
+    ResamplingDataSet generator selecting points where the network's residual is large with an AdaptiveSampler;
+    the initial points (without a network) are taken from its candidate pool
+    """
+    def __init__(self, sampler):
+        self.sampler = sampler
+
+    def __call__(self, buffer, network):
+        if network is None:
+            buffer.copy_(self.sampler.candidates()[:buffer.shape[0]])
+        else:
+            with torch.enable_grad(): # the residual needs derivatives of the network
+                points = self.sampler.resample(network)
+            buffer.copy_(points)
@@ -0,0 +1,218 @@
+import torch
+from diffEqTools.profiling import NO_TIMER
+
+
+def trialSolution(varInitial, varOut, t):
+    """
+    Trial solution for a given variable varOut at times t with initial values varInitial
+
+    Arguments:
+    varInitial (tensor of shape (batchSize,1)) -- initial values of given variable
+    varOut (tensor of shape (batchSize,1)) -- network output for variable at times t
+    t (tensor of shape (batchSize,1)) -- times at which variable is evaluated
+
+    Returns:
+    trialSoln (tensor of shape (batchSize,1)) -- trial solution for given variable at
+        times t with initial values varInitial"""
+    trialSoln = varInitial + (1 - torch.exp(-t)) * varOut
+    return trialSoln
+
+def evaluateTrajectories(network, initialConditions, times):
+    """
+    Evaluates the trial solutions of a solution bundle along whole trajectories, pairing every initial
+    condition with every time in one input tensor of shape (K*T, 5) and a single forward pass
+
+    Arguments:
+    network (Module) -- the solution bundle, taking inputs (x_0, y_0, u_0, v_0, t)
+    initialConditions (tensor of shape (K,4)) -- initial values (x_0, y_0, u_0, v_0)
+    times (tensor of shape (T,) or (T,1)) -- times at which every trajectory is evaluated
+
+    Returns:
+    trajectories (tensor of shape (K,T,4)) -- trial solutions for (x, y, u, v) at each time
+    """
+    device = next(network.parameters()).device
+    initial = initialConditions.detach().to(device).unsqueeze(1) # shape (K,1,4)
+    times = times.detach().to(device).view(1,-1,1) # shape (1,T,1)
+    numConditions, numTimes = initial.shape[0], times.shape[1]
+    with torch.no_grad():
+        inputs = torch.cat((initial.expand(numConditions, numTimes, 4),
+                            times.expand(numConditions, numTimes, 1)), dim = 2)
+        out = network(inputs.view(-1,5)).view(numConditions, numTimes, 4)
+        trajectories = trialSolution(initial, out, times)
+    return trajectories
+
+def timeDerivatives(network, batch, timeIndex = 4):
+    """
+    Forward propagation through a tanh network (with layers fc1, fcs and fcLast, as in SolutionBundle) which
+    also propagates the derivative of every layer w.r.t. t, using tanh'(z) = 1 - tanh(z)^2.
+    This gives the derivatives of all outputs in a single pass instead of one autograd.grad call per output,
+    and the result stays differentiable w.r.t. the network parameters.
+
+    Arguments:
+    network (Module) -- the solution bundle
+    batch (tensor of shape (batchSize,5)) -- network inputs (x_0, y_0, u_0, v_0, t)
+    timeIndex (int) -- column of batch holding the times t
+
+    Returns:
+    out (tensor of shape (batchSize,4)) -- network outputs
+    dOut (tensor of shape (batchSize,4)) -- derivatives of the network outputs w.r.t. t
+    """
+    hidden = torch.tanh(network.fc1(batch))
+    # d(fc1(input))/dt is the weight column of t, the same for every sample
+    dHidden = (1 - hidden**2) * network.fc1.weight[:,timeIndex]
+    for layer in network.fcs:
+        hidden = torch.tanh(layer(hidden))
+        dHidden = (1 - hidden**2) * (dHidden @ layer.weight.t())
+    out = network.fcLast(hidden)
+    dOut = dHidden @ network.fcLast.weight.t()
+    return out, dOut
+
+# the type comment lets the residual be compiled with torch.jit.script, see scriptedThreeBodyResidual
+def threeBodyResidual(batch, out, dOut, mu):
+    # type: (Tensor, Tensor, Tensor, float) -> Tensor
+    """
+    Residuals of all four differential equations of the planar restricted three-body problem for the
+    trial solutions x_0 + (1 - exp(-t)) * out, evaluating exp(-t) and the two distances cubed only once
+
+    Arguments:
+    batch (tensor of shape (batchSize,5)) -- network inputs (x_0, y_0, u_0, v_0, t)
+    out (tensor of shape (batchSize,4)) -- network outputs for (x, y, u, v)
+    dOut (tensor of shape (batchSize,4)) -- derivatives of the network outputs w.r.t. t
+    mu (float) -- non-dimensionalised mass of the second body
+
+    Returns:
+    residual (tensor of shape (batchSize,4)) -- LHS of the DEs for (x, y, u, v) at times t
+    """
+    initial, t = batch[:,:4], batch[:,4:]
+    expT = torch.exp(-t)
+    trial = initial + (1 - expT) * out
+    dTrial = (1 - expT) * dOut + expT * out
+    x, y, u, v = trial.unbind(1)
+    # distances cubed to the first body at (0,0) and the second body at (1,0), shared by the DEs for u and v
+    r1Cubed = (x**2 + y**2) ** 1.5
+    r2Cubed = ((x - 1)**2 + y**2) ** 1.5
+    dudt = x - mu + 2*v - ((mu * (x - 1) / r2Cubed) + ((1 - mu) * x / r1Cubed))
+    dvdt = y - 2*u - ((mu * y / r2Cubed) + ((1 - mu) * y / r1Cubed))
+    return dTrial - torch.stack((u, v, dudt, dvdt), dim = 1)
+
+def scriptedThreeBodyResidual():
+    """
+    Compiles threeBodyResidual with torch.jit.script, whose fuser combines its elementwise operations (and
+    those of its backward pass) into fewer kernels. Takes the same arguments and gives the same results.
+
+    Arguments:
+    None
+
+    Returns:
+    residualFn (ScriptFunction) -- the compiled threeBodyResidual
+    """
+    return torch.jit.script(threeBodyResidual)
+
+
+class SolutionBundle(torch.nn.Module):
+    """
+    A deep neural network object, with 5 nodes in the input layer, 4 nodes in the
+    output layer, and 'numHiddenLayers' hidden layers each with 'numHiddenNodes' nodes.
+    Used by all of the three-body scripts.
+    """
+    def __init__(self, numHiddenNodes, numHiddenLayers):
+        """
+        Arguments:
+        numHiddenNodes (int) -- number of nodes in hidden layers
+        numHiddenLayers (int) -- number of hidden layers
+
+        Returns:
+        SolutionBundle object (neural network) with three attributes:
+        fc1 (fully connected layer) -- linear transformation of first layer
+        fcs (list of fully connected layers) -- linear transformations of hidden layers
+        fcLast (fully connected layer) -- linear transformation of outer layer
+        """
+        super(SolutionBundle, self).__init__()
+        # create first layer, apply Xavier initialisation
+        self.fc1 = torch.nn.Linear(5, numHiddenNodes)
+        self.fc1.apply(self.initWeightsXavier)
+        # create list of hidden layers, apply Xavier initialisation
+        self.fcs = torch.nn.ModuleList([torch.nn.Linear(numHiddenNodes, numHiddenNodes)
+                    for _ in range(numHiddenLayers)])
+        self.fcs.apply(self.initWeightsXavier)
+        # create final layer, apply Xavier initialisation
+        self.fcLast = torch.nn.Linear(numHiddenNodes, 4)
+        self.fcLast.apply(self.initWeightsXavier)
+
+    def forward(self, input):
+        """
+        Function which performs forward propagation in the neural network.
+
+        Arguments:
+        input (PyTorch tensor shape (batchSize, 5)) -- input of neural network
+        Returns:
+        output (PyTorch tensor shape (batchSize, 4)) -- output of neural network
+        """
+        hidden = torch.tanh(self.fc1(input))
+        # pass through all hidden layers
+        for i in range(len(self.fcs)):
+            hidden = torch.tanh(self.fcs[i](hidden))
+        output = self.fcLast(hidden)
+        return output
+
+    def initWeightsXavier(self, layer):
+        """
+        Function which initialises weights according to Xavier initialisation
+
+        Arguments:
+        layer (Linear object) -- weights and biases of a layer
+        Returns:
+        None
+        """
+        if type(layer) == torch.nn.Linear:
+            torch.nn.init.xavier_uniform_(layer.weight, gain = torch.nn.init.calculate_gain('tanh'))
+
+def train(network, lossFn, optimiser, sampler, mu, lmbda = None, timer = NO_TIMER, residualFn = threeBodyResidual):
+    """
+    Trains the neural network on a single batch of (x_0, y_0, u_0, v_0, t). The learning rate scheduler is
+    stepped by the caller, every few batches with a cost already copied to the host (see MetricsRecorder.stored),
+    so that no batch waits for its cost to be read back from the GPU
+
+    Arguments:
+    network (Module) -- the neural network
+    lossFn (Loss Function) -- network's loss function
+    optimiser (Optimiser) -- carries out parameter optimisation
+    sampler (BundleSampler) -- generates batches of training data in place
+    mu (float) -- non-dimensionalised mass of the second body
+    lmbda (float or None) -- factor in the weighting function exp(-lmbda * t) in the cost function,
+        no weighting if None
+    timer (PhaseTimer) -- if enabled, records the time spent in every phase of the step
+    residualFn (function) -- residual of the 4 differential equations, e.g. the compiled scriptedThreeBodyResidual()
+
+    Returns:
+    cost (tensor) -- network's cost evaluated on single batch of training data"""
+    network.train(True) # set network into training mode
+    timer.restart()
+    batch = sampler.sample() # input of neural network must be of shape (batchSize, 5)
+    timer.lap('sampling')
+    out, dOut = timeDerivatives(network, batch) # pass training batch through network, propagating d/dt alongside
+    timer.lap('derivatives')
+
+    # evaluate each of the 4 differential equations in one call, sharing exp(-t) and the distances to both bodies
+    residual = residualFn(batch, out, dOut, mu)
+    if lmbda is not None: # weighting factor exp(-lambda * t), so that early times are fitted first
+        residual = torch.exp(-lmbda*batch[:,4:]) * residual
+    dxEq, dyEq, duEq, dvEq = torch.split(residual, 1, dim = 1)
+
+    dxCost = lossFn( dxEq, torch.zeros_like(dxEq))
+    dyCost = lossFn( dyEq, torch.zeros_like(dyEq))
+    duCost = lossFn( duEq, torch.zeros_like(duEq))
+    dvCost = lossFn( dvEq, torch.zeros_like(dvEq))
+    cost = (dxCost + dyCost + duCost + dvCost)
+    timer.lap('residual')
+
+    cost.backward() # perform back propagation
+    timer.lap('backward')
+    optimiser.step() # optimise parameters
+    # reset gradients to None instead of zero; this saves memory without altering computation
+    optimiser.zero_grad(set_to_none =True)
+    timer.lap('optimiser')
+    timer.step()
+
+    network.train(False) # set network out of training mode
+    return cost.detach() # left on the device, the recorder copies costs to the cpu in batches
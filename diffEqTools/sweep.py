@@ -0,0 +1,103 @@
+import os
+import itertools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import torch
+from diffEqTools.lagaris import PROBLEMS, run
+
+
+def availableCores():
+    """
+    Returns the number of cores this process may run on (which can be fewer than the machine has,
+    e.g. under a batch scheduler)
+    """
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+def grid(**options):
+    """
+    Every combination of the given options, e.g. grid(problemNumber = [5], learningRate = [1e-3, 1e-2])
+    gives [{'problemNumber': 5, 'learningRate': 1e-3}, {'problemNumber': 5, 'learningRate': 1e-2}]
+
+    Arguments:
+    options (lists) -- values of every keyword argument of lagaris.run
+
+    Returns:
+    configs (list of dicts) -- one dictionary of keyword arguments for every combination
+    """
+    names = list(options)
+    return [dict(zip(names, values)) for values in itertools.product(*options.values())]
+
+def pinThreads(numThreads):
+    """
+    Limits torch to 'numThreads' threads in a worker process, so that the workers together do not
+    run more threads than there are cores. A limit that cannot be set is reported, and the worker
+    goes on with torch's default number of threads.
+    """
+    torch.set_num_threads(numThreads)
+    try:
+        torch.set_num_interop_threads(numThreads)
+    except RuntimeError as error: # only possible before any inter-op parallel work has started
+        print(f"sweep worker {os.getpid()} could not limit torch to {numThreads} inter-op threads: {error}")
+    if torch.get_num_threads() != numThreads:
+        print(f"sweep worker {os.getpid()} runs {torch.get_num_threads()} intra-op threads instead of {numThreads}")
+
+def runConfig(config, initialState = None):
+    """
+    Trains one configuration of a sweep, in a worker process
+
+    Arguments:
+    config (dict) -- keyword arguments of lagaris.run
+    initialState (dict or None) -- state_dict the network starts from, so that every configuration starts from
+        the same network (e.g. problem5InitialNetwork.pth), a new random network if None
+
+    Returns:
+    result (dict) -- 'config', 'costList', 'error', 'trainingTime' and 'state', the state_dict of the trained network
+    """
+    config = dict(config)
+    network = None
+    if initialState is not None:
+        network = PROBLEMS[config['problemNumber']].network(config.get('numHiddenNodes'))
+        network.load_state_dict(initialState)
+    result = run(network = network, **config)
+    return {'config': config, 'costList': result['costList'], 'error': result['error'],
+            'trainingTime': result['trainingTime'], 'state': result['network'].state_dict()}
+
+def sweep(configs, numWorkers = None, threadsPerWorker = 1, initialState = None, resultsPath = None, verbose = True):
+    """
+    Trains every configuration of a hyperparameter sweep, fanned out across a pool of processes
+    with one configuration per core at a time. The workers are started with 'spawn', as fresh
+    interpreters, since forking a process whose torch thread pools are running can deadlock;
+    a script calling sweep must therefore guard its top-level code with if __name__ == '__main__'.
+
+    Arguments:
+    configs (list of dicts) -- keyword arguments of lagaris.run for every run, e.g. from grid
+    numWorkers (int or None) -- number of worker processes, as many as the cores allow if None
+    threadsPerWorker (int) -- torch threads in every worker; 1 avoids oversubscribing the cores when
+        every core runs its own small network
+    initialState (dict or None) -- state_dict every network starts from, see runConfig
+    resultsPath (string or None) -- if given, the results are saved to this file with torch.save
+        each time a run finishes, so finished runs survive if the sweep is interrupted
+    verbose (bool) -- if True, prints a line for every finished run
+
+    Returns:
+    results (list of dicts) -- result of runConfig for every configuration, in the order of configs
+    """
+    if numWorkers is None:
+        numWorkers = max(1, min(len(configs), availableCores() // threadsPerWorker))
+    context = multiprocessing.get_context('spawn')
+
+    results = [None] * len(configs)
+    with ProcessPoolExecutor(max_workers = numWorkers, mp_context = context,
+                             initializer = pinThreads, initargs = (threadsPerWorker,)) as executor:
+        futures = {executor.submit(runConfig, config, initialState): i for i, config in enumerate(configs)}
+        for future in as_completed(futures):
+            i = futures[future]
+            results[i] = future.result()
+            if verbose:
+                print(f"{configs[i]}: final cost = {results[i]['costList'][-1]:.3e}, "
+                      f"error = {results[i]['error']:.3e}, {results[i]['trainingTime']:.1f} seconds")
+            if resultsPath is not None:
+                torch.save([result for result in results if result is not None], resultsPath)
+    return results
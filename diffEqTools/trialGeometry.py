@@ -0,0 +1,39 @@
+import torch
+
+
+class GeometryCache:
+    """
+    Terms of a trial solution and its differential equation which only depend on the input points
+    (e.g. x(1-x), sin(pi*x) or the RHS of the equation), evaluated once for a set of training points and kept
+    on their device, so that every epoch only evaluates the parts depending on the network.
+    A TensorLoader over (points, cache.terms) yields every batch of points together with its terms.
+    """
+    def __init__(self, geometryFn, points):
+        """
+        Arguments:
+        geometryFn (function) -- called as geometryFn(points), returns a tensor of shape (numPoints, numTerms)
+            with one column for every input-only term
+        points (PyTorch tensor of shape (numPoints,dim)) -- training points, e.g. DataSet.data_in
+
+        Returns:
+        GeometryCache object with one attribute:
+            terms (PyTorch tensor of shape (numPoints, numTerms)) -- terms at every point, without grad history
+        """
+        self.geometryFn = geometryFn
+        self.points = points
+        with torch.no_grad():
+            self.terms = geometryFn(points)
+
+    def refresh(self):
+        """
+        Re-evaluates the terms in place, after the points were regenerated in place (e.g. by a ResamplingDataSet),
+        so a TensorLoader over the terms stays valid
+
+        Arguments:
+        None
+
+        Returns:
+        None
+        """
+        with torch.no_grad():
+            self.terms.copy_(self.geometryFn(self.points))
@@ -0,0 +1,98 @@
+import os
+import numpy as np
+import torch
+from diffEqTools.referenceSolutions import dormandPrince
+from diffEqTools.solutionBundles import evaluateTrajectories
+
+
+def sampleInitialConditions(xRange, yRange, uRange, vRange, numConditions, seed = 0):
+    """
+    Samples initial conditions uniformly from xRange x yRange x uRange x vRange with a seeded generator,
+    so that the same seed always gives the same initial conditions
+
+    Arguments:
+    xRange (list of length 2) -- lower and upper limits for initial conditions x_0
+    yRange (list of length 2) -- lower and upper limits for initial conditions y_0
+    uRange (list of length 2) -- lower and upper limits for initial conditions u_0
+    vRange (list of length 2) -- lower and upper limits for initial conditions v_0
+    numConditions (int) -- number of initial conditions M
+    seed (int) -- seed of the random generator
+
+    Returns:
+    initialConditions (tensor of shape (M,4)) -- initial values (x_0, y_0, u_0, v_0)
+    """
+    generator = torch.Generator().manual_seed(seed)
+    lower = torch.tensor([xRange[0], yRange[0], uRange[0], vRange[0]])
+    upper = torch.tensor([xRange[1], yRange[1], uRange[1], vRange[1]])
+    return lower + (upper - lower) * torch.rand((numConditions, 4), generator = generator)
+
+
+class ValidationSet:
+    """
+    A frozen set of initial conditions (x_0, y_0, u_0, v_0) with precomputed reference trajectories,
+    used to measure the accuracy of a solution bundle in the same way at every checkpoint
+    """
+    def __init__(self, path, xRange, yRange, uRange, vRange, tRange, numConditions, numTimeSteps, mu,
+                 seed = 0, referenceCache = None):
+        """
+        Loads the validation set stored at 'path', or samples and solves it and stores it there. The file records
+        the arguments it was built with, and is rebuilt if they differ from the given ones.
+
+        Arguments:
+        path (string) -- .npz file holding the validation set
+        xRange (list of length 2) -- lower and upper limits for initial conditions x_0
+        yRange (list of length 2) -- lower and upper limits for initial conditions y_0
+        uRange (list of length 2) -- lower and upper limits for initial conditions u_0
+        vRange (list of length 2) -- lower and upper limits for initial conditions v_0
+        tRange (list of length 2) -- first and last times of the reference trajectories
+        numConditions (int) -- number of initial conditions M
+        numTimeSteps (int) -- number of evenly-spaced times T in every reference trajectory
+        mu (float) -- non-dimensionalised mass of the second body
+        seed (int) -- seed of the random generator used to sample the initial conditions
+        referenceCache (ReferenceCache or None) -- if given, reference trajectories are read from this cache
+
+        Returns:
+        ValidationSet object with three attributes:
+        initialConditions (tensor of shape (M,4)) -- initial values (x_0, y_0, u_0, v_0)
+        times (tensor of shape (T,)) -- times of the reference trajectories
+        trajectories (tensor of shape (M,T,4)) -- reference values of (x, y, u, v)
+        """
+        parameters = np.array([*xRange, *yRange, *uRange, *vRange, *tRange, numConditions, numTimeSteps, mu, seed],
+                              dtype = np.float64)
+        if os.path.exists(path):
+            with np.load(path) as data:
+                if 'parameters' in data and np.array_equal(data['parameters'], parameters):
+                    self.initialConditions = torch.from_numpy(data['initialConditions'])
+                    self.times = torch.from_numpy(data['times'])
+                    self.trajectories = torch.from_numpy(data['trajectories'])
+                    return
+            print(f"validation set {path} was built with other parameters, rebuilding it")
+
+        self.initialConditions = sampleInitialConditions(xRange, yRange, uRange, vRange, numConditions, seed)
+        self.times = torch.linspace(tRange[0], tRange[1], numTimeSteps)
+        if referenceCache is None:
+            trajectories = dormandPrince(self.initialConditions, self.times, mu)
+        else:
+            trajectories = referenceCache.trajectories(self.initialConditions, mu, tRange, numTimeSteps)
+        # single precision is ample for measuring network errors and halves the file size
+        self.trajectories = trajectories.float()
+        np.savez(path, initialConditions = self.initialConditions.numpy(), times = self.times.numpy(),
+                 trajectories = self.trajectories.numpy(), parameters = parameters)
+
+    def score(self, network, tFinal = None):
+        """
+        Mean squared distance between the network's trial solutions and the reference (x, y) positions,
+        evaluated for every initial condition in a single batched forward pass
+
+        Arguments:
+        network (Module) -- the solution bundle, taking inputs (x_0, y_0, u_0, v_0, t)
+        tFinal (float or None) -- if given, only times up to tFinal are scored (e.g. the current curriculum range)
+
+        Returns:
+        inaccuracy (float) -- mean of (x - xExact)^2 + (y - yExact)^2 over all initial conditions and times
+        """
+        keep = torch.ones_like(self.times, dtype = torch.bool) if tFinal is None else self.times <= tFinal
+        trial = evaluateTrajectories(network, self.initialConditions, self.times[keep])
+        exact = self.trajectories[:,keep].to(trial.device)
+        inaccuracy = ((trial[:,:,:2] - exact[:,:,:2])**2).sum(dim = 2).mean()
+        return inaccuracy.item()